@@ -2,23 +2,92 @@
 
 
 import os
-import tempfile
+import uuid
+import itertools
+import base64
 from datetime import datetime
 
-from flask import Blueprint, request, jsonify, json
+import numpy as np
+from flask import Blueprint, Response, request, jsonify, json, current_app, url_for, stream_with_context
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
 
 from app import db
-from models import Resource, UserType, VerifiedEmail, Category, Subcategory
-from services.transcribe import transcribe_audio
-from services.legal_entity_verification import verify_legal_entity
+from models import Resource, UserType, VerifiedEmail, Category, Subcategory, IntakeJob, RESOURCE_FIELDS
+from services import (spatial, intake, intake_queue, match_cache, idempotency, rule_extractor, abuse_scorer,
+                      llm_scheduler, llm_usage, whisper_pool, transcript_cache, domain_rules)
+from services.transcribe import transcribe_audio, transcribe_events, check_upload_size
+from services.transcribe import options as transcribe_options
+from services.vector_index import get_index
+from services.legal_entity_verification import verify_legal_entity, verify_legal_entities
 
 api_bp = Blueprint('api', __name__)
 
+DEFAULT_PAGE_SIZE = int(os.getenv("RESOURCES_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("RESOURCES_MAX_PAGE_SIZE", "1000"))
+MAX_INCIDENTS = int(os.getenv("DISTANCE_MAX_INCIDENTS", "50"))
+BATCH_MAX_MESSAGES = int(os.getenv("BATCH_MAX_MESSAGES", "500"))
+VERIFY_BATCH_MAX_ENTRIES = int(os.getenv("VERIFY_BATCH_MAX_ENTRIES", "500"))
+
+
+def _wants_async():
+    """Async intake is opt-in: ?async=1 or a 'Prefer: respond-async' header."""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'respond-async' in (request.headers.get('Prefer') or '')
+
 
 @api_bp.post('/process_message/')
 def process_message():
-    from services.llm import extract_resource_fields
+    run_async = _wants_async()
+    if request.content_type and request.content_type.startswith('multipart/form-data'):
+        # Oversized uploads are refused before the body is parsed or hashed
+        try:
+            check_upload_size(request.content_length)
+        except intake.IntakeError as e:
+            return jsonify({"error": e.message}), e.status
+    key = (request.headers.get('Idempotency-Key') or '').strip()
+    if not key:
+        return _process_message(run_async)
+
+    # Retries with the same key replay the first response instead of extracting again
+    try:
+        replay = idempotency.begin(key, _request_fingerprint(run_async))
+    except idempotency.IdempotencyConflict as e:
+        return jsonify({"error": e.message}), e.status
+    if replay is not None:
+        body, status = replay
+        response = jsonify(body)
+        response.headers['Idempotent-Replayed'] = 'true'
+        if body.get('status_url'):
+            response.headers['Location'] = body['status_url']
+        return response, status
 
+    try:
+        response, status = _process_message(run_async)
+    except Exception:
+        idempotency.abandon(key)
+        raise
+    if 200 <= status < 300:
+        idempotency.complete(key, response.get_json(), status)
+    else:
+        idempotency.abandon(key)
+    return response, status
+
+
+def _request_fingerprint(run_async):
+    """Hash of what the request asks for, so a reused key with another body is rejected."""
+    mode = b'async' if run_async else b'sync'
+    if request.content_type and request.content_type.startswith('multipart/form-data'):
+        file = request.files.get('file')
+        # The upload is hashed in chunks and rewound, never read into memory whole
+        audio = file.stream if file else b''
+        return idempotency.fingerprint(mode, request.form.get('metadata', '').encode('utf-8'), audio)
+    payload = request.get_json(silent=True) or {}
+    return idempotency.fingerprint(mode, json.dumps(payload, sort_keys=True).encode('utf-8'))
+
+
+def _process_message(run_async):
     payload = {}
 
     if request.content_type and request.content_type.startswith('multipart/form-data'):
@@ -30,11 +99,30 @@ def process_message():
         file = request.files.get('file')
         if not file:
             return jsonify({"error": "No audio file provided."}), 400
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[-1] or '.wav') as tmp:
-            file.save(tmp.name)
-            audio_path = tmp.name
-        text, _ = transcribe_audio(audio_path)
-        os.unlink(audio_path)
+        suffix = os.path.splitext(file.filename)[-1] or '.wav'
+        try:
+            model_size, beam_size = transcribe_options(request.form.get('model_size'), request.form.get('beam_size'))
+        except intake.IntakeError as e:
+            return jsonify({"error": e.message}), e.status
+
+        if run_async:
+            # Keep the upload until a worker has transcribed it
+            try:
+                intake.validate_metadata(metadata)
+            except intake.IntakeError as e:
+                return jsonify({"error": e.message}), e.status
+            audio_dir = os.path.join(current_app.instance_path, 'intake_audio')
+            os.makedirs(audio_dir, exist_ok=True)
+            audio_path = os.path.join(audio_dir, uuid.uuid4().hex + suffix)
+            file.save(audio_path)
+            return _accepted(intake_queue.enqueue(None, metadata, audio_path=audio_path,
+                                                  transcription={"model_size": model_size, "beam_size": beam_size}))
+
+        # Decoded in memory straight from the upload, no temp file
+        try:
+            text, _ = transcribe_audio(file.stream, model_size, beam_size)
+        except intake.IntakeError as e:
+            return jsonify({"error": e.message}), e.status
         payload['text'] = text
         payload['metadata'] = metadata
     else:
@@ -46,93 +134,134 @@ def process_message():
     if not text:
         return jsonify({"error": "No text to process (provide text or audio)."}), 400
 
-    incident_location = metadata.get("incident_location")
-    if not incident_location:
-        return jsonify({"error": "Missing required 'incident_location' field in metadata."}), 400
+    try:
+        intake.validate_metadata(metadata)
+        if run_async:
+            return _accepted(intake_queue.enqueue(text, metadata))
+        resources_created = intake.process_text(text, metadata)
+    except intake.IntakeError as e:
+        return jsonify({"error": e.message}), e.status
 
-    user_location = metadata.get("user_location")
-    user_type_val = metadata.get("user_type")
+    return jsonify({
+        "ok": True,
+        "resources": [r.to_dict() for r in resources_created]
+    }), 201
 
-    extracted_list = extract_resource_fields(
-        text=text,
-        incident_location=incident_location,
-        user_type=user_type_val,
-        user_location=user_location,
-    )
-    if not extracted_list:
-        return jsonify({"error": "Could not extract any valid resources from the message."}), 400
 
-    location_geojson = incident_location
-    resources_created = []
+@api_bp.post('/process_messages/batch')
+def process_messages_batch():
+    """
+    Text-only bulk intake. Body: {"messages": [{"text", "metadata"}], "metadata": {...}}
+    where the top-level metadata fills in keys a message does not set.
+    """
+    payload = request.get_json(silent=True) or {}
+    messages = payload.get('messages')
+    defaults = payload.get('metadata') or {}
+
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"error": "'messages' must be a non-empty list."}), 400
+    if len(messages) > BATCH_MAX_MESSAGES:
+        return jsonify({"error": f"At most {BATCH_MAX_MESSAGES} messages per batch."}), 400
+
+    items = []
+    for m in messages:
+        if isinstance(m, str):
+            m = {"text": m}
+        elif not isinstance(m, dict):
+            m = {}
+        items.append({"text": m.get('text'), "metadata": {**defaults, **(m.get('metadata') or {})}})
+
+    results = intake.process_batch(items)
+    created = sum(len(r.get("resources", [])) for r in results)
+    return jsonify({
+        "ok": all(r["ok"] for r in results),
+        "created": created,
+        "results": results,
+    })
 
-    for extracted in extracted_list:
-        if not extracted.get("location_geojson"):
-            continue
 
-        user_type = None
-        if user_type_val:
-            try:
-                user_type = UserType(user_type_val)
-            except ValueError:
-                pass
+def _accepted(job):
+    response = jsonify({
+        "ok": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for('api.get_job', job_id=job.id),
+    })
+    response.headers['Location'] = url_for('api.get_job', job_id=job.id)
+    return response, 202
+
+
+@api_bp.get('/jobs/<job_id>')
+def get_job(job_id):
+    job = db.session.get(IntakeJob, job_id)
+    if not job:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job.to_dict())
 
+
+@api_bp.post('/transcribe/')
+def transcribe():
+    """
+    Transcribe an uploaded recording (multipart 'file', optional 'model_size' and
+    'beam_size'). With ?stream=1 the answer is a text/event-stream: one 'segment'
+    event per transcribed segment, in order, then a 'done' event with the full text.
+    """
+    file = request.files.get('file')
+    if not file:
+        return jsonify({"error": "No audio file provided."}), 400
+    try:
+        check_upload_size(request.content_length)
+        model_size, beam_size = transcribe_options(request.form.get('model_size'), request.form.get('beam_size'))
+        events = transcribe_events(file.stream, model_size, beam_size)
+        # The first event needs the cache lookup and decode, so bad audio still gets a 4xx
+        events = itertools.chain([next(events)], events)
+        if request.args.get('stream', '').lower() not in ('1', 'true', 'yes'):
+            for kind, data in events:
+                if kind == "done":
+                    return jsonify(data)
+    except intake.IntakeError as e:
+        return jsonify({"error": e.message}), e.status
+
+    def sse():
         try:
-            quantity = int(extracted.get('quantity')) if extracted.get('quantity') is not None else None
-        except Exception:
-            quantity = None
-
-        resource = Resource(
-            category=extracted.get('category'),
-            subcategory=extracted.get('subcategory'),
-            name=extracted.get('name') or 'unknown',
-            quantity=quantity,
-            num_available_people=extracted.get('num_available_people'),
-            location_geojson=extracted.get("location_geojson") or location_geojson,
-            location_text=extracted.get("location_text"),
-            distance_km=extracted.get("distance_km"),
-            phone_number=extracted.get("phone_number") or metadata.get("phone_number"),
-            email=extracted.get("email") or metadata.get("email"),
-            first_name=extracted.get("first_name") or metadata.get("first_name"),
-            last_name=extracted.get("last_name") or metadata.get("last_name"),
-            source_text=text,
-            user_type=user_type,
-            created_at=datetime.utcnow(),
-            flagged=extracted.get('flagged', False),
-            abuse_reason=extracted.get('abuse_reason'),
-        )
-
-        db.session.add(resource)
-        resources_created.append(resource)
+            for kind, data in events:
+                yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+        except intake.IntakeError as e:
+            yield f"event: error\ndata: {json.dumps({'error': e.message, 'status': e.status})}\n\n"
+
+    return Response(stream_with_context(sse()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-    db.session.commit()
 
+
+@api_bp.get('/stats/')
+def get_stats():
+    """Hit rates of the in-process shortcuts in front of the LLM, and the OpenAI and Whisper queues."""
     return jsonify({
-        "ok": True,
-        "resources": [
-            {
-                "id": r.id,
-                "category": r.category.value if r.category else None,
-                "subcategory": r.subcategory.value if r.subcategory else None,
-                "name": r.name,
-                "quantity": r.quantity,
-                "num_available_people": r.num_available_people,
-                "location_geojson": r.location_geojson,
-                "location_text": r.location_text,
-                "distance_km": r.distance_km,
-                "phone_number": r.phone_number,
-                "email": r.email,
-                "first_name": r.first_name,
-                "last_name": r.last_name,
-                "source_text": r.source_text,
-                "user_type": r.user_type.value if r.user_type else None,
-                "created_at": r.created_at.isoformat() + 'Z',
-                "flagged": r.flagged,
-                "abuse_reason": r.abuse_reason,
-            }
-            for r in resources_created
-        ]
-    }), 201
+        "match_cache": match_cache.stats(),
+        "rule_extractor": rule_extractor.stats(),
+        "abuse_prescreen": abuse_scorer.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_usage": llm_usage.stats(),
+        "whisper_pool": whisper_pool.stats(),
+        "transcript_cache": transcript_cache.stats(),
+        "domain_rules": domain_rules.stats(),
+    })
+
 
+@api_bp.get('/stats/llm_usage')
+def get_llm_usage():
+    """Stored OpenAI token usage per endpoint: totals and an hourly (or daily) series."""
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in ('hour', 'day'):
+        return jsonify({"error": "Invalid 'bucket' (must be 'hour' or 'day')."}), 400
+    try:
+        hours = float(request.args.get('hours', 24))
+    except ValueError:
+        return jsonify({"error": "Invalid 'hours' (must be a number)."}), 400
+    if hours <= 0:
+        return jsonify({"error": "Invalid 'hours' (must be positive)."}), 400
+    return jsonify(llm_usage.summary(hours=hours, bucket=bucket))
 
 
 @api_bp.get('/resources/')
@@ -141,48 +270,300 @@ def list_resources():
     location_json = request.args.get('incident_location_geojson')
 
     if situation:
-        from services.resource_matcher import match_resources_to_situation
+        from services.resource_matcher import match_resources, match_resources_locally
         try:
             incident_location = json.loads(location_json) if location_json else None
         except Exception:
             incident_location = None
 
-        matched = match_resources_to_situation(situation, incident_location)
+        try:
+            max_candidates = _parse_limit(request.args.get('max_candidates'))
+        except ValueError:
+            return jsonify({"error": "Invalid 'max_candidates' (must be a positive integer)."}), 400
+
+        engine = request.args.get('engine') or 'llm'
+        if engine not in ('llm', 'local'):
+            return jsonify({"error": "Invalid 'engine' (must be 'llm' or 'local')."}), 400
+        base_key = match_cache.make_key(situation, incident_location)
+        matched = match_cache.get(base_key + (engine, max_candidates))
+        cached = matched is not None
+
+        if not cached:
+            # engine=local skips OpenAI entirely and answers from the vector index
+            if engine == 'local':
+                matched, used = match_resources_locally(situation, incident_location, limit=max_candidates), 'local'
+            else:
+                matched, used = match_resources(situation, incident_location, max_candidates=max_candidates)
+            # A local fallback is cached as a local answer, so the next LLM request tries OpenAI again
+            match_cache.put(base_key + (used, max_candidates), matched)
+
         return jsonify({
             "situation": situation,
             "incident_location": incident_location,
-            "resources": matched
+            "resources": matched,
+            "cached": cached,
+        })
+
+    # --- Otherwise: list resources, optionally filtered and paginated ---
+    try:
+        fields = _parse_fields(request.args.get('fields'))
+        query = _filtered_resource_query(request.args)
+        limit = _parse_limit(request.args.get('limit'))
+        cursor = _decode_cursor(request.args.get('cursor')) if request.args.get('cursor') else None
+        bbox, near, radius_km, k = _parse_spatial(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if fields:
+        # Only load the requested columns (plus cursor and spatial keys) from the database
+        columns = {"id", "created_at", "latitude", "longitude"} | set(fields)
+        query = query.options(load_only(*[getattr(Resource, c) for c in columns]))
+
+    if bbox:
+        query = spatial.filter_bbox(query, bbox)
+
+    if near:
+        # Distance-ranked results: nearest first, no cursor paging
+        lon, lat = near
+        if k:
+            hits = spatial.k_nearest(query, lon, lat, k, max_radius_km=radius_km)
+        else:
+            hits = spatial.resources_within(query, lon, lat, radius_km)
+        if limit:
+            hits = hits[:limit]
+        return jsonify({
+            "resources": [
+                {**r.to_dict(fields), "query_distance_km": round(d, 3)}
+                for r, d in hits
+            ]
         })
 
-    # --- Otherwise: list all resources normally ---
-    resources = Resource.query.all()
+    query = query.order_by(Resource.created_at.desc(), Resource.id.desc())
+
+    # Plain GET without paging parameters keeps the old "everything" response
+    if limit is None and cursor is None:
+        resources = query.all()
+        return jsonify({"resources": [r.to_dict(fields) for r in resources]})
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    if cursor:
+        cursor_created_at, cursor_id = cursor
+        query = query.filter(or_(
+            Resource.created_at < cursor_created_at,
+            and_(Resource.created_at == cursor_created_at, Resource.id < cursor_id),
+        ))
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    page = rows[:limit]
+    next_cursor = _encode_cursor(page[-1]) if len(rows) > limit else None
+
     return jsonify({
-        "resources": [
-            {
-                "id": r.id,
-                "category": r.category.value if r.category else None,
-                "subcategory": r.subcategory.value if getattr(r, "subcategory", None) else None,
-                "name": r.name,
-                "quantity": r.quantity,
-                "num_available_people": r.num_available_people,
-                "location_geojson": r.location_geojson,
-                "location_text": r.location_text,
-                "distance_km": r.distance_km,
-                "phone_number": r.phone_number,
-                "email": r.email,
-                "first_name": r.first_name,
-                "last_name": r.last_name,
-                "source_text": r.source_text,
-                "user_type": r.user_type.value if r.user_type else None,
-                "created_at": r.created_at.isoformat() + 'Z',
-                "flagged": r.flagged,
-                "abuse_reason": r.abuse_reason,
-            }
-            for r in resources
-        ]
+        "resources": [r.to_dict(fields) for r in page],
+        "next_cursor": next_cursor,
     })
 
 
+def _parse_fields(raw):
+    """Parse a comma separated `fields=` projection into a list of column names."""
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in RESOURCE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}.")
+    return fields
+
+
+def _parse_limit(raw):
+    if raw is None or raw == "":
+        return None
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValueError("Invalid 'limit' (must be integer).")
+    if limit < 1:
+        raise ValueError("Invalid 'limit' (must be positive).")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _parse_enum_list(raw, enum_cls, name):
+    """Parse a comma separated list of enum names (case-insensitive)."""
+    values = []
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            values.append(enum_cls[part.upper()])
+        except KeyError:
+            raise ValueError(f"Invalid {name} '{part}'.")
+    return values
+
+
+def _filtered_resource_query(args):
+    """Build a Resource query from the category/subcategory/user_type/flagged/created_after filters."""
+    query = Resource.query
+
+    if args.get('category'):
+        query = query.filter(Resource.category.in_(_parse_enum_list(args['category'], Category, 'category')))
+    if args.get('subcategory'):
+        query = query.filter(Resource.subcategory.in_(_parse_enum_list(args['subcategory'], Subcategory, 'subcategory')))
+    if args.get('user_type'):
+        query = query.filter(Resource.user_type.in_(_parse_enum_list(args['user_type'], UserType, 'user_type')))
+
+    if args.get('flagged'):
+        flagged = args['flagged'].strip().lower()
+        if flagged not in ('true', 'false', '1', '0'):
+            raise ValueError("Invalid 'flagged' (must be true or false).")
+        query = query.filter(Resource.flagged.is_(flagged in ('true', '1')))
+
+    if args.get('created_after'):
+        try:
+            created_after = datetime.fromisoformat(args['created_after'].strip().rstrip('Z'))
+        except ValueError:
+            raise ValueError("Invalid 'created_after' (must be ISO 8601 datetime).")
+        query = query.filter(Resource.created_at > created_after)
+
+    return query
+
+
+def _parse_floats(raw, count, name):
+    try:
+        values = [float(v) for v in raw.split(",")]
+    except ValueError:
+        values = []
+    if len(values) != count:
+        raise ValueError(f"Invalid '{name}' (expected {count} comma separated numbers).")
+    return values
+
+
+def _parse_spatial(args):
+    """Parse bbox=minLon,minLat,maxLon,maxLat, near=lon,lat, radius_km= and k=."""
+    bbox = near = radius_km = k = None
+
+    if args.get('bbox'):
+        min_lon, min_lat, max_lon, max_lat = _parse_floats(args['bbox'], 4, 'bbox')
+        if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180
+                and -90 <= min_lat <= max_lat <= 90):
+            raise ValueError("Invalid 'bbox' (coordinates out of range).")
+        bbox = (min_lon, min_lat, max_lon, max_lat)
+
+    if args.get('near'):
+        lon, lat = _parse_floats(args['near'], 2, 'near')
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            raise ValueError("Invalid 'near' (coordinates out of range).")
+        near = (lon, lat)
+
+    if args.get('radius_km'):
+        try:
+            radius_km = float(args['radius_km'])
+        except ValueError:
+            raise ValueError("Invalid 'radius_km' (must be a number).")
+        if radius_km <= 0:
+            raise ValueError("Invalid 'radius_km' (must be positive).")
+
+    if args.get('k'):
+        try:
+            k = int(args['k'])
+        except ValueError:
+            raise ValueError("Invalid 'k' (must be integer).")
+        if k < 1:
+            raise ValueError("Invalid 'k' (must be positive).")
+        k = min(k, MAX_PAGE_SIZE)
+
+    if (radius_km or k) and not near:
+        raise ValueError("'radius_km' and 'k' require 'near=lon,lat'.")
+    if near and not (radius_km or k):
+        raise ValueError("'near' requires 'radius_km' or 'k'.")
+
+    return bbox, near, radius_km, k
+
+
+def _encode_cursor(resource):
+    raw = f"{resource.created_at.isoformat()}|{resource.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, resource_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(resource_id)
+    except Exception:
+        raise ValueError("Invalid 'cursor'.")
+
+
+
+@api_bp.get('/resources/distances/')
+def resource_distances():
+    """
+    Distances from incident points to every located resource, computed in one
+    vectorized pass.
+
+    ?incidents=lon,lat[;lon,lat...]   one incident -> ranked list, several -> matrix
+    &method=haversine|vincenty        kernel (default haversine)
+    &max_km=50                        drop resources farther than this from every incident
+    &limit=100                        ranked list size
+    &resource_ids=1,2,3               restrict to these resources
+    &include_flagged=true             also include flagged resources
+    """
+    raw = request.args.get('incidents') or request.args.get('near')
+    if not raw:
+        return jsonify({"error": "Missing 'incidents' (lon,lat[;lon,lat...])."}), 400
+    try:
+        incidents = [_parse_floats(part, 2, 'incidents') for part in raw.split(';') if part.strip()]
+        if not incidents or len(incidents) > MAX_INCIDENTS:
+            raise ValueError(f"Invalid 'incidents' (between 1 and {MAX_INCIDENTS} points).")
+        if any(not (-180 <= lon <= 180 and -90 <= lat <= 90) for lon, lat in incidents):
+            raise ValueError("Invalid 'incidents' (coordinates out of range).")
+        method = request.args.get('method', 'haversine')
+        if method not in ('haversine', 'vincenty'):
+            raise ValueError("Invalid 'method' (haversine or vincenty).")
+        max_km = float(request.args['max_km']) if request.args.get('max_km') else None
+        limit = _parse_limit(request.args.get('limit')) or DEFAULT_PAGE_SIZE
+        wanted_ids = ([int(v) for v in request.args['resource_ids'].split(',') if v.strip()]
+                      if request.args.get('resource_ids') else None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    include_flagged = request.args.get('include_flagged', '').lower() in ('true', '1')
+    ids, lons, lats = get_index().coordinates(include_flagged=include_flagged)
+    if wanted_ids is not None:
+        keep = np.isin(ids, wanted_ids)
+        ids, lons, lats = ids[keep], lons[keep], lats[keep]
+
+    if method == 'haversine':
+        matrix = spatial.haversine_matrix_km([i[0] for i in incidents], [i[1] for i in incidents], lons, lats)
+    else:
+        matrix = np.vstack([spatial.vincenty_km_many(lon, lat, lons, lats) for lon, lat in incidents])
+        matrix = matrix.reshape(len(incidents), len(ids))
+
+    if len(incidents) == 1:
+        row = matrix[0]
+        order = np.argsort(row, kind='stable')
+        if max_km is not None:
+            order = order[row[order] <= max_km]
+        order = order[:limit]
+        return jsonify({
+            "incident": incidents[0],
+            "method": method,
+            "resources": [
+                {"id": int(ids[i]), "distance_km": round(float(row[i]), 3)}
+                for i in order
+            ],
+        })
+
+    if max_km is not None:
+        keep = (matrix <= max_km).any(axis=0)
+        ids, matrix = ids[keep], matrix[:, keep]
+    return jsonify({
+        "incidents": incidents,
+        "method": method,
+        "resource_ids": [int(i) for i in ids],
+        "distances_km": np.round(matrix, 3).tolist(),
+    })
+
 
 @api_bp.post("/resources/create/")
 def create_resource():
@@ -271,30 +652,12 @@ def create_resource():
 
     db.session.add(resource)
     db.session.commit()
+    intake.notify_resources_changed([resource])
 
     return jsonify({
         "ok": True,
         "message": "Resource created successfully.",
-        "resource": {
-            "id": resource.id,
-            "category": resource.category.value if resource.category else None,
-            "subcategory": resource.subcategory.value if resource.subcategory else None,
-            "name": resource.name,
-            "quantity": resource.quantity,
-            "num_available_people": resource.num_available_people,
-            "location_geojson": resource.location_geojson,
-            "location_text": resource.location_text,
-            "distance_km": resource.distance_km,
-            "phone_number": resource.phone_number,
-            "email": resource.email,
-            "first_name": resource.first_name,
-            "last_name": resource.last_name,
-            "source_text": resource.source_text,
-            "user_type": resource.user_type.value if resource.user_type else None,
-            "created_at": resource.created_at.isoformat() + "Z",
-            "flagged": resource.flagged,
-            "abuse_reason": resource.abuse_reason,
-        }
+        "resource": resource.to_dict(),
     }), 201
 
 @api_bp.patch('/resources/<int:resource_id>/')
@@ -325,6 +688,7 @@ def update_resource(resource_id):
         resource.flagged = bool(data["flagged"])
 
     db.session.commit()
+    intake.notify_resources_changed([resource])
 
     return jsonify({
         "ok": True,
@@ -352,7 +716,8 @@ def request_verification():
             "ok": False,
             "verified": False,
             "reason": result["reason"],
-            "domain": result["domain"]
+            "domain": result["domain"],
+            "rule": result["rule"],
         }), 403
 
     # Store if not already in DB
@@ -368,6 +733,64 @@ def request_verification():
         "domain": result["domain"],
         "user_type": user_type,
         "reason": result["reason"],
+        "rule": result["rule"],
+    }), 200
+
+
+@api_bp.post("/verify-legal-entity/batch")
+def request_verification_batch():
+    """
+    Verify many emails at once, e.g. a whole organization. Body:
+    {"entries": [{"email", "user_type"}, ...]} or {"emails": [...], "user_type": "..."};
+    a top-level user_type is the default for entries without one. Each distinct
+    (domain, user_type) costs at most one model call, and none when cached.
+    """
+    data = request.get_json(silent=True) or {}
+    default_type = (data.get("user_type") or "").strip().upper()
+    entries = data.get("entries")
+    if entries is None:
+        entries = [{"email": e} for e in data.get("emails") or [] if isinstance(e, str)]
+
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"ok": False, "error": "'entries' (or 'emails' with 'user_type') must be a non-empty list."}), 400
+    if len(entries) > VERIFY_BATCH_MAX_ENTRIES:
+        return jsonify({"ok": False, "error": f"At most {VERIFY_BATCH_MAX_ENTRIES} entries per batch."}), 400
+
+    pairs = []
+    for entry in entries:
+        entry = entry if isinstance(entry, dict) else {}
+        email = (entry.get("email") or "").strip().lower()
+        user_type = (entry.get("user_type") or "").strip().upper() or default_type
+        pairs.append((email, user_type))
+
+    valid = [i for i, (email, user_type) in enumerate(pairs) if email and user_type]
+    verdicts = dict(zip(valid, verify_legal_entities([pairs[i] for i in valid])))
+
+    results = []
+    for i, (email, user_type) in enumerate(pairs):
+        v = verdicts.get(i)
+        if v is None:
+            results.append({"ok": False, "email": email, "user_type": user_type,
+                            "error": "Email and user_type are required."})
+            continue
+        results.append({"ok": v["ok"], "verified": v["ok"], "email": email, "domain": v["domain"],
+                        "user_type": user_type, "reason": v["reason"], "rule": v["rule"], "cached": v["cached"]})
+
+    # Store new verified emails in one commit
+    accepted = {r["email"]: r["user_type"] for r in results if r["ok"]}
+    if accepted:
+        known = {e for (e,) in db.session.query(VerifiedEmail.email).filter(VerifiedEmail.email.in_(accepted))}
+        for email, user_type in accepted.items():
+            if email not in known:
+                db.session.add(VerifiedEmail(email=email, user_type=user_type))
+        db.session.commit()
+
+    return jsonify({
+        "ok": all(r["ok"] for r in results),
+        "verified": sum(1 for r in results if r["ok"]),
+        "rejected": sum(1 for r in results if not r["ok"]),
+        "domains": len({(r["domain"], r["user_type"]) for r in results if r.get("domain")}),
+        "results": results,
     }), 200
 
 
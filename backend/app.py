@@ -5,7 +5,39 @@ from extensions import db
 
 load_dotenv()
 
-def create_app():
+def _upgrade_resource_table():
+    """Add columns introduced after the first deploy to an existing resources table."""
+    from sqlalchemy import inspect, text
+    from models import Resource
+
+    existing = {c["name"] for c in inspect(db.engine).get_columns(Resource.__tablename__)}
+    added = []
+    for column in Resource.__table__.columns:
+        if column.name in existing:
+            continue
+        col_type = column.type.compile(dialect=db.engine.dialect)
+        db.session.execute(text(f"ALTER TABLE {Resource.__tablename__} ADD COLUMN {column.name} {col_type}"))
+        added.append(column.name)
+    db.session.commit()
+
+    if "geohash" in added:
+        # Backfill the spatial columns for rows stored before they existed
+        for resource in Resource.query.filter(Resource.location_geojson.isnot(None)):
+            resource.sync_location()
+        db.session.commit()
+        print("[INIT] Backfilled spatial columns on existing resources")
+
+    if "updated_at" in added:
+        db.session.execute(text(f"UPDATE {Resource.__tablename__} SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)"))
+        db.session.commit()
+
+
+def create_app(start_background: bool = True):
+    """
+    Build the Flask app. start_background=False skips the intake workers, the
+    abuse pre-screen build and the Whisper pool, for processes that never serve
+    requests (the debug reloader's watcher).
+    """
     app = Flask(__name__)
     
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///emergency_support.db')
@@ -25,6 +57,12 @@ def create_app():
     with app.app_context():
         from models import Resource, AppSetting
         db.create_all()
+        _upgrade_resource_table()
+
+        # create_all() skips tables that already exist, so make sure indexes
+        # added after the first deploy are present on older databases too.
+        for index in Resource.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
 
         # Create default AppSetting if not exists
         setting = AppSetting.query.first()
@@ -39,6 +77,19 @@ def create_app():
     # Register APIs
     from api import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
+
+    if start_background:
+        # Background workers for /api/process_message/?async=1
+        from services.intake_queue import start_workers
+        start_workers(app)
+
+        # Quantity distributions for the abuse pre-screen, read from the table off the request path
+        from services import abuse_scorer
+        abuse_scorer.start(app)
+
+        # Opt-in Whisper worker pool (WHISPER_POOL_WORKERS), model loaded now instead of on the first voice report
+        from services import whisper_pool
+        whisper_pool.start()
     
     # Handle OPTIONS requests for CORS preflight
     @app.before_request
@@ -47,13 +98,34 @@ def create_app():
             response = make_response()
             return response
 
+    # Token usage of the OpenAI calls made while serving each request
+    from services import llm_usage
+
+    @app.before_request
+    def begin_llm_usage():
+        llm_usage.begin(request.endpoint or request.path)
+
+    @app.after_request
+    def report_llm_usage(response):
+        usage = llm_usage.end()
+        if usage and usage["calls"]:
+            tokens = usage["prompt_tokens"] + usage["completion_tokens"]
+            response.headers['X-LLM-Tokens'] = str(tokens)
+            print(f"[llm_usage] {usage['route']}: {usage['calls']} calls, {tokens} tokens, ${usage['cost_usd']:.5f}")
+        llm_usage.flush()
+        return response
+
     # Global error handler for OpenAI quota errors
     @app.errorhandler(Exception)
     def handle_global_errors(e):
         from openai import RateLimitError
+        from services.llm_scheduler import SchedulerOverloaded
         if isinstance(e, RateLimitError):
             print("[ERROR] OpenAI quota exceeded.")
             return {"error": "OpenAI quota exceeded. Please try again later."}, 429
+        if isinstance(e, SchedulerOverloaded):
+            print(f"[WARN] OpenAI call shed: {e.message}")
+            return {"error": e.message}, 429, {"Retry-After": str(int(e.retry_after + 0.999))}
         raise e  # re-raise all other exceptions normally
 
     @app.get('/')
@@ -68,6 +140,8 @@ def create_app():
 
 
 if __name__ == '__main__':
-    app = create_app()
+    # With debug=True this runs twice: the reloader's file watcher, then the
+    # child that serves requests (WERKZEUG_RUN_MAIN=true). Only the child needs workers.
+    app = create_app(start_background=os.environ.get("WERKZEUG_RUN_MAIN") == "true")
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=True)
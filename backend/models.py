@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import Enum as SAEnum
+from sqlalchemy import Enum as SAEnum, event, func
 from sqlalchemy.dialects.sqlite import JSON
 from extensions import db
 
@@ -84,8 +84,8 @@ class Resource(db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
     # Core resource details
-    category = db.Column(SAEnum(Category), nullable=True)
-    subcategory = db.Column(SAEnum(Subcategory), nullable=True)
+    category = db.Column(SAEnum(Category), nullable=True, index=True)
+    subcategory = db.Column(SAEnum(Subcategory), nullable=True, index=True)
     name = db.Column(db.String(200), nullable=False)
     quantity = db.Column(db.Integer, nullable=True)
     num_available_people = db.Column(db.Integer, nullable=True)
@@ -95,6 +95,11 @@ class Resource(db.Model):
     location_text = db.Column(db.String(255), nullable=True)
     distance_km = db.Column(db.Float, nullable=True)
 
+    # Normalized point derived from location_geojson, used by spatial queries
+    latitude = db.Column(db.Float, nullable=True, index=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)
+
     # Contact or ownership data
     phone_number = db.Column(db.String(64), nullable=True)
     email = db.Column(db.String(255), nullable=True)
@@ -103,24 +108,177 @@ class Resource(db.Model):
 
     # Source and metadata
     source_text = db.Column(db.Text, nullable=True)
-    user_type = db.Column(SAEnum(UserType), nullable=True)
+    user_type = db.Column(SAEnum(UserType), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set on every insert and update, so other processes can tell their caches are stale
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     # Abuse detection flags
-    flagged = db.Column(db.Boolean, default=False, nullable=False)
+    flagged = db.Column(db.Boolean, default=False, nullable=False, index=True)
     abuse_reason = db.Column(db.Text, nullable=True)
 
+    __table_args__ = (
+        # Keyset pagination walks (created_at, id) in descending order
+        db.Index('ix_resources_created_at_id', 'created_at', 'id'),
+    )
+
     def mark_flagged(self, reason: str):
         """Helper method to mark a resource as suspicious."""
         self.flagged = True
         self.abuse_reason = reason
 
+    def to_dict(self, fields=None) -> dict:
+        """
+        Serialize the resource, optionally limited to the given field names.
+        Only the requested attributes are read, so columns left out by load_only stay unloaded.
+        """
+        names = [f for f in RESOURCE_FIELDS if f in fields] if fields else RESOURCE_FIELDS
+        return {name: _json_value(getattr(self, name)) for name in names}
+
+    def sync_location(self):
+        """Refresh latitude/longitude/geohash from location_geojson."""
+        from services.spatial import point_from_geojson, geohash_encode
+
+        point = point_from_geojson(self.location_geojson)
+        if point:
+            self.longitude, self.latitude = point
+            self.geohash = geohash_encode(*point)
+        else:
+            self.longitude = self.latitude = self.geohash = None
+
+
+@event.listens_for(Resource, "before_insert")
+@event.listens_for(Resource, "before_update")
+def _sync_resource_location(mapper, connection, target):
+    target.sync_location()
+
+
+def resource_watermark() -> tuple:
+    """(row count, max id, latest updated_at) of resources; changes with any write from any process."""
+    return tuple(db.session.query(func.count(Resource.id), func.max(Resource.id), func.max(Resource.updated_at)).one())
+
+
+def _json_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat() + 'Z'
+    return value
+
+
+# Columns that can be requested through the `fields=` projection
+RESOURCE_FIELDS = (
+    "id", "category", "subcategory", "name", "quantity", "num_available_people",
+    "location_geojson", "location_text", "distance_km", "phone_number", "email",
+    "first_name", "last_name", "source_text", "user_type", "created_at",
+    "flagged", "abuse_reason",
+)
+
 class VerifiedEmail(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
     user_type = db.Column(db.String(64), nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
+class DomainVerdict(db.Model):
+    """Cached legal-entity verdict for an email domain and claimed user type."""
+    __tablename__ = 'domain_verdicts'
+    __table_args__ = (db.UniqueConstraint('domain', 'user_type', name='uq_domain_verdicts_domain_user_type'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    domain = db.Column(db.String(255), nullable=False, index=True)
+    user_type = db.Column(db.String(64), nullable=False)
+    ok = db.Column(db.Boolean, nullable=False)
+    reason = db.Column(db.Text, nullable=True)
+    source = db.Column(db.String(16), nullable=False, default='llm')  # llm | rule
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class GeocodeCache(db.Model):
+    """Cached geocoder answers; found=False rows are negative (miss) entries."""
+    __tablename__ = 'geocode_cache'
+
+    id = db.Column(db.Integer, primary_key=True)
+    query_key = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    found = db.Column(db.Boolean, nullable=False, default=True)
+    longitude = db.Column(db.Float, nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    display_name = db.Column(db.String(512), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class IntakeJob(db.Model):
+    """A /process_message/ request queued for the background intake workers."""
+    __tablename__ = 'intake_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)  # queued | running | done | failed
+    stage = db.Column(db.String(16), nullable=False, default='extract')  # transcribe | extract | save | done
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    # Raw input, intermediate results and the final response body
+    text = db.Column(db.Text, nullable=True)
+    audio_path = db.Column(db.String(512), nullable=True)
+    message_metadata = db.Column(JSON, nullable=True)
+    extracted = db.Column(JSON, nullable=True)
+    result = db.Column(JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "attempts": self.attempts,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at.isoformat() + 'Z',
+            "updated_at": self.updated_at.isoformat() + 'Z',
+        }
+
+class ExtractionCache(db.Model):
+    """LLM extraction results keyed by a hash of the normalized message, its context and the model."""
+    __tablename__ = 'extraction_cache'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    model = db.Column(db.String(50), nullable=True)
+    result = db.Column(JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class IdempotencyRecord(db.Model):
+    """Stored response for an Idempotency-Key; status is 'pending' while the first request runs."""
+    __tablename__ = 'idempotency_records'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending | done
+    status_code = db.Column(db.Integer, nullable=True)
+    response = db.Column(JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class LlmUsage(db.Model):
+    """Token usage of one OpenAI completion; route is the HTTP endpoint (or background job) that caused it."""
+    __tablename__ = 'llm_usage'
+
+    id = db.Column(db.Integer, primary_key=True)
+    route = db.Column(db.String(64), nullable=False, index=True)
+    operation = db.Column(db.String(64), nullable=False)
+    model = db.Column(db.String(50), nullable=True)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
+    cached_tokens = db.Column(db.Integer, nullable=False, default=0)
+    cost_usd = db.Column(db.Float, nullable=True)
+    latency_ms = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
 class AppSetting(db.Model):
     __tablename__ = 'app_settings'
 
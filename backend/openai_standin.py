@@ -0,0 +1,165 @@
+"""
+Local OpenAI-compatible stand-in for offline development and load tests.
+
+Serves POST /v1/chat/completions with canned answers that validate against the
+requested json_schema, after a configurable delay. Point the backend at it with
+
+    OPENAI_BASE_URL=http://localhost:8089/v1 OPENAI_API_KEY=sk-local
+
+Settings: STANDIN_PORT (8089), STANDIN_LATENCY_MS (400), STANDIN_JITTER_MS (200),
+STANDIN_ERROR_RATE (0, share of requests answered with 500).
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+
+from flask import Flask, request, jsonify
+
+from services import rule_extractor
+
+# First cell of each row of the matcher's pipe-separated resource table
+TABLE_ID_RE = re.compile(r"^(\d+)\|", re.M)
+
+LATENCY_MS = float(os.getenv("STANDIN_LATENCY_MS", "400"))
+JITTER_MS = float(os.getenv("STANDIN_JITTER_MS", "200"))
+ERROR_RATE = float(os.getenv("STANDIN_ERROR_RATE", "0"))
+
+CANNED_RESOURCE = {
+    "category": "SHELTER",
+    "subcategory": "BLANKETS",
+    "name": "blankets",
+    "quantity": 10,
+    "location_text": "Helsinki",
+}
+
+
+def _parse(content):
+    try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        return content
+
+
+def _from_schema(schema, name=""):
+    """Minimal instance of a JSON schema (all properties present)."""
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object":
+        return {key: _from_schema(sub, key) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_from_schema(schema.get("items", {}), name)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 0.5
+    if kind == "boolean":
+        return False
+    return f"stand-in {name}".strip()
+
+
+def _resources_for(text, item_schema):
+    found, _ = rule_extractor.extract(text if isinstance(text, str) else json.dumps(text))
+    items = found or [dict(CANNED_RESOURCE)]
+    props = item_schema.get("properties", {})
+    out = []
+    for item in items:
+        item = {k: v for k, v in item.items() if k in props}
+        item.setdefault("location_text", CANNED_RESOURCE["location_text"])
+        if "flagged" in props:
+            item["flagged"] = False
+        out.append(item)
+    return out
+
+
+def _answer(schema_name, schema, user):
+    props = schema.get("properties", {})
+    data = user if isinstance(user, (dict, list)) else None
+
+    if "messages" in props:
+        # Batch extraction: one entry per input message index
+        item_schema = props["messages"]["items"]["properties"]["resources"]["items"]
+        return {"messages": [
+            {"index": m.get("index"), "resources": _resources_for(m.get("text"), item_schema)}
+            for m in (data or []) if isinstance(m, dict)
+        ]}
+
+    if "matches" in props:
+        ids = [int(i) for i in TABLE_ID_RE.findall(user if isinstance(user, str) else "")]
+        return {"matches": [
+            {"resource_id": rid, "relevance_score": round(1.0 - n / (len(ids) + 1), 3), "reason": "stand-in match"}
+            for n, rid in enumerate(ids)
+        ]}
+
+    if "resources" in props:
+        item_props = props["resources"]["items"].get("properties", {})
+        if "message_index" in item_props:
+            return {"resources": [
+                {"message_index": g["message_index"], "resource_index": r["resource_index"], "flagged": False}
+                for g in (data or []) for r in g.get("resources", [])
+            ]}
+        if "index" in item_props:
+            return {"resources": [
+                {"index": r["index"], "flagged": False} for r in (data or {}).get("resources", [])
+            ]}
+        text = data.get("text") if isinstance(data, dict) else user
+        return {"resources": _resources_for(text, props["resources"]["items"])}
+
+    return _from_schema(schema, schema_name)
+
+
+def create_standin_app():
+    app = Flask(__name__)
+
+    @app.post('/v1/chat/completions')
+    def chat_completions():
+        body = request.get_json(silent=True) or {}
+        messages = body.get("messages") or []
+        user = _parse(messages[-1].get("content") if messages else "")
+
+        delay = max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000.0
+        time.sleep(delay)
+        if ERROR_RATE and random.random() < ERROR_RATE:
+            return jsonify({"error": {"message": "stand-in injected failure", "type": "server_error"}}), 500
+
+        fmt = body.get("response_format") or {}
+        if fmt.get("type") == "json_schema":
+            spec = fmt.get("json_schema") or {}
+            content = _answer(spec.get("name", ""), spec.get("schema", {}), user)
+        else:
+            # Free-form JSON prompts (legal entity verification)
+            content = {"valid": True, "reason": "stand-in verification"}
+
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        text = json.dumps(content, ensure_ascii=False)
+        prompt_tokens, completion_tokens = prompt_chars // 4 + 1, len(text) // 4 + 1
+        return jsonify({
+            "id": "chatcmpl-" + uuid.uuid4().hex,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stand-in"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    @app.get('/v1/models')
+    def list_models():
+        return jsonify({"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+
+    return app
+
+
+if __name__ == '__main__':
+    port = int(os.environ.get('STANDIN_PORT', 8089))
+    create_standin_app().run(host='0.0.0.0', port=port, debug=False, threaded=True)
@@ -0,0 +1,247 @@
+import os
+import math
+import bisect
+import random
+import threading
+from collections import Counter
+from typing import Dict, Any, Optional, List, Tuple
+
+from sqlalchemy.orm import load_only
+
+from models import Resource
+
+# Robust z-score (median/MAD of log quantity) up to which an item is accepted locally
+ACCEPT_Z = float(os.getenv("ABUSE_ACCEPT_Z", "2.5"))
+# Samples needed before a (user_type, category, subcategory) distribution is trusted
+MIN_SAMPLES = int(os.getenv("ABUSE_MIN_SAMPLES", "20"))
+# Resources further than this from the incident are escalated
+MAX_DISTANCE_KM = float(os.getenv("ABUSE_MAX_DISTANCE_KM", "300"))
+# A phone number or email seen on more resources than this is escalated
+CONTACT_REUSE_MAX = int(os.getenv("ABUSE_CONTACT_REUSE_MAX", "25"))
+# Values kept per distribution; beyond this new values replace random old ones
+MAX_SAMPLES = int(os.getenv("ABUSE_MAX_SAMPLES", "5000"))
+ENABLED = os.getenv("ABUSE_PRESCREEN_ENABLED", "1").lower() not in ("0", "false", "no")
+
+
+def _value(v) -> Optional[str]:
+    if v is None:
+        return None
+    return getattr(v, "value", None) or str(v).strip().upper() or None
+
+
+class _Distribution:
+    """Sorted log1p(quantity) samples with cached median and MAD."""
+
+    def __init__(self):
+        self.values: List[float] = []
+        self._summary = None
+
+    def add(self, x: float):
+        if len(self.values) >= MAX_SAMPLES:
+            self.values.pop(random.randrange(len(self.values)))
+        bisect.insort(self.values, x)
+        self._summary = None
+
+    def summary(self) -> Tuple[float, float]:
+        if self._summary is None:
+            n = len(self.values)
+            median = self.values[n // 2] if n % 2 else (self.values[n // 2 - 1] + self.values[n // 2]) / 2
+            deviations = sorted(abs(v - median) for v in self.values)
+            mad = deviations[n // 2]
+            self._summary = (median, mad)
+        return self._summary
+
+    def score(self, x: float) -> Tuple[float, float]:
+        """(robust z-score, percentile) of x."""
+        median, mad = self.summary()
+        # 1.4826 * MAD estimates the standard deviation; the floor keeps
+        # identical samples (MAD 0) from making every other value extreme
+        scale = max(1.4826 * mad, 0.25)
+        percentile = bisect.bisect_right(self.values, x) / len(self.values)
+        return (x - median) / scale, percentile
+
+
+def _sample(r: Resource) -> tuple:
+    """The columns the scorer uses, read while the instance is still attached to its session."""
+    quantity = r.quantity if r.quantity is not None else r.num_available_people
+    return (r.id, _value(r.user_type), _value(r.category), _value(r.subcategory), quantity, r.flagged,
+            r.phone_number, r.email)
+
+
+class AbuseScorer:
+    """
+    Local pre-screen for the LLM abuse audit. Keeps quantity distributions per
+    (user_type, category, subcategory), with coarser fallbacks, plus contact
+    usage counts, all built from the resources table and updated on insert.
+    Items are only accepted when a trusted distribution says their quantity is normal.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.built = False
+        self.building = False
+        self.pending: List[tuple] = []
+        self.seen_ids = set()
+        self.distributions: Dict[tuple, _Distribution] = {}
+        self.contacts: Counter = Counter()
+        self.counts = {"accepted": 0, "escalated": 0}
+
+    @staticmethod
+    def _keys(user_type, category, subcategory) -> List[tuple]:
+        # Most specific first
+        return [(user_type, category, subcategory), (None, category, subcategory), (None, category, None)]
+
+    def _observe_locked(self, sample: tuple):
+        rid, user_type, category, subcategory, quantity, flagged, phone, email = sample
+        if rid is not None:
+            if rid in self.seen_ids:
+                return
+            self.seen_ids.add(rid)
+        for contact in (phone, email):
+            if contact:
+                self.contacts[contact.strip().lower()] += 1
+        if flagged or quantity is None or quantity <= 0 or not category:
+            return
+        x = math.log1p(quantity)
+        for key in self._keys(user_type, category, subcategory):
+            self.distributions.setdefault(key, _Distribution()).add(x)
+
+    def build(self):
+        """Scan the resources table once (needs an app context); run off the request path, see start()."""
+        with self._lock:
+            if self.built or self.building:
+                return
+            self.building = True
+        query = Resource.query.options(load_only(
+            Resource.id, Resource.user_type, Resource.category, Resource.subcategory,
+            Resource.quantity, Resource.num_available_people, Resource.flagged,
+            Resource.phone_number, Resource.email,
+        ))
+        try:
+            for r in query.yield_per(1000):
+                sample = _sample(r)
+                with self._lock:
+                    self._observe_locked(sample)
+        except Exception:
+            with self._lock:
+                self.building = False
+            raise
+        with self._lock:
+            # Resources saved during the scan; seen_ids skips the ones it already read
+            for sample in self.pending:
+                self._observe_locked(sample)
+            self.pending = []
+            self.built = True
+            self.building = False
+
+    def observe(self, resources):
+        """Feed committed resources into the distributions."""
+        samples = [_sample(r) for r in resources]
+        with self._lock:
+            if not self.built:
+                # Before the scan starts the rows are read from the table anyway
+                if self.building:
+                    self.pending.extend(samples)
+                return
+            for sample in samples:
+                self._observe_locked(sample)
+
+    def assess(self, item: Dict[str, Any], user_type: Optional[str]) -> Dict[str, Any]:
+        """
+        Features for one extracted item and the decision 'accept' (clearly normal,
+        no LLM audit needed) or 'escalate'.
+        """
+        with self._lock:
+            reasons = []
+            features: Dict[str, Any] = {}
+            quantity = item.get("quantity")
+            if quantity is None:
+                quantity = item.get("num_available_people")
+            try:
+                quantity = int(quantity) if quantity is not None else None
+            except (TypeError, ValueError):
+                quantity = None
+
+            if not self.built:
+                # Distributions are still being read from the table
+                reasons.append("warming_up")
+            elif quantity is None or quantity <= 0:
+                # Nothing to score; uncounted people and free-text items are left to the audit
+                reasons.append("no_quantity")
+            else:
+                keys = self._keys(_value(user_type), _value(item.get("category")), _value(item.get("subcategory")))
+                dist = next((self.distributions[k] for k in keys
+                             if k in self.distributions and len(self.distributions[k].values) >= MIN_SAMPLES), None)
+                if dist is None:
+                    reasons.append("no_baseline")
+                else:
+                    z, percentile = dist.score(math.log1p(quantity))
+                    features.update(quantity_z=round(z, 2), quantity_percentile=round(percentile, 3))
+                    if z > ACCEPT_Z:
+                        reasons.append("quantity")
+
+            distance = item.get("distance_km")
+            if distance is not None:
+                features["distance_km"] = distance
+                if distance > MAX_DISTANCE_KM:
+                    reasons.append("distance")
+
+            reuse = max((self.contacts.get(c.strip().lower(), 0)
+                         for c in (item.get("phone_number"), item.get("email")) if c), default=0)
+            features["contact_reuse"] = reuse
+            if reuse > CONTACT_REUSE_MAX:
+                reasons.append("contact_reuse")
+
+            decision = "escalate" if reasons else "accept"
+            self.counts["accepted" if decision == "accept" else "escalated"] += 1
+            return {"decision": decision, "reasons": reasons, "features": features}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.counts["accepted"] + self.counts["escalated"]
+            return {
+                **self.counts,
+                "accept_rate": round(self.counts["accepted"] / total, 3) if total else None,
+                "distributions": sum(1 for d in self.distributions.values() if len(d.values) >= MIN_SAMPLES),
+            }
+
+
+_scorer = AbuseScorer()
+
+
+def get_scorer() -> AbuseScorer:
+    return _scorer
+
+
+def start(app):
+    """Build the distributions in a background thread; items are escalated until it finishes."""
+    if not ENABLED:
+        return
+
+    def _build():
+        try:
+            with app.app_context():
+                _scorer.build()
+            print("[abuse_scorer] Quantity distributions ready")
+        except Exception as e:
+            print(f"[abuse_scorer] Building the distributions failed: {e}")
+
+    threading.Thread(target=_build, name="abuse-scorer-build", daemon=True).start()
+
+
+def observe(resources):
+    _scorer.observe(resources)
+
+
+def accepts(item: Dict[str, Any], user_type: Optional[str]) -> bool:
+    """True when the item is clearly normal and may skip the LLM audit."""
+    return ENABLED and _scorer.assess(item, user_type)["decision"] == "accept"
+
+
+def distance_anomalous(item: Dict[str, Any]) -> bool:
+    distance = item.get("distance_km")
+    return distance is not None and distance > MAX_DISTANCE_KM
+
+
+def stats() -> Dict[str, Any]:
+    return {**_scorer.stats(), "enabled": ENABLED}
@@ -0,0 +1,187 @@
+import os
+import re
+import json
+import time
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+
+# Suffix lists per category (see the file for the format); edits are picked up
+# without a restart, checked at most every DOMAIN_RULES_RELOAD_SECONDS
+RULES_PATH = os.getenv("DOMAIN_RULES_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "domain_rules.json"
+)
+RELOAD_SECONDS = float(os.getenv("DOMAIN_RULES_RELOAD_SECONDS", "5"))
+
+CATEGORIES = ("disallowed", "government", "municipality", "ngo", "corporate")
+# The category each claimed user type must match
+ACCEPTED_CATEGORY = {
+    "GOVERNMENT_AGENCY": "government",
+    "LOCAL_AUTHORITY": "municipality",
+    "NGO": "ngo",
+    "CORPORATE_ENTITY": "corporate",
+}
+REASONS = {
+    "government": "Recognized as a government domain.",
+    "municipality": "Municipal domain detected.",
+    "ngo": "Domain suggests non-profit organization.",
+    "corporate": "Likely corporate or private domain.",
+}
+
+_TOKEN_SPLIT_RE = re.compile(r"[-_]")
+_END = ""  # trie key holding (category, suffix); labels are never empty
+
+
+class DomainRules:
+    """
+    Suffix rules compiled into a trie over reversed domain labels
+    ("x.gov.fi" is walked fi -> gov -> x), so a lookup costs one dict access
+    per label and only ever matches whole labels.
+    """
+
+    def __init__(self, rules: Dict[str, List[str]]):
+        self.trie: Dict[str, Any] = {}
+        self.counts = {}
+        for category in CATEGORIES:
+            suffixes = {s.strip().lower().strip(".") for s in rules.get(category) or [] if s.strip()}
+            for suffix in suffixes:
+                node = self.trie
+                for label in reversed(suffix.split(".")):
+                    node = node.setdefault(label, {})
+                node[_END] = (category, suffix)
+            self.counts[category] = len(suffixes)
+        self.ngo_markers = frozenset(m.strip().lower() for m in rules.get("ngo_markers") or [] if m.strip())
+        self.counts["ngo_markers"] = len(self.ngo_markers)
+
+    def match(self, domain: str) -> Optional[Tuple[str, str]]:
+        """(category, rule) for the most specific rule matching domain, or None."""
+        labels = (domain or "").strip().lower().strip(".").split(".")
+        node, best = self.trie, None
+        for label in reversed(labels):
+            node = node.get(label)
+            if node is None:
+                break
+            best = node.get(_END, best)
+        # A bare TLD only says which kind of organization is likely; a marker
+        # word in the name ("helsinki-aid.com") is stronger evidence of an NGO.
+        # Disallowed suffixes, TLDs included ("relief.edu"), are never overridden
+        if best is not None and best[0] == "disallowed":
+            return best[0], f"{best[0]}:{best[1]}"
+        if best is None or "." not in best[1]:
+            for label in labels[:-1]:
+                for token in _TOKEN_SPLIT_RE.split(label):
+                    if token in self.ngo_markers:
+                        return "ngo", f"ngo_marker:{token}"
+        if best is None:
+            return None
+        return best[0], f"{best[0]}:{best[1]}"
+
+
+_rules: Optional[DomainRules] = None
+_mtime = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_stats = {"lookups": 0, "settled": 0, "reloads": 0, "reload_errors": 0, "loaded_at": None}
+
+
+def _load(path: str) -> DomainRules:
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)
+    unknown = set(rules) - set(CATEGORIES) - {"ngo_markers"}
+    unknown = {k for k in unknown if not k.startswith("_")}
+    if unknown:
+        print(f"[domain_rules] Ignoring unknown rule sets in {path}: {', '.join(sorted(unknown))}")
+    compiled = DomainRules(rules)
+    problems = _check(compiled)
+    if problems:
+        print(f"[domain_rules] Rule check failed for {path}: {', '.join(problems)}")
+    return compiled
+
+
+def _check(rules: DomainRules) -> List[str]:
+    """
+    Regression check run on every load: a marker word must never turn a
+    disallowed domain into an accepted NGO ("relief.edu"). Returns the
+    offending domains.
+    """
+    problems = []
+    stack = list(rules.trie.values())
+    while stack:
+        node = stack.pop()
+        stack.extend(child for key, child in node.items() if key != _END)
+        category, suffix = node.get(_END, (None, None))
+        if category != "disallowed":
+            continue
+        for marker in sorted(rules.ngo_markers):
+            domain = f"{marker}.{suffix}"
+            if rules.match(domain)[0] != "disallowed":
+                problems.append(domain)
+    return problems
+
+
+def get_rules() -> DomainRules:
+    """The compiled rules, reloaded when the file has changed since the last check."""
+    global _rules, _mtime, _checked_at
+    now = time.monotonic()
+    if _rules is not None and now - _checked_at < RELOAD_SECONDS:
+        return _rules
+    with _lock:
+        if _rules is not None and now - _checked_at < RELOAD_SECONDS:
+            return _rules
+        _checked_at = now
+        try:
+            mtime = os.path.getmtime(RULES_PATH)
+            if _rules is None or mtime != _mtime:
+                _mtime = mtime
+                _rules = _load(RULES_PATH)
+                _stats["reloads"] += 1
+                _stats["loaded_at"] = time.time()
+                print(f"[domain_rules] Loaded {RULES_PATH}: {_rules.counts}")
+        except (OSError, ValueError) as e:
+            # Keep serving the previous rules until the file is fixed; a broken
+            # edit must not open the gate
+            _stats["reload_errors"] += 1
+            print(f"[domain_rules] Could not load {RULES_PATH}: {e}")
+            if _rules is None:
+                _rules = DomainRules({})
+        return _rules
+
+
+def match(domain: str) -> Optional[Tuple[str, str]]:
+    return get_rules().match(domain)
+
+
+def decide(domain: str, user_type: str) -> Optional[Dict[str, Any]]:
+    """
+    Rule verdict {"ok", "reason", "rule"} for a domain and claimed user type,
+    or None when the rules cannot settle it and the model should be asked.
+    A listed domain or suffix of two or more labels settles both ways; a TLD
+    or an NGO marker word only accepts the matching claim.
+    """
+    d = (domain or "").lower()
+    hit = match(d)
+    verdict = None
+    if hit is not None:
+        category, rule = hit
+        expected = ACCEPTED_CATEGORY.get((user_type or "").upper())
+        if category == "disallowed":
+            verdict = {"ok": False, "reason": f"Generic or educational domain ({d}) not allowed.", "rule": rule}
+        elif category == expected:
+            verdict = {"ok": True, "reason": REASONS[category], "rule": rule}
+        elif "." in rule:
+            verdict = {"ok": False, "reason": f"Domain belongs to a {category} organization, not {user_type}.",
+                       "rule": rule}
+    with _lock:
+        _stats["lookups"] += 1
+        _stats["settled"] += verdict is not None
+    return verdict
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        lookups = _stats["lookups"]
+        return {
+            **_stats,
+            "path": RULES_PATH,
+            "rules": dict(_rules.counts) if _rules is not None else None,
+            "settled_rate": round(_stats["settled"] / lookups, 3) if lookups else None,
+        }
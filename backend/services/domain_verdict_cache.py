@@ -0,0 +1,65 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Tuple
+
+from flask import has_app_context
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import DomainVerdict
+
+# Accepted domains rarely change owner; rejections expire sooner so a corrected
+# prompt or model gets another chance
+VERDICT_TTL = timedelta(hours=float(os.getenv("DOMAIN_VERDICT_TTL_HOURS", "720")))
+NEGATIVE_TTL = timedelta(hours=float(os.getenv("DOMAIN_VERDICT_NEGATIVE_TTL_HOURS", "24")))
+
+Key = Tuple[str, str]
+
+
+def make_key(domain: str, user_type: str) -> Key:
+    return (domain or "").strip().lower(), (user_type or "").strip().upper()
+
+
+def get_many(keys: List[Key]) -> Dict[Key, Dict[str, Any]]:
+    """Live verdicts {"ok", "reason", "source"} for the given (domain, user_type) keys."""
+    if not keys or not has_app_context():
+        return {}
+    wanted = set(keys)
+    rows = DomainVerdict.query.filter(
+        DomainVerdict.domain.in_({d for d, _ in keys}),
+        DomainVerdict.expires_at > datetime.utcnow(),
+    ).all()
+    return {(row.domain, row.user_type): {"ok": row.ok, "reason": row.reason, "source": row.source}
+            for row in rows if (row.domain, row.user_type) in wanted}
+
+
+def get(key: Key):
+    return get_many([key]).get(key)
+
+
+def put_many(verdicts: Dict[Key, Dict[str, Any]]):
+    """Store verdicts ({"ok", "reason", "source"}), replacing older rows for the same key."""
+    if not verdicts or not has_app_context():
+        return
+    now = datetime.utcnow()
+    existing = {
+        (row.domain, row.user_type): row
+        for row in DomainVerdict.query.filter(DomainVerdict.domain.in_({d for d, _ in verdicts}))
+    }
+    for (domain, user_type), verdict in verdicts.items():
+        row = existing.get((domain, user_type)) or DomainVerdict(domain=domain, user_type=user_type)
+        row.ok = bool(verdict["ok"])
+        row.reason = verdict.get("reason")
+        row.source = verdict.get("source", "llm")
+        row.created_at = now
+        row.expires_at = now + (VERDICT_TTL if row.ok else NEGATIVE_TTL)
+        db.session.add(row)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request for the same domain stored it first
+        db.session.rollback()
+
+
+def put(key: Key, verdict: Dict[str, Any]):
+    put_many({key: verdict})
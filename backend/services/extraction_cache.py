@@ -0,0 +1,86 @@
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from flask import has_app_context
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import ExtractionCache
+
+# How long an extraction result may be reused for an identical message
+CACHE_TTL = timedelta(hours=float(os.getenv("EXTRACTION_CACHE_TTL_HOURS", "24")))
+# Incident coordinates are rounded so GPS jitter between retries still hits
+LOCATION_DECIMALS = int(os.getenv("EXTRACTION_CACHE_LOCATION_DECIMALS", "4"))
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _round_geojson(value):
+    if isinstance(value, float):
+        return round(value, LOCATION_DECIMALS)
+    if isinstance(value, list):
+        return [_round_geojson(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _round_geojson(v) for k, v in value.items()}
+    return value
+
+
+def make_key(text: str, incident_location: Optional[dict], user_type: Optional[str], model: str) -> str:
+    """sha256 over normalized text, incident location, user type and model name."""
+    material = json.dumps(
+        [normalize_text(text), _round_geojson(incident_location), (user_type or "").lower(), model],
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def get_many(keys: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Live cached results for the given keys; missing keys are absent."""
+    if not keys or not has_app_context():
+        return {}
+    rows = ExtractionCache.query.filter(
+        ExtractionCache.cache_key.in_(list(set(keys))),
+        ExtractionCache.expires_at > datetime.utcnow(),
+    ).all()
+    return {row.cache_key: row.result for row in rows}
+
+
+def get(key: str) -> Optional[List[Dict[str, Any]]]:
+    return get_many([key]).get(key)
+
+
+def put_many(results: Dict[str, List[Dict[str, Any]]], model: Optional[str] = None):
+    """Store fresh extraction results, replacing expired rows for the same key."""
+    if not results or not has_app_context():
+        return
+    now = datetime.utcnow()
+    existing = {
+        row.cache_key: row
+        for row in ExtractionCache.query.filter(ExtractionCache.cache_key.in_(list(results)))
+    }
+    for key, value in results.items():
+        row = existing.get(key) or ExtractionCache(cache_key=key)
+        row.model = model
+        row.result = value
+        row.created_at = now
+        row.expires_at = now + CACHE_TTL
+        db.session.add(row)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent retry of the same message stored it first
+        db.session.rollback()
+
+
+def put(key: str, value: List[Dict[str, Any]], model: Optional[str] = None):
+    put_many({key: value}, model=model)
@@ -0,0 +1,190 @@
+import os
+import re
+import csv
+import bisect
+import threading
+import unicodedata
+from array import array
+from typing import Optional, List, Tuple
+
+# GeoNames dump (e.g. FI.txt from https://download.geonames.org/export/dump/)
+# or a CSV with name,latitude,longitude[,population] columns
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "")
+# Optional comma separated ISO country codes to keep from a GeoNames dump
+GAZETTEER_COUNTRIES = {c.strip().upper() for c in os.getenv("GAZETTEER_COUNTRIES", "").split(",") if c.strip()}
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+# Trailing country names people add to place strings ("Oulu, Finland")
+_COUNTRY_SUFFIXES = (" finland", " suomi")
+_MAX_FUZZY_CANDIDATES = 5000
+
+
+def normalize_name(text: str) -> str:
+    """Lower case ASCII form: 'Kilpisjärvi, K-Market' -> 'kilpisjarvi k market'."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return _NON_ALNUM_RE.sub(" ", text).strip()
+
+
+def _within_edit_distance(a: str, b: str, limit: int) -> bool:
+    """Banded Levenshtein check, stops as soon as the distance must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            row_min = min(row_min, cur[j])
+        if row_min > limit:
+            return False
+        prev = cur
+    return prev[-1] <= limit
+
+
+class Gazetteer:
+    """
+    Place names held as one sorted list of normalized keys with parallel
+    coordinate/population arrays. Exact and prefix lookups are binary searches.
+    """
+
+    def __init__(self, entries: List[Tuple[str, float, float, int, str]]):
+        best = {}
+        for key, lon, lat, population, display in entries:
+            if key and (key not in best or population > best[key][2]):
+                best[key] = (lon, lat, population, display)
+        self.keys = sorted(best)
+        self.lons = array("d", (best[k][0] for k in self.keys))
+        self.lats = array("d", (best[k][1] for k in self.keys))
+        self.population = array("q", (best[k][2] for k in self.keys))
+        self.display = [best[k][3] for k in self.keys]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _result(self, i: int) -> Tuple[float, float, str]:
+        return self.lons[i], self.lats[i], self.display[i]
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\uffff")
+        return lo, hi
+
+    def exact(self, text: str) -> Optional[Tuple[float, float, str]]:
+        key = normalize_name(text)
+        for suffix in _COUNTRY_SUFFIXES:
+            if key.endswith(suffix) and len(key) > len(suffix):
+                key = key[: -len(suffix)].strip()
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self._result(i)
+        return None
+
+    def prefix(self, prefix: str, limit: int = 10) -> List[Tuple[float, float, str]]:
+        """Places whose name starts with prefix, most populous first."""
+        lo, hi = self._prefix_range(normalize_name(prefix))
+        rows = sorted(range(lo, hi), key=lambda i: -self.population[i])[:limit]
+        return [self._result(i) for i in rows]
+
+    def fuzzy(self, text: str) -> Optional[Tuple[float, float, str]]:
+        """Closest name within a small edit distance that shares the first two letters."""
+        key = normalize_name(text)
+        if len(key) < 5:
+            return None
+        limit = 1 if len(key) < 9 else 2
+        lo, hi = self._prefix_range(key[:2])
+        best = None
+        for i in range(lo, min(hi, lo + _MAX_FUZZY_CANDIDATES)):
+            if _within_edit_distance(key, self.keys[i], limit):
+                if best is None or self.population[i] > self.population[best]:
+                    best = i
+        return self._result(best) if best is not None else None
+
+    def contained(self, text: str) -> Optional[Tuple[float, float, str]]:
+        """
+        Coarse fallback: the most populous known place named inside a longer
+        string ("Tampere central hospital" -> Tampere).
+        """
+        words = normalize_name(text).split()
+        best = None
+        for n in (3, 2, 1):
+            for start in range(len(words) - n + 1):
+                phrase = " ".join(words[start:start + n])
+                if len(phrase) < 3:
+                    continue
+                i = bisect.bisect_left(self.keys, phrase)
+                if i < len(self.keys) and self.keys[i] == phrase:
+                    if best is None or self.population[i] > self.population[best]:
+                        best = i
+            if best is not None:
+                return self._result(best)
+        return None
+
+
+def _read_geonames(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15:
+                continue
+            if GAZETTEER_COUNTRIES and cols[8].upper() not in GAZETTEER_COUNTRIES:
+                continue
+            try:
+                lat, lon = float(cols[4]), float(cols[5])
+                population = int(cols[14] or 0)
+            except ValueError:
+                continue
+            names = {cols[1], cols[2], *cols[3].split(",")}
+            for name in names:
+                if name:
+                    yield normalize_name(name), lon, lat, population, cols[1]
+
+
+def _read_csv(path: str):
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                lat = float(row.get("latitude") or row.get("lat"))
+                lon = float(row.get("longitude") or row.get("lon"))
+            except (TypeError, ValueError):
+                continue
+            try:
+                # "1,200" and "1200.0" are common spreadsheet exports
+                population = int(float((row.get("population") or "0").replace(",", "").replace(" ", "")))
+            except ValueError:
+                population = 0
+            yield normalize_name(row.get("name", "")), lon, lat, population, row.get("name", "")
+
+
+def load(path: str) -> Gazetteer:
+    with open(path, encoding="utf-8") as f:
+        first = f.readline()
+    reader = _read_csv if "," in first and "name" in first.lower() else _read_geonames
+    return Gazetteer(list(reader(path)))
+
+
+_gazetteer = None
+_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """The process-wide gazetteer, loaded from GAZETTEER_PATH on first use (None if unset)."""
+    global _gazetteer
+    if _gazetteer is None and GAZETTEER_PATH:
+        with _lock:
+            if _gazetteer is None:
+                try:
+                    _gazetteer = load(GAZETTEER_PATH)
+                    print(f"[gazetteer] Loaded {len(_gazetteer)} place names from {GAZETTEER_PATH}")
+                except (OSError, ValueError) as e:
+                    print(f"[gazetteer] Could not load {GAZETTEER_PATH}: {e}")
+                    _gazetteer = False
+    return _gazetteer or None
+
+
+def reload():
+    """Drop the loaded gazetteer so the next lookup re-reads GAZETTEER_PATH."""
+    global _gazetteer
+    with _lock:
+        _gazetteer = None
@@ -1,34 +1,288 @@
-## services/geocode.py
-
-from typing import Optional, Dict, Any
+import os
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+from flask import has_app_context
 from geopy.geocoders import Nominatim
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import GeocodeCache
+from services.gazetteer import get_gazetteer
+
+# Process-wide worker count, concurrent lookups per request, and the overall
+# request rate sent to Nominatim (its public usage policy allows ~1/s)
+POOL_SIZE = int(os.getenv("GEOCODE_POOL_SIZE", "8"))
+MAX_CONCURRENCY = int(os.getenv("GEOCODE_MAX_CONCURRENCY", "4"))
+MAX_PER_SECOND = float(os.getenv("GEOCODE_MAX_PER_SECOND", "1"))
+TIMEOUT_SECONDS = float(os.getenv("GEOCODE_TIMEOUT_SECONDS", "10"))
+
+# Cache lifetimes for hits and misses, and the in-process LRU in front of the table
+CACHE_TTL = timedelta(days=float(os.getenv("GEOCODE_CACHE_TTL_DAYS", "30")))
+NEGATIVE_TTL = timedelta(hours=float(os.getenv("GEOCODE_NEGATIVE_TTL_HOURS", "24")))
+LRU_SIZE = int(os.getenv("GEOCODE_LRU_SIZE", "2048"))
+
+_MISSING = object()
+_WS_RE = re.compile(r"\s+")
+
+_lru: "OrderedDict[str, Tuple[datetime, Optional[Tuple[float, float, str]]]]" = OrderedDict()
+_lru_lock = threading.Lock()
 
+# Lookups currently waiting on Nominatim, shared by identical concurrent requests
+_inflight = {}
+_inflight_lock = threading.Lock()
 
 _geocoder = None
+_executor = None
+_init_lock = threading.Lock()
+_rate_lock = threading.Lock()
+_next_slot = 0.0
 
 
 def _get_geocoder():
     global _geocoder
     if _geocoder is None:
-        _geocoder = Nominatim(user_agent='resource-intake-app')
+        with _init_lock:
+            if _geocoder is None:
+                _geocoder = Nominatim(user_agent='resource-intake-app', timeout=TIMEOUT_SECONDS)
     return _geocoder
 
 
-def geocode_to_geojson(location_text: str) -> Optional[Dict[str, Any]]:
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="geocode")
+    return _executor
+
+
+def _throttle():
+    """Reserve the next send slot so all threads together stay under MAX_PER_SECOND."""
+    global _next_slot
+    if MAX_PER_SECOND <= 0:
+        return
+    with _rate_lock:
+        now = time.monotonic()
+        slot = max(now, _next_slot)
+        _next_slot = slot + 1.0 / MAX_PER_SECOND
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def normalize_key(location_text: str) -> str:
+    """Cache key for a place string: NFKC, lower case, single spaces, no edge punctuation."""
+    text = unicodedata.normalize("NFKC", location_text or "").lower()
+    text = _WS_RE.sub(" ", text).strip(" .,;:!?\"'")
+    if len(text) > 255:
+        return "sha1:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return text
+
+
+def _lru_get(key: str):
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] <= datetime.utcnow():
+            del _lru[key]
+            return _MISSING
+        _lru.move_to_end(key)
+        return entry[1]
+
+
+def _lru_put(key: str, expires_at: datetime, value):
+    with _lru_lock:
+        _lru[key] = (expires_at, value)
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _cache_lookup(keys: List[str]) -> Dict[str, Optional[Tuple[float, float, str]]]:
+    """Cached answers for keys (None = cached miss); keys without a live entry are absent."""
+    found = {}
+    missing = []
+    for key in keys:
+        value = _lru_get(key)
+        if value is _MISSING:
+            missing.append(key)
+        else:
+            found[key] = value
+
+    if missing and has_app_context():
+        rows = GeocodeCache.query.filter(
+            GeocodeCache.query_key.in_(missing),
+            GeocodeCache.expires_at > datetime.utcnow(),
+        ).all()
+        for row in rows:
+            value = (row.longitude, row.latitude, row.display_name) if row.found else None
+            found[row.query_key] = value
+            _lru_put(row.query_key, row.expires_at, value)
+    return found
+
+
+def _cache_store(results: Dict[str, Optional[Tuple[float, float, str]]]):
+    """Persist fresh geocoder answers (positive and negative) to the LRU and the table."""
+    if not results:
+        return
+    now = datetime.utcnow()
+    for key, value in results.items():
+        _lru_put(key, now + (CACHE_TTL if value else NEGATIVE_TTL), value)
+
+    if not has_app_context():
+        return
+    existing = {
+        row.query_key: row
+        for row in GeocodeCache.query.filter(GeocodeCache.query_key.in_(list(results)))
+    }
+    for key, value in results.items():
+        row = existing.get(key) or GeocodeCache(query_key=key)
+        row.found = value is not None
+        row.longitude, row.latitude, row.display_name = value if value else (None, None, None)
+        row.created_at = now
+        row.expires_at = now + (CACHE_TTL if value else NEGATIVE_TTL)
+        db.session.add(row)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker cached the same place first; its row is just as good
+        db.session.rollback()
+
+
+def _fetch_point(location_text: str) -> Optional[Tuple[float, float, str]]:
+    """Ask Nominatim directly. Returns None when not found and raises on network errors."""
+    _throttle()
+    loc = _get_geocoder().geocode(location_text, addressdetails=True)
+    if not loc:
+        return None
+    return loc.longitude, loc.latitude, loc.address
+
+
+def _schedule(key: str, text: str, slots: threading.BoundedSemaphore):
+    """
+    Submit a Nominatim lookup unless the same key is already in flight, in which
+    case the caller shares that future. Returns (future, submitted_by_this_call).
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future, False
+
+    slots.acquire()
+
+    def run():
+        try:
+            return _fetch_point(text)
+        finally:
+            slots.release()
+
+    with _inflight_lock:
+        # Re-check: another request may have submitted while we waited for a slot
+        future = _inflight.get(key)
+        if future is not None:
+            slots.release()
+            return future, False
+        future = _get_executor().submit(run)
+        _inflight[key] = future
+    future.add_done_callback(lambda _f: _drop_inflight(key, _f))
+    return future, True
+
+
+def _drop_inflight(key: str, future):
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+def geocode_point(location_text: str) -> Optional[Tuple[float, float, str]]:
+    """Geocode free text to (lon, lat, display_name); None if not found or on error."""
     if not location_text:
         return None
-    geocoder = _get_geocoder()
-    loc = geocoder.geocode(location_text, addressdetails=True, timeout=10)
-    if not loc:
+    return geocode_many([location_text], max_concurrency=1)[0]
+
+
+def geocode_many(location_texts: List[Optional[str]], max_concurrency: Optional[int] = None):
+    """
+    Geocode several place strings. Exact place names are answered by the local
+    gazetteer, repeats by the cache, and only true misses are sent concurrently
+    (rate limited and coalesced) to Nominatim. Results are returned in input order.
+    """
+    keys = [normalize_key(t) if t else None for t in location_texts]
+    unique = list(dict.fromkeys(k for k in keys if k))
+    if not unique:
+        return [None] * len(location_texts)
+
+    # 1. Offline gazetteer for exact place names, 2. geocode cache, 3. Nominatim
+    gazetteer = get_gazetteer()
+    results = {}
+    if gazetteer:
+        for text, key in zip(location_texts, keys):
+            if key and key not in results:
+                point = gazetteer.exact(text)
+                if point:
+                    results[key] = point
+    results.update(_cache_lookup([k for k in unique if k not in results]))
+
+    # Geocode with the first original spelling of each key
+    misses = {}
+    for text, key in zip(location_texts, keys):
+        if key and key not in results and key not in misses:
+            misses[key] = text
+
+    if misses:
+        slots = threading.BoundedSemaphore(max_concurrency or MAX_CONCURRENCY)
+        futures = {}
+        owned = set()
+        for key, text in misses.items():
+            futures[key], is_new = _schedule(key, text, slots)
+            if is_new:
+                owned.add(key)
+
+        fresh = {}
+        for key, future in futures.items():
+            try:
+                value = future.result()
+            except Exception as e:
+                # Errors are not cached so the next request tries again
+                print(f"[geocode] Lookup failed for {misses[key]!r}: {e}")
+                results[key] = None
+                continue
+            results[key] = value
+            # Only the request that issued the lookup persists it
+            if key in owned:
+                fresh[key] = value
+        _cache_store(fresh)
+
+    if gazetteer:
+        # Fallbacks for strings Nominatim could not place: a near spelling of a
+        # known name, then a known name inside a POI string ("X hospital, Tampere").
+        # Only after the miss, so a real place close to a listed one is not misplaced
+        for text, key in zip(location_texts, keys):
+            if key and results.get(key) is None:
+                results[key] = gazetteer.fuzzy(text) or gazetteer.contained(text)
+
+    return [results.get(k) if k else None for k in keys]
+
+
+def geocode_to_geojson(location_text: str) -> Optional[Dict[str, Any]]:
+    point = geocode_point(location_text)
+    if not point:
         return None
+    lon, lat, address = point
     return {
         "type": "Feature",
         "geometry": {
             "type": "Point",
-            "coordinates": [loc.longitude, loc.latitude]
+            "coordinates": [lon, lat]
         },
         "properties": {
-            "display_name": loc.address
+            "display_name": address
         }
     }
-
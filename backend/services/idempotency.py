@@ -0,0 +1,101 @@
+import os
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import IdempotencyRecord
+
+# How long a key keeps answering with its original response
+KEY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+# Lease on a key whose request is still running; a crashed request frees it after this
+PENDING_TTL = timedelta(minutes=float(os.getenv("IDEMPOTENCY_PENDING_TTL_MINUTES", "10")))
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key is in use by a running request or was used with a different body."""
+
+    def __init__(self, message: str, status: int = 409):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _digest(part) -> bytes:
+    if not hasattr(part, "read"):
+        return hashlib.sha256(part or b"").digest()
+    # File objects are read in chunks and rewound for the handler
+    h = hashlib.sha256()
+    start = part.tell()
+    for chunk in iter(lambda: part.read(64 * 1024), b""):
+        h.update(chunk)
+    part.seek(start)
+    return h.digest()
+
+
+def fingerprint(*parts) -> str:
+    """Hash of the request parts: bytes, or seekable file objects."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(_digest(part))
+    return h.hexdigest()
+
+
+def begin(key: str, request_fingerprint: str) -> Optional[Tuple[dict, int]]:
+    """
+    Reserve key for this request. Returns the stored (body, status) when the key
+    already completed, None when the caller should run the request, and raises
+    IdempotencyConflict when it is still running or the body differs.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyConflict(f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters.", 400)
+
+    now = datetime.utcnow()
+    record = IdempotencyRecord.query.filter_by(key=key).first()
+    if record is not None and record.expires_at <= now:
+        db.session.delete(record)
+        db.session.commit()
+        record = None
+
+    if record is None:
+        db.session.add(IdempotencyRecord(
+            key=key, fingerprint=request_fingerprint, status='pending',
+            created_at=now, expires_at=now + PENDING_TTL,
+        ))
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            # A concurrent retry reserved it between our read and insert
+            db.session.rollback()
+            record = IdempotencyRecord.query.filter_by(key=key).first()
+            if record is None:
+                raise IdempotencyConflict("Request with this Idempotency-Key is being retried, try again.")
+
+    if record.fingerprint != request_fingerprint:
+        raise IdempotencyConflict("Idempotency-Key was already used with a different request body.", 422)
+    if record.status != 'done':
+        raise IdempotencyConflict("A request with this Idempotency-Key is still being processed.")
+    return record.response, record.status_code
+
+
+def complete(key: str, body: dict, status: int):
+    """Store the response for key so retries replay it for KEY_TTL."""
+    record = IdempotencyRecord.query.filter_by(key=key).first()
+    if record is None:
+        return
+    record.status = 'done'
+    record.response = body
+    record.status_code = status
+    record.expires_at = datetime.utcnow() + KEY_TTL
+    db.session.commit()
+
+
+def abandon(key: str):
+    """Release the key after an error so the client may retry the request."""
+    db.session.rollback()
+    IdempotencyRecord.query.filter_by(key=key, status='pending').delete()
+    db.session.commit()
@@ -0,0 +1,195 @@
+import os
+from datetime import datetime
+from typing import Dict, Any, List
+
+from extensions import db
+from models import Resource, UserType, Category, Subcategory
+from services import abuse_scorer, match_cache
+from services.vector_index import index_resources
+
+# Rows written per commit by the batch endpoint
+BATCH_INSERT_CHUNK = int(os.getenv("BATCH_INSERT_CHUNK", "500"))
+
+
+class IntakeError(Exception):
+    """A message that cannot be turned into resources; carries the HTTP status to report."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def notify_resources_changed(resources):
+    """Propagate committed Resource inserts/updates to the in-process indexes and caches."""
+    index_resources(resources)
+    abuse_scorer.observe(resources)
+    match_cache.invalidate()
+
+
+def _commit_keeping_rows():
+    """
+    Commit without expiring loaded objects. The rows just inserted are read right
+    after (indexes, to_dict) and would otherwise be SELECTed again one by one.
+    """
+    session = db.session()
+    expire = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = expire
+
+
+def validate_metadata(metadata: Dict[str, Any]):
+    if not metadata.get("incident_location"):
+        raise IntakeError("Missing required 'incident_location' field in metadata.")
+
+
+def extract(text: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run the LLM extraction (and abuse check) for one message."""
+    from services.llm import extract_resource_fields
+
+    text = (text or "").strip()
+    if not text:
+        raise IntakeError("No text to process (provide text or audio).")
+    validate_metadata(metadata)
+
+    extracted_list = extract_resource_fields(
+        text=text,
+        incident_location=metadata.get("incident_location"),
+        user_type=metadata.get("user_type"),
+        user_location=metadata.get("user_location"),
+    )
+    if not extracted_list:
+        raise IntakeError("Could not extract any valid resources from the message.")
+    return extracted_list
+
+
+def _enum_or_none(enum_cls, value):
+    if value is None or isinstance(value, enum_cls):
+        return value
+    try:
+        return enum_cls[str(value).strip().upper()]
+    except KeyError:
+        return None
+
+
+def build_resources(extracted_list: List[Dict[str, Any]], text: str, metadata: Dict[str, Any]) -> List[Resource]:
+    """Turn extracted dicts into (unsaved) Resource rows, skipping ones without a location."""
+    user_type_val = metadata.get("user_type")
+    user_type = None
+    if user_type_val:
+        try:
+            user_type = UserType(user_type_val)
+        except ValueError:
+            pass
+
+    location_geojson = metadata.get("incident_location")
+    resources = []
+
+    for extracted in extracted_list:
+        if not extracted.get("location_geojson"):
+            continue
+
+        try:
+            quantity = int(extracted.get('quantity')) if extracted.get('quantity') is not None else None
+        except Exception:
+            quantity = None
+
+        resources.append(Resource(
+            category=_enum_or_none(Category, extracted.get('category')),
+            subcategory=_enum_or_none(Subcategory, extracted.get('subcategory')),
+            name=extracted.get('name') or 'unknown',
+            quantity=quantity,
+            num_available_people=extracted.get('num_available_people'),
+            location_geojson=extracted.get("location_geojson") or location_geojson,
+            location_text=extracted.get("location_text"),
+            distance_km=extracted.get("distance_km"),
+            phone_number=extracted.get("phone_number") or metadata.get("phone_number"),
+            email=extracted.get("email") or metadata.get("email"),
+            first_name=extracted.get("first_name") or metadata.get("first_name"),
+            last_name=extracted.get("last_name") or metadata.get("last_name"),
+            source_text=text,
+            user_type=user_type,
+            created_at=datetime.utcnow(),
+            flagged=extracted.get('flagged', False),
+            abuse_reason=extracted.get('abuse_reason'),
+        ))
+    return resources
+
+
+def save(extracted_list: List[Dict[str, Any]], text: str, metadata: Dict[str, Any]) -> List[Resource]:
+    resources = build_resources(extracted_list, text, metadata)
+    db.session.add_all(resources)
+    _commit_keeping_rows()
+    notify_resources_changed(resources)
+    return resources
+
+
+def process_text(text: str, metadata: Dict[str, Any]) -> List[Resource]:
+    """Full synchronous pipeline for a text message: extract, then store."""
+    text = (text or "").strip()
+    extracted_list = extract(text, metadata)
+    return save(extracted_list, text, metadata)
+
+
+def process_batch(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Batch pipeline for many text messages. items are {"text", "metadata"} dicts;
+    returns one {"index", "ok", "resources" | "error"} entry per item, in order.
+    Rows are inserted in chunks of BATCH_INSERT_CHUNK with one commit each.
+    """
+    from services.llm import extract_resource_fields_batch
+
+    results: List[Dict[str, Any]] = [None] * len(items)
+    pending = []
+    for i, item in enumerate(items):
+        text = (item.get("text") or "").strip()
+        metadata = item.get("metadata") or {}
+        if not text:
+            results[i] = {"index": i, "ok": False, "error": "No text to process."}
+            continue
+        try:
+            validate_metadata(metadata)
+        except IntakeError as e:
+            results[i] = {"index": i, "ok": False, "error": e.message}
+            continue
+        pending.append((i, text, metadata))
+
+    extracted = extract_resource_fields_batch([
+        {
+            "text": text,
+            "incident_location": metadata.get("incident_location"),
+            "user_type": metadata.get("user_type"),
+            "user_location": metadata.get("user_location"),
+        }
+        for _, text, metadata in pending
+    ])
+
+    built = []
+    for (i, text, metadata), outcome in zip(pending, extracted):
+        if outcome.get("error"):
+            results[i] = {"index": i, "ok": False, "error": outcome["error"]}
+            continue
+        resources = build_resources(outcome.get("resources", []), text, metadata)
+        if not resources:
+            results[i] = {"index": i, "ok": False,
+                          "error": "Could not extract any valid resources from the message."}
+            continue
+        built.append((i, resources))
+
+    # Bulk insert: one add_all/commit per chunk of rows rather than per message
+    chunk, chunk_items = [], []
+    for n, (i, resources) in enumerate(built):
+        chunk.extend(resources)
+        chunk_items.append((i, resources))
+        if len(chunk) >= BATCH_INSERT_CHUNK or n == len(built) - 1:
+            db.session.add_all(chunk)
+            _commit_keeping_rows()
+            notify_resources_changed(chunk)
+            for j, rows in chunk_items:
+                results[j] = {"index": j, "ok": True, "resources": [r.to_dict() for r in rows]}
+            chunk, chunk_items = [], []
+
+    return results
@@ -0,0 +1,211 @@
+import os
+import uuid
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from sqlalchemy import and_, or_
+
+from extensions import db
+from models import IntakeJob
+from services import intake, llm_usage
+
+# Background workers per process, retries per job and the polling fallback
+WORKERS = int(os.getenv("INTAKE_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("INTAKE_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("INTAKE_RETRY_BACKOFF_SECONDS", "5"))
+POLL_SECONDS = float(os.getenv("INTAKE_POLL_SECONDS", "2"))
+# A job left 'running' this long belonged to a worker that died; pick it up again.
+# Live workers refresh their job several times per period, however long a stage takes
+STALE_SECONDS = float(os.getenv("INTAKE_STALE_SECONDS", "600"))
+HEARTBEAT_SECONDS = STALE_SECONDS / 4
+
+_wake = threading.Event()
+_started = False
+_start_lock = threading.Lock()
+
+
+def enqueue(text: Optional[str], metadata: Dict[str, Any], audio_path: Optional[str] = None,
+            transcription: Optional[Dict[str, Any]] = None) -> IntakeJob:
+    """
+    Persist a raw message as a queued job and wake a worker. transcription holds
+    the model_size/beam_size chosen for audio; it is kept in the job metadata.
+    """
+    now = datetime.utcnow()
+    if transcription:
+        metadata = {**metadata, "transcription": transcription}
+    job = IntakeJob(
+        id=uuid.uuid4().hex,
+        status='queued',
+        stage='transcribe' if audio_path else 'extract',
+        text=text,
+        audio_path=audio_path,
+        message_metadata=metadata,
+        run_after=now,
+        created_at=now,
+        updated_at=now,
+    )
+    db.session.add(job)
+    db.session.commit()
+    _wake.set()
+    return job
+
+
+def start_workers(app):
+    """Start the intake worker threads once per process."""
+    global _started
+    with _start_lock:
+        if _started or WORKERS <= 0:
+            return
+        _started = True
+    for i in range(WORKERS):
+        threading.Thread(target=_worker_loop, args=(app,), name=f"intake-worker-{i}", daemon=True).start()
+    print(f"[intake] Started {WORKERS} background intake workers")
+
+
+def _claim() -> Optional[IntakeJob]:
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=STALE_SECONDS)
+    job = IntakeJob.query.filter(or_(
+        and_(IntakeJob.status == 'queued', IntakeJob.run_after <= now),
+        and_(IntakeJob.status == 'running', IntakeJob.updated_at < stale),
+    )).order_by(IntakeJob.created_at).first()
+    if job is None:
+        return None
+
+    # Optimistic claim: only the worker whose UPDATE matches the old row wins
+    claimed = IntakeJob.query.filter(
+        IntakeJob.id == job.id,
+        IntakeJob.status == job.status,
+        IntakeJob.updated_at == job.updated_at,
+    ).update({"status": "running", "updated_at": now}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return None
+    return db.session.get(IntakeJob, job.id)
+
+
+def _remove_audio(job: IntakeJob):
+    if job.audio_path:
+        try:
+            os.unlink(job.audio_path)
+        except OSError:
+            pass
+
+
+def _run(job: IntakeJob):
+    from services.transcribe import transcribe_audio
+
+    try:
+        if job.stage == 'transcribe':
+            options = (job.message_metadata or {}).get("transcription") or {}
+            text, _ = transcribe_audio(job.audio_path, options.get("model_size"), options.get("beam_size"))
+            job.text = text
+            job.stage = 'extract'
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+
+        if job.stage == 'extract':
+            job.extracted = intake.extract(job.text, job.message_metadata or {})
+            job.stage = 'save'
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+
+        if job.stage == 'save':
+            # Resources and the job result go in one commit so a retry never duplicates rows
+            resources = intake.build_resources(job.extracted, (job.text or '').strip(), job.message_metadata or {})
+            db.session.add_all(resources)
+            db.session.flush()
+            job.result = {"ok": True, "resources": [r.to_dict() for r in resources]}
+            job.stage = 'done'
+            job.status = 'done'
+            job.error = None
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+            _after_done(job, resources)
+
+    except intake.IntakeError as e:
+        if e.status >= 500:
+            # Temporary overload (e.g. a full transcription queue)
+            _retry_later(job, e)
+            return
+        # The message itself is unusable; retrying will not help
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = e.message
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+        _remove_audio(job)
+
+    except Exception as e:
+        _retry_later(job, e)
+
+
+def _after_done(job: IntakeJob, resources):
+    """Side effects of a finished job; the job is committed, so failures are only logged."""
+    try:
+        intake.notify_resources_changed(resources)
+    except Exception as e:
+        print(f"[intake] Job {job.id} saved, but notifying about its resources failed: {e}")
+    _remove_audio(job)
+
+
+def _retry_later(job: IntakeJob, e: Exception):
+    db.session.rollback()
+    if job.stage == 'done':
+        # Already committed as finished; running it again would duplicate its resources
+        print(f"[intake] Job {job.id} failed after it was saved: {e}")
+        return
+    job.attempts += 1
+    job.error = str(e)
+    job.updated_at = datetime.utcnow()
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = 'failed'
+        _remove_audio(job)
+    else:
+        job.status = 'queued'
+        job.run_after = datetime.utcnow() + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+    db.session.commit()
+    print(f"[intake] Job {job.id} failed at stage {job.stage} (attempt {job.attempts}): {e}")
+
+
+def _heartbeat(app, job_id: str, stop: threading.Event):
+    """Keep a running job's updated_at fresh (e.g. during a long transcription) so it is not reclaimed."""
+    with app.app_context():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            try:
+                IntakeJob.query.filter(IntakeJob.id == job_id, IntakeJob.status == 'running').update(
+                    {"updated_at": datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[intake] Heartbeat for job {job_id} failed: {e}")
+            finally:
+                db.session.remove()
+
+
+def _worker_loop(app):
+    with app.app_context():
+        while True:
+            try:
+                job = _claim()
+                if job is not None:
+                    stop = threading.Event()
+                    threading.Thread(target=_heartbeat, args=(app, job.id, stop),
+                                     name=f"intake-heartbeat-{job.id[:8]}", daemon=True).start()
+                    try:
+                        with llm_usage.scope("intake_job"):
+                            _run(job)
+                    finally:
+                        stop.set()
+                    llm_usage.flush()
+            except Exception as e:
+                print(f"[intake] Worker error: {e}")
+                db.session.rollback()
+                job = None
+            finally:
+                db.session.remove()
+
+            if job is None:
+                _wake.wait(POLL_SECONDS)
+                _wake.clear()
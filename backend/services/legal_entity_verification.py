@@ -1,18 +1,19 @@
 import os
 import re
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
 from flask import current_app
-from openai import OpenAI
 
-# Try initializing OpenAI client
-_OPENAI_AVAILABLE = bool(os.getenv("OPENAI_API_KEY"))
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if _OPENAI_AVAILABLE else None
+from services import openai_client, llm_scheduler, llm_usage, domain_verdict_cache, domain_rules
+
+# Concurrent OpenAI calls when a batch has several uncached domains
+MAX_WORKERS = int(os.getenv("VERIFY_MAX_WORKERS", "8"))
 
-# Disallowed personal or educational domains
-DISALLOWED_DOMAINS = [
-    "gmail.com", "yahoo.com", "hotmail.com", "outlook.com",
-    "protonmail.com", "icloud.com", "mail.com", "edu"
-]
+_executor = None
+_executor_lock = threading.Lock()
 
 
 def extract_domain(email: str) -> str:
@@ -22,65 +23,22 @@ def extract_domain(email: str) -> str:
 
 
 def is_generic_domain(domain: str) -> bool:
-    """Return True if domain looks personal or educational."""
-    return any(bad in domain for bad in DISALLOWED_DOMAINS)
+    """Return True if domain is a personal mail provider or educational (see domain_rules.json)."""
+    hit = domain_rules.match(domain)
+    return hit is not None and hit[0] == "disallowed"
 
 
 def _heuristic_verification(domain: str, user_type: str) -> dict:
-    """Offline fallback check using simple rules."""
+    """Offline fallback: the rule verdict, or a rejection when no rule settles the domain."""
     d = domain.lower()
-    t = user_type.upper()
-
-    # Block generics
-    if is_generic_domain(d):
-        return {"ok": False, "reason": f"Generic or educational domain ({d}) not allowed.", "domain": d}
-
-    # Simple heuristics
-    if t == "GOVERNMENT_AGENCY":
-        if d.endswith(".gov") or d.endswith(".gov.fi") or "valtioneuvosto" in d or "police" in d or "defence" in d:
-            return {"ok": True, "reason": "Recognized as a government domain.", "domain": d}
-        return {"ok": False, "reason": "Domain not recognized as governmental.", "domain": d}
-
-    if t == "LOCAL_AUTHORITY":
-        if d.endswith(".fi") and any(city in d for city in ["helsinki", "turku", "tampere", "oulu", "espoo"]):
-            return {"ok": True, "reason": "Municipal Finnish domain detected.", "domain": d}
-        return {"ok": False, "reason": "No municipal indicators in domain.", "domain": d}
-
-    if t == "NGO":
-        if d.endswith(".org") or ".org." in d or "ngo" in d or "aid" in d or "foundation" in d:
-            return {"ok": True, "reason": "Domain suggests non-profit organization.", "domain": d}
-        return {"ok": False, "reason": "Domain lacks NGO indicators.", "domain": d}
-
-    if t == "CORPORATE_ENTITY":
-        if any(d.endswith(suf) for suf in [".com", ".net", ".io", ".co", ".fi"]) and not (
-            "gov" in d or "org" in d
-        ):
-            return {"ok": True, "reason": "Likely corporate or private domain.", "domain": d}
-        return {"ok": False, "reason": "Domain not typical for corporate entities.", "domain": d}
+    verdict = domain_rules.decide(d, user_type)
+    if verdict is None:
+        verdict = {"ok": False, "reason": f"Domain not recognized as {user_type}.", "rule": None}
+    return {**verdict, "domain": d}
 
-    # Fallback default
-    return {"ok": False, "reason": "Unknown user_type or unrecognized domain.", "domain": d}
-
-
-def verify_legal_entity(email: str, user_type: str):
-    """
-    Uses OpenAI to check if an email domain plausibly matches the claimed user_type.
-    Falls back to rule-based heuristic if OpenAI is unavailable.
-    Returns: {"ok": bool, "reason": str, "domain": str}
-    """
-    domain = extract_domain(email)
-    if not domain:
-        return {"ok": False, "reason": "Invalid email format.", "domain": None}
 
-    if is_generic_domain(domain):
-        return {"ok": False, "reason": f"Generic or educational domain ({domain}) not allowed.", "domain": domain}
-
-    # --- If no OpenAI key or client, fallback immediately ---
-    if not _OPENAI_AVAILABLE:
-        current_app.logger.warning("[legal_entity_verification] OpenAI key not found, using fallback heuristics.")
-        return _heuristic_verification(domain, user_type)
-
-    # --- OpenAI-powered verification ---
+def _ask_model(client, model: str, domain: str, user_type: str) -> dict:
+    """One OpenAI verdict {"ok", "reason"} for a domain and claimed user type."""
     prompt = f"""
     You are a domain verification AI for a national emergency coordination platform.
 
@@ -89,7 +47,7 @@ def verify_legal_entity(email: str, user_type: str):
 
     Determine if this domain plausibly belongs to that type:
     - GOVERNMENT_AGENCY → national or regional government domains (.gov, .gov.fi, valtioneuvosto.fi)
-    - LOCAL_AUTHORITY → municipal or city domains (e.g., helsinki.fi, tampere.fi)
+    - LOCAL_AUTHORITY → municipal or city domains (e.g., hel.fi, tampere.fi)
     - NGO → domains ending in .org, .org.fi, or containing 'ngo', 'aid', or 'foundation'
     - CORPORATE_ENTITY → private company domains (.com, .fi, .net, .io, .co), not government or NGO
 
@@ -100,21 +58,103 @@ def verify_legal_entity(email: str, user_type: str):
     }}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Output valid JSON only."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0,
-        )
-        text = response.choices[0].message.content.strip()
-        parsed = json.loads(text)
-        valid = parsed.get("valid", False)
-        reason = parsed.get("reason", "No reason provided.")
-        return {"ok": bool(valid), "reason": reason, "domain": domain}
-
-    except Exception as e:
-        current_app.logger.error(f"[legal_entity_verification] OpenAI check failed: {e}")
-        return _heuristic_verification(domain, user_type)
+    response = llm_scheduler.complete(
+        client,
+        llm_scheduler.priority_for("verify", user_type),
+        operation="verify_legal_entity",
+        model=model,
+        messages=[
+            {"role": "system", "content": "Output valid JSON only."},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0,
+    )
+    text = response.choices[0].message.content.strip()
+    parsed = json.loads(text)
+    return {"ok": bool(parsed.get("valid", False)), "reason": parsed.get("reason", "No reason provided.")}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="verify")
+    return _executor
+
+
+def _ask_many(keys: List[tuple]) -> Tuple[Dict[tuple, dict], Dict[tuple, Exception]]:
+    """OpenAI verdicts for distinct (domain, user_type) keys, concurrently when there are several."""
+    client = openai_client.get_client()
+    model = openai_client.get_model()
+    verdicts, errors = {}, {}
+    if len(keys) == 1:
+        futures = {keys[0]: None}
+    else:
+        executor = _get_executor()
+        futures = {key: llm_usage.submit(executor, _ask_model, client, model, *key) for key in keys}
+    for key, future in futures.items():
+        try:
+            verdicts[key] = future.result() if future else _ask_model(client, model, *key)
+        except Exception as e:
+            errors[key] = e
+    return verdicts, errors
+
+
+def verify_legal_entities(entries: List[Tuple[str, str]]) -> List[dict]:
+    """
+    Verify many (email, user_type) pairs. Verdicts depend only on (domain, user_type):
+    each distinct pair is first checked against the domain rules, then looked up
+    in the domain_verdicts cache, and the rest are sent to OpenAI concurrently,
+    one call per pair. Returns one {"ok", "reason", "domain", "rule", "cached"}
+    per entry, in order; "rule" names the rule that settled it, if any.
+    """
+    results: List[dict] = [None] * len(entries)
+    keys: Dict[tuple, List[int]] = {}
+    for i, (email, user_type) in enumerate(entries):
+        domain = extract_domain(email)
+        if not domain:
+            results[i] = {"ok": False, "reason": "Invalid email format.", "domain": None, "rule": None,
+                          "cached": False}
+        else:
+            keys.setdefault(domain_verdict_cache.make_key(domain, user_type), []).append(i)
+
+    # Rule verdicts are not cached, so edits to the rules file apply at once
+    verdicts = {}
+    for key in keys:
+        verdict = domain_rules.decide(*key)
+        if verdict is not None:
+            verdicts[key] = verdict
+    unsettled = [key for key in keys if key not in verdicts]
+    verdicts.update({key: {**v, "cached": True} for key, v in domain_verdict_cache.get_many(unsettled).items()})
+    misses = [key for key in unsettled if key not in verdicts]
+
+    if misses and not openai_client.available():
+        current_app.logger.warning("[legal_entity_verification] OpenAI key not found, using fallback heuristics.")
+        verdicts.update({key: _heuristic_verification(*key) for key in misses})
+    elif misses:
+        fresh, errors = _ask_many(misses)
+        domain_verdict_cache.put_many({key: {**v, "source": "llm"} for key, v in fresh.items()})
+        verdicts.update(fresh)
+        for key, e in errors.items():
+            # Heuristic answers are not cached, the next request asks the model again
+            current_app.logger.error(f"[legal_entity_verification] OpenAI check failed for {key[0]}: {e}")
+            verdicts[key] = _heuristic_verification(*key)
+
+    for key, indices in keys.items():
+        v = verdicts[key]
+        for i in indices:
+            results[i] = {"ok": bool(v["ok"]), "reason": v.get("reason"), "domain": key[0],
+                          "rule": v.get("rule"), "cached": v.get("cached", False)}
+    return results
+
+
+def verify_legal_entity(email: str, user_type: str):
+    """
+    Uses OpenAI to check if an email domain plausibly matches the claimed user_type.
+    Domains settled by the rules in domain_rules.json skip the model; model
+    verdicts are cached per (domain, user_type). Falls back to the rules alone
+    if OpenAI is unavailable.
+    Returns: {"ok": bool, "reason": str, "domain": str, "rule": str | None, "cached": bool}
+    """
+    return verify_legal_entities([(email, user_type)])[0]
@@ -1,208 +1,637 @@
 import os
+import copy
 import json
-from typing import Dict, Any, Optional, List
-from models import AppSetting, Category, Subcategory
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
-from openai import OpenAI
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+from models import Category, Subcategory
+from services import abuse_scorer, extraction_cache, llm_scheduler, llm_usage, openai_client, rule_extractor
+from services.geocode import geocode_many
+from services.spatial import vincenty_km_many
 
+# How the extraction and abuse check are combined:
+#   sequential - extract, geocode, then assess the located resources (two round trips in a row)
+#   concurrent - extract, then assess while geocoding runs (default)
+#   merged     - one structured call returns fields and verdicts together
+PIPELINE_MODES = ("sequential", "concurrent", "merged")
+PIPELINE_MODE = os.getenv("LLM_PIPELINE_MODE", "concurrent").strip().lower()
+if PIPELINE_MODE not in PIPELINE_MODES:
+    print(f"[llm] Unknown LLM_PIPELINE_MODE={PIPELINE_MODE!r}, using 'concurrent'")
+    PIPELINE_MODE = "concurrent"
 
-# ----- OpenAI extraction and abuse detection -----
-def _openai_extract(
-    text: str,
-    incident_location: Optional[dict] = None,  # GeoJSON
-    user_type: str = "civilian",
-    user_location: Optional[dict] = None
-) -> List[Dict[str, Any]]:
+# Batch intake: messages packed into one extraction call, and concurrent calls per batch
+BATCH_MESSAGES_PER_CALL = int(os.getenv("BATCH_MESSAGES_PER_CALL", "8"))
+BATCH_MAX_CHARS_PER_CALL = int(os.getenv("BATCH_MAX_CHARS_PER_CALL", "12000"))
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+
+_executor = None
+_executor_lock = threading.Lock()
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-    # Step 1: Extraction schema (matches Resource model)
-    extraction_schema = {
-        "name": "ResourceExtractionList",
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="llm")
+    return _executor
+
+
+# ----- Schemas and prompts -----
+RESOURCE_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category": {"type": "string"},
+        "subcategory": {"type": "string"},
+        "name": {"type": "string"},
+        "quantity": {"type": "integer"},
+        "num_available_people": {"type": "integer"},
+        "location_text": {"type": "string"},
+        "first_name": {"type": "string"},
+        "last_name": {"type": "string"},
+        "email": {"type": "string"},
+        "phone_number": {"type": "string"}
+    },
+    "required": ["name", "category"],
+    "additionalProperties": False
+}
+
+# Merged mode: the same item carries the abuse verdict
+VERDICT_ITEM_SCHEMA = {
+    **RESOURCE_ITEM_SCHEMA,
+    "properties": {
+        **RESOURCE_ITEM_SCHEMA["properties"],
+        "flagged": {"type": "boolean"},
+        "reason": {"type": "string"},
+    },
+    "required": ["name", "category", "flagged"],
+}
+
+
+def _list_schema(name: str, item_schema: dict) -> dict:
+    return {
+        "name": name,
         "schema": {
             "type": "object",
             "properties": {
                 "resources": {
+                    "type": "array",
+                    "items": item_schema
+                }
+            },
+            "required": ["resources"],
+            "additionalProperties": False
+        }
+    }
+
+
+def _batch_schema(name: str, item_schema: dict) -> dict:
+    """Several messages in one call, answered per message index."""
+    return {
+        "name": name,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "messages": {
                     "type": "array",
                     "items": {
                         "type": "object",
                         "properties": {
-                            "category": {"type": "string"},
-                            "subcategory": {"type": "string"},
-                            "name": {"type": "string"},
-                            "quantity": {"type": "integer"},
-                            "num_available_people": {"type": "integer"},
-                            "location_text": {"type": "string"},
-                            "first_name": {"type": "string"},
-                            "last_name": {"type": "string"},
-                            "email": {"type": "string"},
-                            "phone_number": {"type": "string"}
+                            "index": {"type": "integer"},
+                            "resources": {"type": "array", "items": item_schema}
                         },
-                        "required": ["name", "category"],
+                        "required": ["index", "resources"],
                         "additionalProperties": False
                     }
                 }
             },
-            "required": ["resources"],
+            "required": ["messages"],
             "additionalProperties": False
         }
     }
 
+
+# Step 1: Extraction schema (matches Resource model)
+EXTRACTION_SCHEMA = _list_schema("ResourceExtractionList", RESOURCE_ITEM_SCHEMA)
+MERGED_SCHEMA = _list_schema("ResourceExtractionWithVerdict", VERDICT_ITEM_SCHEMA)
+BATCH_EXTRACTION_SCHEMA = _batch_schema("ResourceExtractionBatch", RESOURCE_ITEM_SCHEMA)
+BATCH_MERGED_SCHEMA = _batch_schema("ResourceExtractionWithVerdictBatch", VERDICT_ITEM_SCHEMA)
+
+# Verdicts refer to resources by their position in the input list, not by name
+ABUSE_SCHEMA = {
+    "name": "ResourceAbuseAssessment",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "resources": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer"},
+                        "flagged": {"type": "boolean"},
+                        "reason": {"type": "string"},
+                    },
+                    "required": ["index", "flagged"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["resources"],
+        "additionalProperties": False
+    }
+}
+
+BATCH_ABUSE_SCHEMA = {
+    "name": "ResourceAbuseAssessmentBatch",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "resources": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "message_index": {"type": "integer"},
+                        "resource_index": {"type": "integer"},
+                        "flagged": {"type": "boolean"},
+                        "reason": {"type": "string"},
+                    },
+                    "required": ["message_index", "resource_index", "flagged"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["resources"],
+        "additionalProperties": False
+    }
+}
+
+ABUSE_PROMPT = (
+    "You are a compliance auditor. Evaluate whether each listed resource is realistic "
+    "for the given user type, location, and distance. "
+    "Flag resources as 'flagged': true if quantities or types are implausible, "
+    "unrelated to emergencies, or suspicious. "
+    "Only provide 'reason' if flagged=true; omit or leave blank otherwise."
+)
+
+MERGED_PROMPT_SUFFIX = (
+    " For every extracted resource also act as a compliance auditor: set 'flagged': true "
+    "if the quantity or type is implausible for the reporter's user type and location, "
+    "unrelated to emergencies, or suspicious, and give a short 'reason' only when flagged. "
+    "The user message is JSON with the report 'text' and its context."
+)
+
+
+def _extraction_prompt() -> str:
     # List of allowed categories and subcategories
     allowed_categories = [c.value for c in Category]
     allowed_subcategories = [s.value for s in Subcategory]
 
-    setting = AppSetting.query.first()
-    model = setting.openai_model if setting and setting.openai_model else "gpt-4o-mini"
-
     # Prompt: ensure LLM extracts only valid categories/subcategories and skips invalid resources
-    system_prompt = {
-        "role": "system",
-        "content": (
-            "You are an information extraction system for emergency resource reporting. "
-            "Extract ONLY resources that fit the predefined categories and subcategories. "
-            f"Allowed categories: {', '.join(allowed_categories)}. "
-            f"Allowed subcategories: {', '.join(allowed_subcategories)}. "
-            "If a mentioned item does not fit these categories, DO NOT include it. "
-            "If the location is missing, unclear, or cannot be localized, skip that resource. "
-            "Infer quantities from text ('few' → 3, 'dozen' → 12). "
-            "Return clean 'location_text' (e.g., 'Kilpisjärvi K-Market') suitable for geocoding. "
-            "Output MUST strictly match the provided JSON schema."
-        )
-    }
+    return (
+        "You are an information extraction system for emergency resource reporting. "
+        "Extract ONLY resources that fit the predefined categories and subcategories. "
+        f"Allowed categories: {', '.join(allowed_categories)}. "
+        f"Allowed subcategories: {', '.join(allowed_subcategories)}. "
+        "If a mentioned item does not fit these categories, DO NOT include it. "
+        "If the location is missing, unclear, or cannot be localized, skip that resource. "
+        "Infer quantities from text ('few' → 3, 'dozen' → 12). "
+        "Return clean 'location_text' (e.g., 'Kilpisjärvi K-Market') suitable for geocoding. "
+        "Output MUST strictly match the provided JSON schema."
+    )
+
 
-    resp = client.chat.completions.create(
+def _complete_json(client, model: str, schema: dict, system: str, user: str, priority: int) -> Dict[str, Any]:
+    resp = llm_scheduler.complete(
+        client,
+        priority,
+        operation=schema["name"],
         model=model,
-        response_format={"type": "json_schema", "json_schema": extraction_schema},
-        messages=[system_prompt, {"role": "user", "content": text}],
+        response_format={"type": "json_schema", "json_schema": schema},
+        messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
         temperature=0,
     )
+    return json.loads(resp.choices[0].message.content)
 
-    extracted = json.loads(resp.choices[0].message.content)
-    resources = extracted.get("resources", [])
 
-    # Step 2: Compute distance for each resource
-    geolocator = Nominatim(user_agent="incident_resource_checker")
-
-    incident_coords = None
+# ----- Geocoding and distances -----
+def _incident_coords(incident_location: Optional[dict]):
+    """(lat, lon) of a Point incident, or None."""
     if incident_location and incident_location.get("type") == "Point":
         try:
             lon, lat = incident_location["coordinates"]
-            incident_coords = (lat, lon)
+            return lat, lon
         except Exception:
             pass
+    return None
 
-    for r in resources:
-        r["distance_km"] = None
-        if incident_coords and r.get("location_text"):
-            try:
-                loc = geolocator.geocode(r["location_text"])
-                if loc:
-                    dist = geodesic(incident_coords, (loc.latitude, loc.longitude)).km
-                    r["distance_km"] = round(dist, 1)
-                    r["location_geojson"] = {
-                        "type": "Point",
-                        "coordinates": [loc.longitude, loc.latitude],
-                    }
-                else:
-                    r["location_geojson"] = None
-            except Exception:
-                r["location_geojson"] = None
-        else:
+
+def _locate_many(groups: List[tuple]):
+    """
+    Geocode the resources of several messages in one pass and set location_geojson
+    and distance_km in place. groups is a list of (resources, incident_location).
+    Place strings shared between messages are only looked up once.
+    """
+    flat = []
+    for resources, incident_location in groups:
+        coords = _incident_coords(incident_location)
+        for r in resources:
+            r["distance_km"] = None
             r["location_geojson"] = None
+            if coords:
+                flat.append((r, coords))
 
-    # Step 3: Abuse detection
-    abuse_schema = {
-        "name": "ResourceAbuseAssessment",
-        "schema": {
-            "type": "object",
-            "properties": {
-                "resources": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "name": {"type": "string"},
-                            "quantity": {"type": "integer"},
-                            "flagged": {"type": "boolean"},
-                            "reason": {"type": "string"},
-                        },
-                        "required": ["name", "flagged"],
-                        "additionalProperties": False
-                    }
-                }
-            },
-            "required": ["resources"],
-            "additionalProperties": False
+    points = geocode_many([r.get("location_text") for r, _ in flat])
+
+    for (r, (inc_lat, inc_lon)), point in zip(flat, points):
+        if not point:
+            continue
+        lon, lat, _ = point
+        r["location_geojson"] = {
+            "type": "Point",
+            "coordinates": [lon, lat],
         }
-    }
+        r["_point"] = (inc_lon, inc_lat, lon, lat)
+
+    # One vectorized call per incident for all distances instead of a geodesic() per resource
+    by_incident: Dict[tuple, list] = {}
+    for r, _ in flat:
+        if "_point" in r:
+            inc_lon, inc_lat, lon, lat = r.pop("_point")
+            by_incident.setdefault((inc_lon, inc_lat), []).append((r, lon, lat))
+    for (inc_lon, inc_lat), items in by_incident.items():
+        distances = vincenty_km_many(inc_lon, inc_lat, [i[1] for i in items], [i[2] for i in items])
+        for (r, _, _), dist in zip(items, distances):
+            r["distance_km"] = round(float(dist), 1)
+
+
+def _apply_verdict(r: Dict[str, Any], verdict: Optional[Dict[str, Any]]):
+    flagged = bool(verdict.get("flagged", False)) if verdict else False
+    r["flagged"] = flagged
+    r["abuse_reason"] = (verdict.get("reason") or None) if flagged else None
+    r.pop("reason", None)
+
+
+def _complete(extracted: List[Dict[str, Any]], located: List[Dict[str, Any]]) -> bool:
+    """
+    Whether a result may be cached: something was extracted and every resource
+    was placed. A dropped resource may be a geocoder error or a missing incident
+    location, and an empty result may be a model hiccup; neither should stick for a day.
+    """
+    return bool(located) and len(located) == len(extracted)
+
+
+# ----- OpenAI extraction and abuse detection -----
+AUDIT_FIELDS = ("name", "category", "subcategory", "quantity", "num_available_people",
+                "location_text", "distance_km")
+LOCAL_ACCEPT = {"flagged": False, "local": True}
+
+
+def _prescreen(resources: List[Dict[str, Any]], user_type: Optional[str], indices=None) -> set:
+    """Indices the local scorer clearly accepts; runs in the request thread (it may read the DB)."""
+    indices = range(len(resources)) if indices is None else indices
+    return {i for i in indices if abuse_scorer.accepts(resources[i], user_type)}
 
-    abuse_prompt = {
-        "role": "system",
-        "content": (
-            "You are a compliance auditor. Evaluate whether each listed resource is realistic "
-            "for the given user type, location, and distance. "
-            "Flag resources as 'flagged': true if quantities or types are implausible, "
-            "unrelated to emergencies, or suspicious. "
-            "Only provide 'reason' if flagged=true; omit or leave blank otherwise."
-        ),
-    }
 
-    user_prompt = {
-        "role": "user",
-        "content": json.dumps({
-            "user_type": user_type,
-            "incident_location": incident_location,
-            "user_location": user_location,
-            "resources": resources,
-        }, ensure_ascii=False)
+def _assess(client, model, resources, user_type, incident_location, user_location, indices=None) -> Dict[int, dict]:
+    """LLM abuse verdicts for resources[indices] (default all), keyed by their index in the list."""
+    indices = list(range(len(resources)) if indices is None else indices)
+    if not indices:
+        return {}
+    # Geocoding output is included when it is already known (sequential mode)
+    payload = {
+        "user_type": user_type,
+        "incident_location": incident_location,
+        "user_location": user_location,
+        "resources": [
+            {"index": i, **{k: resources[i][k] for k in AUDIT_FIELDS if resources[i].get(k) is not None}}
+            for i in indices
+        ],
     }
+    result = _complete_json(client, model, ABUSE_SCHEMA, ABUSE_PROMPT, json.dumps(payload, ensure_ascii=False),
+                            llm_scheduler.priority_for("audit", user_type))
+    wanted = set(indices)
+    return {v["index"]: v for v in result.get("resources", []) if v.get("index") in wanted}
 
-    abuse_resp = client.chat.completions.create(
-        model=model,
-        response_format={"type": "json_schema", "json_schema": abuse_schema},
-        messages=[abuse_prompt, user_prompt],
-        temperature=0,
-    )
 
-    abuse_result = json.loads(abuse_resp.choices[0].message.content)
-    flagged_items = {r["name"]: r for r in abuse_result.get("resources", [])}
+def _locate_and_assess(
+    client,
+    model: str,
+    resources: List[Dict[str, Any]],
+    incident_location: Optional[dict],
+    user_type: Optional[str],
+    user_location: Optional[dict],
+    mode: str,
+    verdicts: Optional[Dict[int, dict]] = None
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Step 2 (geocoding) and Step 3 (abuse detection) for extracted resources.
+    Returns the located resources and whether every extracted resource was placed.
+    """
+    if verdicts is not None:
+        # Step 2 only, the verdicts came with the extraction
+        _locate_many([(resources, incident_location)])
+    elif mode == "concurrent":
+        # Step 3 runs on a worker while this thread geocodes (Step 2); items the
+        # local scorer accepts are not sent to the model
+        accepted = _prescreen(resources, user_type)
+        escalated = [i for i in range(len(resources)) if i not in accepted]
+        pending = None
+        if escalated:
+            pending = llm_usage.submit(_get_executor(), _assess, client, model, [dict(r) for r in resources],
+                                       user_type, incident_location, user_location, escalated)
+        try:
+            _locate_many([(resources, incident_location)])
+        finally:
+            verdicts = pending.result() if pending else {}
+        # Distance was unknown during the pre-screen; audit accepted items that turned out far away
+        late = [i for i in accepted if abuse_scorer.distance_anomalous(resources[i])]
+        verdicts.update(_assess(client, model, resources, user_type, incident_location, user_location, late))
+        verdicts.update({i: LOCAL_ACCEPT for i in accepted if i not in late})
+    else:
+        _locate_many([(resources, incident_location)])
+        located = [i for i, r in enumerate(resources) if r.get("location_geojson")]
+        accepted = _prescreen(resources, user_type, located)
+        verdicts = _assess(client, model, resources, user_type, incident_location, user_location,
+                           [i for i in located if i not in accepted])
+        verdicts.update({i: LOCAL_ACCEPT for i in accepted})
 
     final_resources = []
-    for r in resources:
+    for i, r in enumerate(resources):
         # Skip resources with no location
         if not r.get("location_geojson"):
             continue
+        _apply_verdict(r, verdicts.get(i))
+        final_resources.append(r)
 
-        abuse_data = flagged_items.get(r["name"])
-        if abuse_data:
-            flagged = abuse_data.get("flagged", False)
-            r["flagged"] = flagged
-            r["abuse_reason"] = abuse_data.get("reason") if flagged else None
-        else:
-            r["flagged"] = False
-            r["abuse_reason"] = None
+    return final_resources, _complete(resources, final_resources)
 
-        final_resources.append(r)
 
-    return final_resources
+def _openai_extract(
+    text: str,
+    incident_location: Optional[dict] = None,  # GeoJSON
+    user_type: str = "civilian",
+    user_location: Optional[dict] = None,
+    model: Optional[str] = None,
+    mode: Optional[str] = None,
+    resources: Optional[List[Dict[str, Any]]] = None
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Full pipeline; pass already extracted resources (e.g. from the rule extractor)
+    to skip Step 1. Returns (resources, complete) as _locate_and_assess does.
+    """
+
+    client = openai_client.get_client()
+    model = model or openai_client.get_model()
+    mode = mode or PIPELINE_MODE
+    priority = llm_scheduler.priority_for("extract", user_type)
+    verdicts = None
+
+    if resources is not None:
+        # Nothing to merge the audit into, so run it next to geocoding
+        if mode == "merged":
+            mode = "concurrent"
+    elif mode == "merged":
+        # Step 1+3: one call returns both the fields and the verdict
+        context = {"text": text, "user_type": user_type,
+                   "incident_location": incident_location, "user_location": user_location}
+        extracted = _complete_json(client, model, MERGED_SCHEMA, _extraction_prompt() + MERGED_PROMPT_SUFFIX,
+                                   json.dumps(context, ensure_ascii=False), priority)
+        resources = extracted.get("resources", [])
+        verdicts = {i: r for i, r in enumerate(resources)}
+    else:
+        # Step 1: Extraction
+        extracted = _complete_json(client, model, EXTRACTION_SCHEMA, _extraction_prompt(), text, priority)
+        resources = extracted.get("resources", [])
+
+    return _locate_and_assess(client, model, resources, incident_location, user_type, user_location,
+                              mode, verdicts)
+
 
+def _pack_messages(indices: List[int], messages: List[Dict[str, Any]]) -> List[List[int]]:
+    """Group message indices into packs bounded by message count and total characters."""
+    packs, current, chars = [], [], 0
+    for i in indices:
+        size = len(messages[i]["text"])
+        if current and (len(current) >= BATCH_MESSAGES_PER_CALL or chars + size > BATCH_MAX_CHARS_PER_CALL):
+            packs.append(current)
+            current, chars = [], 0
+        current.append(i)
+        chars += size
+    if current:
+        packs.append(current)
+    return packs
 
 
+def _pack_priority(pack: List[int], messages: List[Dict[str, Any]]) -> int:
+    """A pack is queued at the priority of its most urgent sender."""
+    return min(llm_scheduler.priority_for("batch", messages[i].get("user_type")) for i in pack)
+
+
+def _extract_pack(client, model, pack: List[int], messages: List[Dict[str, Any]], merged: bool) -> Dict[int, list]:
+    """One extraction call for several messages; returns {message index: resources}."""
+    if merged:
+        payload = [{
+            "index": i,
+            "text": messages[i]["text"],
+            "user_type": messages[i].get("user_type"),
+            "incident_location": messages[i].get("incident_location"),
+            "user_location": messages[i].get("user_location"),
+        } for i in pack]
+        schema, prompt = BATCH_MERGED_SCHEMA, _extraction_prompt() + MERGED_PROMPT_SUFFIX
+    else:
+        payload = [{"index": i, "text": messages[i]["text"]} for i in pack]
+        schema, prompt = BATCH_EXTRACTION_SCHEMA, _extraction_prompt()
+    data = _complete_json(
+        client, model, schema,
+        prompt + " The input is a JSON list of independent messages; extract each one separately"
+                 " and answer with its 'index'.",
+        json.dumps(payload, ensure_ascii=False),
+        _pack_priority(pack, messages),
+    )
+    wanted = set(pack)
+    out = {i: [] for i in pack}
+    for m in data.get("messages", []):
+        if m.get("index") in wanted:
+            out[m["index"]] = m.get("resources", [])
+    return out
+
+
+def _assess_pack(client, model, pack: List[int], messages: List[Dict[str, Any]], extracted: Dict[int, list],
+                 pairs: set) -> Dict[tuple, dict]:
+    """One abuse call for the listed (message, resource) pairs of several messages."""
+    payload = []
+    for i in pack:
+        items = [(j, r) for j, r in enumerate(extracted.get(i, [])) if (i, j) in pairs]
+        if not items:
+            continue
+        payload.append({
+            "message_index": i,
+            "user_type": messages[i].get("user_type"),
+            "incident_location": messages[i].get("incident_location"),
+            "user_location": messages[i].get("user_location"),
+            "resources": [{"resource_index": j, **{k: r[k] for k in AUDIT_FIELDS if r.get(k) is not None}}
+                          for j, r in items],
+        })
+    if not payload:
+        return {}
+
+    data = _complete_json(
+        client, model, BATCH_ABUSE_SCHEMA,
+        ABUSE_PROMPT + " Resources are grouped per message; answer with message_index and resource_index.",
+        json.dumps(payload, ensure_ascii=False),
+        _pack_priority(pack, messages),
+    )
+    return {(v.get("message_index"), v.get("resource_index")): v for v in data.get("resources", [])
+            if (v.get("message_index"), v.get("resource_index")) in pairs}
+
+
+def _openai_extract_batch(messages: List[Dict[str, Any]], model: Optional[str] = None,
+                          mode: Optional[str] = None) -> Tuple[List[Dict[str, Any]], set]:
+    """One outcome per message plus the indices whose result is complete (see _complete)."""
+    client = openai_client.get_client()
+    model = model or openai_client.get_model()
+    mode = mode or PIPELINE_MODE
+    results: List[Dict[str, Any]] = [{} for _ in messages]
+    complete = set()
+    executor = _get_executor()
+
+    # Step 1: Formulaic messages are handled by the rule extractor, the rest
+    # go to the model several messages per call, packs in parallel
+    extracted: Dict[int, list] = {}
+    for i, m in enumerate(messages):
+        local = rule_extractor.try_extract(m["text"])
+        if local is not None:
+            extracted[i] = local
+    local_indices = set(extracted)
+    packs = _pack_messages([i for i in range(len(messages)) if i not in local_indices], messages)
+    futures = [(pack, llm_usage.submit(executor, _extract_pack, client, model, pack, messages, mode == "merged"))
+               for pack in packs]
+    for pack, future in futures:
+        try:
+            extracted.update(future.result())
+        except Exception as e:
+            for i in pack:
+                results[i] = {"error": f"Extraction failed: {e}"}
+
+    def candidates(indices, located_only):
+        return {(i, j) for i in indices for j, r in enumerate(extracted[i])
+                if r.get("location_geojson") or not located_only}
+
+    def prescreen(pairs):
+        return {(i, j) for i, j in pairs
+                if abuse_scorer.accepts(extracted[i][j], messages[i].get("user_type"))}
+
+    def audit(pairs):
+        chunks = _pack_messages(sorted({i for i, _ in pairs}), messages)
+        return [(chunk, llm_usage.submit(executor, _assess_pack, client, model, chunk, messages,
+                                         {i: [dict(r) for r in extracted[i]] for i in chunk}, pairs))
+                for chunk in chunks]
+
+    # Step 2 (geocode the whole batch at once) and Step 3 (abuse detection per pack);
+    # items the local scorer accepts skip the audit, and in merged mode only
+    # rule-extracted messages still need one
+    groups = [(extracted[i], messages[i].get("incident_location")) for i in extracted]
+    if mode == "concurrent":
+        pairs = candidates(extracted, False)
+        accepted = prescreen(pairs)
+        abuse_futures = audit(pairs - accepted)
+        _locate_many(groups)
+        # Distance was unknown during the pre-screen
+        late = {(i, j) for i, j in accepted if abuse_scorer.distance_anomalous(extracted[i][j])}
+        abuse_futures += audit(late)
+        accepted -= late
+    else:
+        _locate_many(groups)
+        pairs = candidates(extracted if mode == "sequential" else local_indices, True)
+        accepted = prescreen(pairs)
+        abuse_futures = audit(pairs - accepted)
+
+    verdicts: Dict[tuple, dict] = {p: LOCAL_ACCEPT for p in accepted}
+    if mode == "merged":
+        verdicts.update({(i, j): r for i in extracted if i not in local_indices for j, r in enumerate(extracted[i])})
+    for pack, future in abuse_futures:
+        try:
+            verdicts.update(future.result())
+        except Exception as e:
+            for i in pack:
+                results[i] = {"error": f"Abuse check failed: {e}"}
+                extracted.pop(i, None)
+
+    for i, resources in extracted.items():
+        for j, r in enumerate(resources):
+            _apply_verdict(r, verdicts.get((i, j)))
+        located = [r for r in resources if r.get("location_geojson")]
+        results[i] = {"resources": located}
+        if _complete(resources, located):
+            complete.add(i)
+    return results, complete
 
 
 # ----- Public entrypoint -----
+def _cache_key(message: Dict[str, Any], model: str) -> str:
+    return extraction_cache.make_key(
+        message.get("text"), message.get("incident_location"), message.get("user_type"), model
+    )
+
+
 def extract_resource_fields(
     text: str,
     incident_location: Optional[dict] = None,
     user_type: Optional[str] = "civilian",
     user_location: Optional[dict] = None
 ) -> List[Dict[str, Any]]:
-    """Extract resources using OpenAI."""
-    return _openai_extract(
+    """Extract resources using OpenAI, reusing the stored result for an identical message."""
+    model = openai_client.get_model()
+    key = _cache_key({"text": text, "incident_location": incident_location, "user_type": user_type}, model)
+    cached = extraction_cache.get(key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+
+    resources, complete = _openai_extract(
         text=text,
         incident_location=incident_location,
         user_type=user_type,
-        user_location=user_location
+        user_location=user_location,
+        model=model,
+        resources=rule_extractor.try_extract(text)
     )
+    if complete:
+        extraction_cache.put(key, resources, model=model)
+    return resources
+
+
+def extract_resource_fields_batch(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Extract resources for many messages at once. Each message is a dict with
+    text, incident_location, user_type and user_location. Returns one entry per
+    message: {"resources": [...]} or {"error": "..."}. Cached messages and
+    duplicates within the batch are not sent to the model again.
+    """
+    if not messages:
+        return []
+    model = openai_client.get_model()
+    keys = [_cache_key(m, model) for m in messages]
+    cached = extraction_cache.get_many(keys)
+
+    # First occurrence of every uncached key goes to the model
+    todo = {}
+    for i, key in enumerate(keys):
+        if key not in cached and key not in todo:
+            todo[key] = i
+    fresh = {}
+    if todo:
+        outcomes, complete = _openai_extract_batch([messages[i] for i in todo.values()], model=model)
+        fresh = {key: outcome for key, outcome in zip(todo, outcomes)}
+        extraction_cache.put_many(
+            {key: outcomes[n]["resources"] for n, key in enumerate(todo) if n in complete}, model=model
+        )
+
+    results = []
+    for key in keys:
+        if key in cached:
+            results.append({"resources": copy.deepcopy(cached[key])})
+        else:
+            results.append(copy.deepcopy(fresh[key]))
+    return results
@@ -0,0 +1,289 @@
+import os
+import re
+import json
+import time
+import heapq
+import itertools
+import threading
+from typing import Dict, Any, Optional
+
+from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+from services import llm_usage
+
+# Account quota; 0 disables the corresponding bucket
+RPM = float(os.getenv("OPENAI_RPM", "500"))
+TPM = float(os.getenv("OPENAI_TPM", "200000"))
+# Waiting requests before new low-priority work is refused
+MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "200"))
+# Longest queue wait for priority 0; each two priority levels halve it
+MAX_WAIT_SECONDS = float(os.getenv("SCHEDULER_MAX_WAIT_SECONDS", "60"))
+# Attempts per call for 429s, timeouts, connection errors and 5xx
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+BACKOFF_SECONDS = float(os.getenv("SCHEDULER_BACKOFF_SECONDS", "1"))
+MAX_BACKOFF_SECONDS = float(os.getenv("SCHEDULER_MAX_BACKOFF_SECONDS", "60"))
+# Completion tokens assumed when a call sets no max_tokens
+DEFAULT_COMPLETION_TOKENS = int(os.getenv("SCHEDULER_DEFAULT_COMPLETION_TOKENS", "600"))
+
+# Lower is more urgent
+USER_TYPE_PRIORITY = {
+    "GOVERNMENT_AGENCY": 0,
+    "LOCAL_AUTHORITY": 1,
+    "NGO": 2,
+    "CORPORATE_ENTITY": 3,
+    "CIVILIAN": 4,
+}
+ENDPOINT_PRIORITY = {
+    "match": 0,    # responders looking for resources
+    "verify": 1,
+    "extract": 1,
+    "audit": 1,
+    "batch": 3,    # bulk intake can wait
+}
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class SchedulerOverloaded(Exception):
+    """The call was shed: the queue is full or the wait for its priority ran out."""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+def priority_for(endpoint: str, user_type: Optional[str] = None) -> int:
+    """Queue priority for a call made on behalf of user_type from endpoint."""
+    user_type = (getattr(user_type, "value", user_type) or "").upper()
+    return ENDPOINT_PRIORITY.get(endpoint, 2) + USER_TYPE_PRIORITY.get(user_type, 2)
+
+
+def max_wait(priority: int) -> float:
+    return MAX_WAIT_SECONDS * 2 ** (-priority / 2)
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """'1s', '6m0s', '120ms' (x-ratelimit-reset-*) or plain seconds (retry-after)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    return sum(float(n) * _UNITS[u] for n, u in parts) if parts else None
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """Rough prompt size (4 characters per token) plus the expected completion."""
+    chars = len(json.dumps(kwargs.get("messages", []), ensure_ascii=False))
+    if kwargs.get("response_format"):
+        chars += len(json.dumps(kwargs["response_format"]))
+    return chars // 4 + int(kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+class _Bucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready(self, amount: float) -> bool:
+        # A request bigger than the whole bucket is let through once it is full
+        return not self.enabled or self.level >= min(amount, self.capacity)
+
+    def seconds_until(self, amount: float) -> float:
+        if self.ready(amount):
+            return 0.0
+        return (min(amount, self.capacity) - self.level) / self.rate
+
+
+class Scheduler:
+    """
+    Admission control for OpenAI calls. Callers wait in one priority queue; the
+    head is admitted once the requests-per-minute and tokens-per-minute buckets
+    cover it and no server-requested pause is active. When the queue is full a
+    newcomer evicts the least urgent waiter, and every waiter gives up after
+    max_wait(priority), so low-priority work is shed first.
+    """
+
+    def __init__(self, rpm: float = RPM, tpm: float = TPM):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.paused_until = 0.0
+        self._failures = 0
+        self.counts = {"admitted": 0, "shed": 0, "rate_limited": 0, "retried": 0}
+
+    # --- queue ---
+
+    def acquire(self, priority: int, tokens: int) -> dict:
+        ticket = {"key": (priority, next(self._seq)), "tokens": tokens, "shed": False}
+        deadline = time.monotonic() + max_wait(priority)
+        with self._cond:
+            if len(self._heap) >= MAX_QUEUE:
+                worst = max(self._heap, key=lambda t: t["key"])
+                if worst["key"][0] <= priority:
+                    self.counts["shed"] += 1
+                    raise SchedulerOverloaded("OpenAI queue is full, try again later.", self._retry_after())
+                worst["shed"] = True
+                self._remove_locked(worst)
+            heapq.heappush(self._heap, (ticket["key"], id(ticket), ticket))
+
+            while True:
+                if ticket["shed"]:
+                    self.counts["shed"] += 1
+                    raise SchedulerOverloaded("Request shed for more urgent OpenAI work.", self._retry_after())
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                at_head = self._heap[0][2] is ticket
+                if at_head and now >= self.paused_until and self.requests.ready(1) and self.tokens.ready(tokens):
+                    heapq.heappop(self._heap)
+                    self.requests.level -= 1 if self.requests.enabled else 0
+                    self.tokens.level -= tokens if self.tokens.enabled else 0
+                    self.counts["admitted"] += 1
+                    self._cond.notify_all()
+                    return ticket
+                if now >= deadline:
+                    self._remove_locked(ticket)
+                    self.counts["shed"] += 1
+                    raise SchedulerOverloaded(
+                        f"Waited {max_wait(priority):.1f}s for OpenAI capacity, try again later.",
+                        self._retry_after(),
+                    )
+                if at_head:
+                    delay = max(self.paused_until - now,
+                                self.requests.seconds_until(1), self.tokens.seconds_until(tokens))
+                else:
+                    delay = deadline - now  # woken when the queue moves
+                self._cond.wait(min(max(delay, 0.01), deadline - now))
+
+    def _remove_locked(self, ticket: dict):
+        self._heap = [entry for entry in self._heap if entry[2] is not ticket]
+        heapq.heapify(self._heap)
+        self._cond.notify_all()
+
+    def _retry_after(self) -> float:
+        return max(1.0, self.paused_until - time.monotonic(), self.tokens.seconds_until(1))
+
+    # --- feedback from responses ---
+
+    def on_success(self, ticket: dict, headers, used_tokens: Optional[int]):
+        with self._cond:
+            self._failures = 0
+            if used_tokens is not None and self.tokens.enabled:
+                # Give back (or charge) the difference between estimate and actual usage
+                self.tokens.level = min(self.tokens.capacity, self.tokens.level + ticket["tokens"] - used_tokens)
+            self._sync_headers_locked(headers)
+            self._cond.notify_all()
+
+    def on_rate_limited(self, headers):
+        with self._cond:
+            self.counts["rate_limited"] += 1
+            self._failures += 1
+            retry_after = None
+            if headers is not None:
+                retry_ms = headers.get("retry-after-ms")
+                retry_after = float(retry_ms) / 1000.0 if retry_ms else _parse_duration(headers.get("retry-after"))
+                self._sync_headers_locked(headers)
+            if retry_after is None:
+                retry_after = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** (self._failures - 1))
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+
+    def count(self, name: str):
+        with self._cond:
+            self.counts[name] += 1
+
+    def backoff(self, attempt: int) -> float:
+        return min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt)
+
+    def _sync_headers_locked(self, headers):
+        """Trust the server's view of the remaining quota when it is lower than ours."""
+        if headers is None:
+            return
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None or not bucket.enabled:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            bucket.level = min(bucket.level, remaining)
+            if remaining <= 0:
+                reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    self.paused_until = max(self.paused_until, time.monotonic() + reset)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            depth: Dict[int, int] = {}
+            for key, _, _ in self._heap:
+                depth[key[0]] = depth.get(key[0], 0) + 1
+            return {
+                **self.counts,
+                "queued": len(self._heap),
+                "queued_by_priority": depth,
+                "requests_available": round(self.requests.level, 1) if self.requests.enabled else None,
+                "tokens_available": round(self.tokens.level) if self.tokens.enabled else None,
+                "paused_for_seconds": round(max(0.0, self.paused_until - now), 2),
+            }
+
+
+_scheduler = Scheduler()
+
+
+def get_scheduler() -> Scheduler:
+    return _scheduler
+
+
+def complete(client, priority: int, operation: str = "chat", **kwargs):
+    """
+    chat.completions.create through the scheduler. Retries rate limits (after the
+    pause the server asked for) and transient errors, each time re-queuing at the
+    same priority. Raises SchedulerOverloaded when the call is shed. The token
+    usage is recorded under operation (see services.llm_usage).
+    """
+    tokens = estimate_tokens(kwargs)
+    for attempt in range(MAX_RETRIES + 1):
+        ticket = _scheduler.acquire(priority, tokens)
+        started = time.monotonic()
+        try:
+            raw = client.chat.completions.with_raw_response.create(**kwargs)
+        except RateLimitError as e:
+            _scheduler.on_rate_limited(getattr(e.response, "headers", None))
+            if attempt == MAX_RETRIES:
+                raise
+        except (APIConnectionError, APITimeoutError, InternalServerError):
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(_scheduler.backoff(attempt))
+        else:
+            response = raw.parse()
+            usage = getattr(response, "usage", None)
+            _scheduler.on_success(ticket, raw.headers, getattr(usage, "total_tokens", None))
+            llm_usage.record(operation, kwargs.get("model"), usage, int((time.monotonic() - started) * 1000))
+            return response
+        _scheduler.count("retried")
+
+
+def stats() -> Dict[str, Any]:
+    return _scheduler.stats()
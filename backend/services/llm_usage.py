@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from extensions import db
+from models import LlmUsage
+
+# USD per million (prompt, completion) tokens; the longest matching prefix of the model name wins
+PRICES_PER_1M = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+# "prompt,completion" USD per million tokens for models missing above
+PRICE_OVERRIDE = os.getenv("OPENAI_PRICE_PER_1M", "")
+# Usage rows older than this are deleted (checked at most once an hour)
+RETENTION_DAYS = float(os.getenv("LLM_USAGE_RETENTION_DAYS", "30"))
+
+_scope: contextvars.ContextVar = contextvars.ContextVar("llm_usage_scope", default=None)
+_lock = threading.Lock()
+_pending: List[Dict[str, Any]] = []
+_totals: Dict[tuple, Dict[str, Any]] = {}
+_last_prune = 0.0
+
+
+def price_for(model: Optional[str]):
+    if PRICE_OVERRIDE:
+        try:
+            prompt, completion = (float(p) for p in PRICE_OVERRIDE.split(","))
+            return prompt, completion
+        except ValueError:
+            pass
+    matches = [name for name in PRICES_PER_1M if (model or "").startswith(name)]
+    return PRICES_PER_1M[max(matches, key=len)] if matches else None
+
+
+def cost_usd(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    price = price_for(model)
+    if price is None:
+        return None
+    return round((prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000, 6)
+
+
+@contextmanager
+def scope(route: str):
+    """Attribute completions made inside the block (and in tasks started with submit) to route."""
+    totals = {"route": route, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+    token = _scope.set(totals)
+    try:
+        yield totals
+    finally:
+        _scope.reset(token)
+
+
+def begin(route: str) -> Dict[str, Any]:
+    """Open a scope without a with-block (Flask before_request); close it with end()."""
+    totals = {"route": route, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+    _scope.set(totals)
+    return totals
+
+
+def end() -> Optional[Dict[str, Any]]:
+    totals = _scope.get()
+    _scope.set(None)
+    return totals
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that keeps the caller's usage scope in the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def record(operation: str, model: Optional[str], usage, latency_ms: Optional[int] = None):
+    """Account one completion; usage is the response's usage object (or None)."""
+    prompt = int(getattr(usage, "prompt_tokens", 0) or 0)
+    completion = int(getattr(usage, "completion_tokens", 0) or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = int(getattr(details, "cached_tokens", 0) or 0)
+    cost = cost_usd(model, prompt, completion)
+    current = _scope.get()
+    route = current["route"] if current else "background"
+
+    with _lock:
+        if current is not None:
+            current["calls"] += 1
+            current["prompt_tokens"] += prompt
+            current["completion_tokens"] += completion
+            current["cost_usd"] += cost or 0.0
+        total = _totals.setdefault((route, operation), {
+            "route": route, "operation": operation, "calls": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+        })
+        total["calls"] += 1
+        total["prompt_tokens"] += prompt
+        total["completion_tokens"] += completion
+        total["cost_usd"] += cost or 0.0
+        _pending.append({
+            "route": route,
+            "operation": operation,
+            "model": model,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "cached_tokens": cached,
+            "cost_usd": cost,
+            "latency_ms": latency_ms,
+            "created_at": datetime.utcnow(),
+        })
+
+
+def flush():
+    """Write buffered usage rows; needs an app context. Uses its own connection, not the request session."""
+    global _last_prune
+    with _lock:
+        rows = list(_pending)
+        _pending.clear()
+    if not rows:
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(LlmUsage.__table__.insert(), rows)
+            if time.monotonic() - _last_prune > 3600:
+                _last_prune = time.monotonic()
+                cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+                conn.execute(LlmUsage.__table__.delete().where(LlmUsage.created_at < cutoff))
+    except Exception as e:
+        print(f"[llm_usage] Could not store {len(rows)} usage rows: {e}")
+
+
+def stats() -> List[Dict[str, Any]]:
+    """Totals per (route, operation) since the process started."""
+    with _lock:
+        return [{**t, "cost_usd": round(t["cost_usd"], 6)} for t in _totals.values()]
+
+
+def summary(hours: float = 24, bucket: str = "hour") -> Dict[str, Any]:
+    """Stored usage of the last `hours`: totals per route and operation, and tokens per route per hour/day."""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    fmt = "%Y-%m-%dT%H:00" if bucket == "hour" else "%Y-%m-%d"
+    rows = db.session.query(
+        LlmUsage.created_at, LlmUsage.route, LlmUsage.operation,
+        LlmUsage.prompt_tokens, LlmUsage.completion_tokens, LlmUsage.cost_usd,
+    ).filter(LlmUsage.created_at >= since).all()
+
+    totals: Dict[tuple, Dict[str, Any]] = {}
+    series: Dict[tuple, Dict[str, Any]] = {}
+    for created_at, route, operation, prompt, completion, cost in rows:
+        t = totals.setdefault((route, operation), {
+            "route": route, "operation": operation, "calls": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+        })
+        t["calls"] += 1
+        t["prompt_tokens"] += prompt
+        t["completion_tokens"] += completion
+        t["cost_usd"] += cost or 0.0
+        key = (created_at.strftime(fmt), route)
+        s = series.setdefault(key, {"bucket": key[0], "route": route, "calls": 0, "total_tokens": 0})
+        s["calls"] += 1
+        s["total_tokens"] += prompt + completion
+
+    return {
+        "since": since.isoformat() + 'Z',
+        "totals": [{**t, "cost_usd": round(t["cost_usd"], 6)}
+                   for t in sorted(totals.values(), key=lambda t: (t["route"], t["operation"]))],
+        "series": sorted(series.values(), key=lambda s: (s["bucket"], s["route"])),
+    }
@@ -0,0 +1,77 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from models import resource_watermark
+from services import spatial
+
+CACHE_SIZE = int(os.getenv("MATCH_CACHE_SIZE", "256"))
+CACHE_TTL_SECONDS = float(os.getenv("MATCH_CACHE_TTL_SECONDS", "300"))
+# 3 decimals is roughly 100 m, close enough to treat two incidents as the same spot
+LOCATION_DECIMALS = int(os.getenv("MATCH_CACHE_LOCATION_DECIMALS", "3"))
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def invalidate():
+    """Drop all cached matches after this process commits Resource changes."""
+    with _lock:
+        _entries.clear()
+        _stats["invalidations"] += 1
+
+
+def normalize_situation(situation: str) -> str:
+    return " ".join(_NON_WORD_RE.sub(" ", (situation or "").lower()).split())
+
+
+def _location_key(incident_location_geojson: Optional[Dict[str, Any]]):
+    point = spatial.point_from_geojson(incident_location_geojson)
+    if point:
+        return round(point[0], LOCATION_DECIMALS), round(point[1], LOCATION_DECIMALS)
+    if incident_location_geojson:
+        return json.dumps(incident_location_geojson, sort_keys=True)
+    return None
+
+
+def make_key(situation: str, incident_location_geojson: Optional[Dict[str, Any]], *extra) -> tuple:
+    """
+    Cache key including the resources table watermark (read from the database, needs
+    an app context). Writes by any process change it, so older entries are never hit again.
+    """
+    return (normalize_situation(situation), _location_key(incident_location_geojson), resource_watermark(), *extra)
+
+
+def get(key: tuple):
+    """Return the cached value for key, or None on a miss / expired entry."""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry[0] < now:
+            if entry is not None:
+                del _entries[key]
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[1]
+
+
+def put(key: tuple, value: Any):
+    with _lock:
+        _entries[key] = (time.monotonic() + CACHE_TTL_SECONDS, value)
+        _entries.move_to_end(key)
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return {**_stats, "size": len(_entries)}
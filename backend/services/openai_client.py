@@ -0,0 +1,94 @@
+import os
+import time
+import threading
+from typing import Optional
+
+import httpx
+from openai import OpenAI, DefaultHttpxClient
+from sqlalchemy import event
+
+from models import AppSetting
+
+# Point at a compatible server (e.g. the local stand-in: http://localhost:8089/v1)
+BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+# Whole-request and connect timeouts; retries (OPENAI_MAX_RETRIES) are done by
+# services.llm_scheduler so that every attempt is rate limited and prioritised
+TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "5"))
+# Connection pool shared by every thread; kept-alive connections skip TCP and TLS setup
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "16"))
+# The model setting is re-read after this long even without an explicit invalidation,
+# so a change made by another process is eventually picked up
+MODEL_CACHE_SECONDS = float(os.getenv("OPENAI_MODEL_CACHE_SECONDS", "300"))
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+_client = None
+_client_lock = threading.Lock()
+
+_model = None
+_model_loaded_at = 0.0
+_model_lock = threading.Lock()
+
+
+def available() -> bool:
+    """True when an API key is configured (the stand-in accepts any key)."""
+    return bool(os.getenv("OPENAI_API_KEY"))
+
+
+def get_client() -> OpenAI:
+    """The process-wide OpenAI client; safe to share between threads."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                timeout = httpx.Timeout(TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS)
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=BASE_URL,
+                    timeout=timeout,
+                    max_retries=0,
+                    http_client=DefaultHttpxClient(
+                        timeout=timeout,
+                        limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                            max_keepalive_connections=MAX_KEEPALIVE),
+                    ),
+                )
+    return _client
+
+
+def reset_client():
+    """Close the pooled client; the next call builds a new one (e.g. after the key changed)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+def get_model() -> str:
+    """The configured OpenAI model from AppSetting, cached until invalidated."""
+    global _model, _model_loaded_at
+    now = time.monotonic()
+    if _model is not None and now - _model_loaded_at < MODEL_CACHE_SECONDS:
+        return _model
+    with _model_lock:
+        if _model is None or now - _model_loaded_at >= MODEL_CACHE_SECONDS:
+            setting = AppSetting.query.first()
+            _model = setting.openai_model if setting and setting.openai_model else DEFAULT_MODEL
+            _model_loaded_at = now
+        return _model
+
+
+def invalidate_model():
+    """Forget the cached model name; called whenever an AppSetting row is written."""
+    global _model
+    with _model_lock:
+        _model = None
+
+
+@event.listens_for(AppSetting, "after_insert")
+@event.listens_for(AppSetting, "after_update")
+@event.listens_for(AppSetting, "after_delete")
+def _app_setting_changed(mapper, connection, target):
+    invalidate_model()
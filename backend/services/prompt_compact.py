@@ -0,0 +1,56 @@
+import os
+import json
+from typing import Any, Iterable, List, Optional, Sequence
+
+# 3 decimals is roughly 100 m, plenty for ranking by proximity
+COORD_DECIMALS = int(os.getenv("PROMPT_COORD_DECIMALS", "3"))
+
+
+def drop_nulls(obj: Any) -> Any:
+    """Recursively remove None values and empty containers from dicts and lists."""
+    if isinstance(obj, dict):
+        out = {k: drop_nulls(v) for k, v in obj.items()}
+        return {k: v for k, v in out.items() if v is not None and v != {} and v != []}
+    if isinstance(obj, list):
+        return [drop_nulls(v) for v in obj if v is not None]
+    return obj
+
+
+def round_coords(geojson: Optional[dict], decimals: int = COORD_DECIMALS) -> Optional[dict]:
+    """Copy of a GeoJSON geometry with every coordinate rounded."""
+    if not geojson:
+        return geojson
+
+    def walk(c):
+        if isinstance(c, (list, tuple)):
+            return [walk(v) for v in c]
+        return round(c, decimals) if isinstance(c, float) else c
+
+    out = dict(geojson)
+    if "coordinates" in out:
+        out["coordinates"] = walk(out["coordinates"])
+    return out
+
+
+def compact_json(obj: Any) -> str:
+    """JSON without nulls or whitespace."""
+    return json.dumps(drop_nulls(obj), ensure_ascii=False, separators=(",", ":"))
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        value = round(value, COORD_DECIMALS)
+        return str(int(value)) if value.is_integer() else str(value)
+    return str(value).replace("|", "/").replace("\n", " ").strip()
+
+
+def table(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> str:
+    """
+    Pipe-separated rows under one header line; empty cells stand for null.
+    Keys are written once instead of once per record.
+    """
+    lines: List[str] = ["|".join(columns)]
+    lines.extend("|".join(_cell(v) for v in row) for row in rows)
+    return "\n".join(lines)
@@ -1,13 +1,108 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
-from models import Resource, AppSetting
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Optional, Tuple
+from models import Resource
 from flask import current_app
+from services import spatial, openai_client, llm_scheduler, llm_usage, prompt_compact
+from services.retrieval import shortlist_candidates, MAX_CANDIDATES
+from services.vector_index import get_index
+
+# Candidates per LLM call, concurrent calls, per-request wait and size of a ranking merged from several shards
+SHARD_SIZE = int(os.getenv("MATCHER_SHARD_SIZE", "40"))
+MAX_WORKERS = int(os.getenv("MATCHER_MAX_WORKERS", "8"))
+SHARD_TIMEOUT_SECONDS = float(os.getenv("MATCHER_SHARD_TIMEOUT_SECONDS", "30"))
+TOP_K = int(os.getenv("MATCHER_TOP_K", "25"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+MATCH_SCHEMA = {
+    "name": "MatchedResourceList",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "matches": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "resource_id": {"type": "integer"},
+                        "relevance_score": {"type": "number"},
+                        "reason": {"type": "string"}
+                    },
+                    "required": ["resource_id", "relevance_score"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["matches"],
+        "additionalProperties": False
+    }
+}
+
+# Candidates are sent as one pipe-separated row each (see prompt_compact.table)
+RESOURCE_COLUMNS = ("id", "cat", "sub", "name", "qty", "ppl", "by", "km", "place", "lon", "lat")
+
+# Scores must be absolute (not relative to the list) so shards can be merged
+SYSTEM_PROMPT = (
+    "You are an emergency coordination AI. "
+    "Given an emergency situation and a list of available resources, "
+    "determine which ones are most relevant for responding to the crisis. "
+    "Use category, quantity, user_type, and proximity (based on coordinates) "
+    "to rank relevance. "
+    "Score each resource on its own merits on an absolute scale, independent of the other resources listed. "
+    "Resources are a pipe-separated table: id, cat=category, sub=subcategory, name, qty=quantity, "
+    "ppl=available people, by=user_type, km=distance to incident, place=location text, lon/lat; "
+    "empty cells are unknown. "
+    "Return a list of matched resources with relevance_score (0.0–1.0) and reasoning."
+)
+
+def match_resources_locally(
+    situation: str,
+    incident_location_geojson: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Offline matching with the local vector index: cosine similarity between the
+    situation and each resource, decayed by distance from the incident.
+    Returns the same shape as match_resources_to_situation.
+    """
+    hits = get_index().search(
+        situation,
+        incident_point=spatial.point_from_geojson(incident_location_geojson),
+        k=limit or MAX_CANDIDATES,
+    )
+    if not hits:
+        return []
+
+    id_map = {r.id: r for r in Resource.query.filter(Resource.id.in_([h["resource_id"] for h in hits]))}
+    results = []
+    for h in hits:
+        r = id_map.get(h["resource_id"])
+        if not r:
+            continue
+        results.append({
+            "id": r.id,
+            "category": r.category.value if r.category else None,
+            "name": r.name,
+            "quantity": r.quantity,
+            "user_type": r.user_type.value if r.user_type else None,
+            "flagged": r.flagged,
+            "location_text": r.location_text,
+            "location_geojson": r.location_geojson,
+            "relevance_score": round(h["score"], 4),
+            "reason": "Local text similarity match"
+                      + (f", {h['distance_km']:.1f} km from incident." if h["distance_km"] is not None else "."),
+        })
+    return results
+
 
 def match_resources_to_situation(
     situation: str,
-    incident_location_geojson: Optional[Dict[str, Any]] = None
+    incident_location_geojson: Optional[Dict[str, Any]] = None,
+    max_candidates: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
     """
     Uses OpenAI to identify which stored resources best match the described emergency situation.
@@ -16,112 +111,151 @@ def match_resources_to_situation(
     Args:
         situation: A human-readable description of the current emergency.
         incident_location_geojson: Optional GeoJSON representing the incident area.
+        max_candidates: Size of the locally pre-filtered shortlist sent to the model
+            (defaults to MATCHER_MAX_CANDIDATES).
     """
+    return match_resources(situation, incident_location_geojson, max_candidates)[0]
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    setting = AppSetting.query.first()
-    model = setting.openai_model if setting and setting.openai_model else "gpt-4o-mini"
 
-    # --- 1. Fetch all resources ---
-    resources = Resource.query.all()
-    if not resources:
-        return []
+def match_resources(
+    situation: str,
+    incident_location_geojson: Optional[Dict[str, Any]] = None,
+    max_candidates: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """Like match_resources_to_situation, plus the engine that answered: 'llm', or 'local' after a fallback."""
+    if not openai_client.available():
+        current_app.logger.warning("[resource_matcher] OpenAI key not found, using local matching.")
+        return match_resources_locally(situation, incident_location_geojson, limit=max_candidates), "local"
+
+    client = openai_client.get_client()
+    model = openai_client.get_model()
+
+    # --- 1. Shortlist candidates locally (unflagged, near the incident, relevant category) ---
+    candidates = shortlist_candidates(situation, incident_location_geojson, limit=max_candidates)
+    if not candidates:
+        return [], "llm"
+    resources = [r for r, _ in candidates]
+
+    # Shortlisted resources are never flagged, so that column is left out
+    rows = [
+        (
+            r.id,
+            r.category.value if r.category else None,
+            r.subcategory.value if r.subcategory else None,
+            r.name,
+            r.quantity,
+            r.num_available_people,
+            r.user_type.value if r.user_type else None,
+            round(d, 1) if d is not None else None,
+            r.location_text,
+            r.longitude,
+            r.latitude,
+        )
+        for r, d in candidates
+    ]
+
+    # --- 2. Split into shards and rank them concurrently ---
+    shards = [rows[i:i + SHARD_SIZE] for i in range(0, len(rows), SHARD_SIZE)]
+    matches, failures = _rank_shards(client, model, situation, incident_location_geojson, shards)
+    for error in failures:
+        current_app.logger.error(f"[resource_matcher] OpenAI shard ranking failed: {error}")
+    if len(failures) == len(shards):
+        current_app.logger.error("[resource_matcher] All shards failed, using local matching.")
+        return match_resources_locally(situation, incident_location_geojson, limit=max_candidates), "local"
+
+    # --- 3. Merge per-shard scores (best score per resource wins); a single shard is returned whole ---
+    best = {}
+    for m in matches:
+        rid = m.get("resource_id")
+        if rid not in best or m.get("relevance_score", 0) > best[rid].get("relevance_score", 0):
+            best[rid] = m
+    matches = sorted(best.values(), key=lambda m: m.get("relevance_score", 0), reverse=True)
+    if len(shards) > 1:
+        matches = matches[:TOP_K]
 
-    resources_data = [
-        {
+    # --- 4. Enrich with full resource details ---
+    id_map = {r.id: r for r in resources}
+    enriched = []
+    for m in matches:
+        r = id_map.get(m["resource_id"])
+        if not r:
+            continue
+        enriched.append({
             "id": r.id,
-            "category": r.category,
+            "category": r.category.value if r.category else None,
             "name": r.name,
             "quantity": r.quantity,
             "user_type": r.user_type.value if r.user_type else None,
             "flagged": r.flagged,
             "location_text": r.location_text,
             "location_geojson": r.location_geojson,
-        }
-        for r in resources
-    ]
+            "relevance_score": m["relevance_score"],
+            "reason": m.get("reason", ""),
+        })
 
-    # --- 2. Define schema for OpenAI structured response ---
-    match_schema = {
-        "name": "MatchedResourceList",
-        "schema": {
-            "type": "object",
-            "properties": {
-                "matches": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "resource_id": {"type": "integer"},
-                            "relevance_score": {"type": "number"},
-                            "reason": {"type": "string"}
-                        },
-                        "required": ["resource_id", "relevance_score"],
-                        "additionalProperties": False
-                    }
-                }
-            },
-            "required": ["matches"],
-            "additionalProperties": False
-        }
-    }
+    return enriched, "llm"
 
-    # --- 3. System instruction for the model ---
-    system_prompt = (
-        "You are an emergency coordination AI. "
-        "Given an emergency situation and a list of available resources, "
-        "determine which ones are most relevant for responding to the crisis. "
-        "Use category, quantity, user_type, and proximity (based on coordinates) "
-        "to rank relevance. Flagged resources should be ignored or scored low. "
-        "Return a list of matched resources with relevance_score (0.0–1.0) and reasoning."
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="matcher-shard")
+    return _executor
+
+
+def _rank_shard(client, model, situation, incident_location_geojson, shard) -> List[Dict[str, Any]]:
+    """Score one shard of resource rows with a single structured-output call."""
+    user_context = (
+        f"Situation: {situation}\n"
+        f"Incident: {prompt_compact.compact_json(prompt_compact.round_coords(incident_location_geojson))}\n"
+        f"Resources:\n{prompt_compact.table(RESOURCE_COLUMNS, shard)}"
     )
+    resp = llm_scheduler.complete(
+        client,
+        llm_scheduler.priority_for("match"),
+        operation="match",
+        model=model,
+        response_format={"type": "json_schema", "json_schema": MATCH_SCHEMA},
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_context},
+        ],
+        temperature=0,
+    )
+    data = json.loads(resp.choices[0].message.content)
+    # Ignore ids the model invented or took from outside this shard
+    shard_ids = {row[0] for row in shard}
+    return [m for m in data.get("matches", []) if m.get("resource_id") in shard_ids]
 
-    # --- 4. Build the contextual payload ---
-    user_context = {
-        "situation": situation,
-        "incident_location_geojson": incident_location_geojson,
-        "resources": resources_data,
-    }
 
-    try:
-        resp = client.chat.completions.create(
-            model=model,
-            response_format={"type": "json_schema", "json_schema": match_schema},
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": json.dumps(user_context, ensure_ascii=False)},
-            ],
-            temperature=0,
-        )
+def _rank_shards(client, model, situation, incident_location_geojson, shards):
+    """
+    Rank all shards, concurrently when there is more than one.
+    Returns (matches, errors); a failed or timed-out shard only loses its own matches.
+    """
+    if len(shards) == 1:
+        try:
+            return _rank_shard(client, model, situation, incident_location_geojson, shards[0]), []
+        except Exception as e:
+            return [], [e]
 
-        data = json.loads(resp.choices[0].message.content)
-        matches = data.get("matches", [])
-
-        # --- 5. Sort by relevance descending ---
-        matches = sorted(matches, key=lambda m: m.get("relevance_score", 0), reverse=True)
-
-        # --- 6. Enrich with full resource details ---
-        id_map = {r.id: r for r in resources}
-        enriched = []
-        for m in matches:
-            r = id_map.get(m["resource_id"])
-            if not r:
-                continue
-            enriched.append({
-                "id": r.id,
-                "category": r.category,
-                "name": r.name,
-                "quantity": r.quantity,
-                "user_type": r.user_type.value if r.user_type else None,
-                "flagged": r.flagged,
-                "location_text": r.location_text,
-                "location_geojson": r.location_geojson,
-                "relevance_score": m["relevance_score"],
-                "reason": m.get("reason", ""),
-            })
-
-        return enriched
-
-    except Exception as e:
-        current_app.logger.error(f"[resource_matcher] OpenAI matching failed: {e}")
-        return []
+    executor = _get_executor()
+    futures = [
+        llm_usage.submit(executor, _rank_shard, client, model, situation, incident_location_geojson, shard)
+        for shard in shards
+    ]
+    done, not_done = wait(futures, timeout=SHARD_TIMEOUT_SECONDS)
+
+    matches, errors = [], []
+    for future in futures:
+        if future in not_done:
+            future.cancel()
+            errors.append(TimeoutError(f"shard timed out after {SHARD_TIMEOUT_SECONDS}s"))
+            continue
+        try:
+            matches.extend(future.result())
+        except Exception as e:
+            errors.append(e)
+    return matches, errors
@@ -0,0 +1,120 @@
+import os
+import re
+from typing import Dict, Any, Optional, List, Tuple
+
+from sqlalchemy.orm import load_only
+
+from models import Resource, Category, Subcategory
+from services import spatial
+
+# Shortlist size sent to the LLM ranker and search radius around the incident
+MAX_CANDIDATES = int(os.getenv("MATCHER_MAX_CANDIDATES", "50"))
+CANDIDATE_RADIUS_KM = float(os.getenv("MATCHER_RADIUS_KM", "150"))
+
+# Columns the matcher reads from a shortlisted resource (ranking rows and enrichment)
+CANDIDATE_COLUMNS = (
+    Resource.id, Resource.category, Resource.subcategory, Resource.name, Resource.quantity,
+    Resource.num_available_people, Resource.user_type, Resource.location_text, Resource.location_geojson,
+    Resource.longitude, Resource.latitude, Resource.flagged,
+)
+
+# Words in a situation description that point at a category
+CATEGORY_KEYWORDS = {
+    Category.SKILLS: ["doctor", "nurse", "paramedic", "volunteer", "engineer", "translator",
+                      "interpreter", "mechanic", "builder", "it", "help", "people", "staff"],
+    Category.FUEL: ["fuel", "diesel", "gasoline", "petrol", "propane", "gas", "battery",
+                    "batteries", "power", "outage", "blackout", "heating"],
+    Category.FOOD: ["food", "meal", "meals", "hunger", "starving", "ration", "rations",
+                    "baby", "pet", "evacuees", "evacuation", "displaced"],
+    Category.WATER: ["water", "drinking", "thirst", "dehydration", "contaminated",
+                     "purification", "filter", "drought", "heatwave"],
+    Category.MEDICAL_SUPPLIES: ["injured", "injuries", "wounded", "casualties", "medical",
+                                "medicine", "medication", "first", "aid", "hospital",
+                                "bleeding", "burns", "sick", "ambulance"],
+    Category.SHELTER: ["shelter", "homeless", "displaced", "evacuees", "evacuation", "cold",
+                       "freezing", "winter", "tent", "tents", "blanket", "blankets", "storm"],
+    Category.TRANSPORT: ["transport", "evacuate", "evacuation", "vehicle", "vehicles", "truck",
+                         "boat", "boats", "flood", "flooding", "stranded", "road", "bridge"],
+    Category.EQUIPMENT: ["generator", "generators", "tools", "collapsed", "collapse", "rubble",
+                         "debris", "protective", "chemical", "fire", "outage", "blackout"],
+    Category.COMMUNICATION: ["radio", "radios", "phone", "phones", "satellite", "network",
+                             "communication", "communications", "signal", "outage", "blackout"],
+    Category.OTHER: [],
+}
+
+_TOKEN_RE = re.compile(r"[a-zåäö0-9]+")
+
+
+def _tokens(text: str) -> set:
+    return set(_TOKEN_RE.findall((text or "").lower()))
+
+
+def category_scores(situation: str) -> Dict[Category, float]:
+    """Relevance of each category to the situation text, normalized to 0..1."""
+    words = _tokens(situation)
+    raw = {}
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        hits = sum(1 for kw in keywords if kw in words)
+        # The category name itself ("water", "medical supplies") also counts
+        hits += sum(1 for part in category.value.lower().split("_") if part in words)
+        raw[category] = hits
+    top = max(raw.values()) if raw else 0
+    if not top:
+        return {c: 0.0 for c in raw}
+    return {c: hits / top for c, hits in raw.items()}
+
+
+def _subcategory_hit(subcategory: Optional[Subcategory], words: set) -> bool:
+    if not subcategory:
+        return False
+    return any(part in words for part in subcategory.value.lower().split("_"))
+
+
+def shortlist_candidates(
+    situation: str,
+    incident_location_geojson: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    radius_km: Optional[float] = None,
+) -> List[Tuple[Resource, Optional[float]]]:
+    """
+    Cheap local retrieval stage in front of the LLM ranker.
+
+    Drops flagged resources, keeps only those within radius_km of the incident
+    (when a Point location is given) and pre-ranks the rest by category relevance,
+    local text similarity and proximity. Without a location only the `limit` most
+    recent resources are considered. Returns up to `limit` (resource, distance_km)
+    pairs.
+    """
+    limit = limit or MAX_CANDIDATES
+    radius_km = radius_km or CANDIDATE_RADIUS_KM
+
+    query = Resource.query.filter(Resource.flagged.is_(False)).options(load_only(*CANDIDATE_COLUMNS))
+
+    incident_point = spatial.point_from_geojson(incident_location_geojson)
+    if incident_point:
+        pairs = spatial.resources_within(query, incident_point[0], incident_point[1], radius_km)
+    else:
+        recent = query.order_by(Resource.created_at.desc(), Resource.id.desc()).limit(limit)
+        pairs = [(r, None) for r in recent]
+
+    scores = category_scores(situation)
+    words = _tokens(situation)
+
+    # Text similarity from the local vector index acts as the recall signal
+    from services.vector_index import get_index
+    similarity = {
+        hit["resource_id"]: hit["similarity"]
+        for hit in get_index().search(situation, k=len(pairs) or 1, candidate_ids=[r.id for r, _ in pairs])
+    }
+
+    def rank(pair):
+        r, distance = pair
+        relevance = scores.get(r.category, 0.0) if r.category else 0.0
+        relevance += similarity.get(r.id, 0.0)
+        if _subcategory_hit(r.subcategory, words) or _tokens(r.name) & words:
+            relevance += 0.5
+        proximity = 1.0 / (1.0 + distance / 25.0) if distance is not None else 0.0
+        return relevance + 0.5 * proximity
+
+    pairs.sort(key=rank, reverse=True)
+    return pairs[:limit]
@@ -0,0 +1,351 @@
+import os
+import re
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+
+from models import Category, Subcategory
+
+# Messages scoring at least this are extracted locally; the rest go to the LLM
+MIN_CONFIDENCE = float(os.getenv("RULE_EXTRACTOR_MIN_CONFIDENCE", "0.8"))
+ENABLED = os.getenv("RULE_EXTRACTOR_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# Subcategory -> Category, following the grouping in models.Subcategory
+SUBCATEGORY_PARENT = {
+    Subcategory.MEDICAL: Category.SKILLS,
+    Subcategory.CONSTRUCTION: Category.SKILLS,
+    Subcategory.IT: Category.SKILLS,
+    Subcategory.LANGUAGE: Category.SKILLS,
+    Subcategory.MECHANIC: Category.SKILLS,
+    Subcategory.DIESEL: Category.FUEL,
+    Subcategory.GASOLINE: Category.FUEL,
+    Subcategory.PROPANE: Category.FUEL,
+    Subcategory.BATTERIES: Category.FUEL,
+    Subcategory.NON_PERISHABLE: Category.FOOD,
+    Subcategory.PERISHABLE: Category.FOOD,
+    Subcategory.BABY_FOOD: Category.FOOD,
+    Subcategory.PET_FOOD: Category.FOOD,
+    Subcategory.BOTTLED: Category.WATER,
+    Subcategory.FILTERS: Category.WATER,
+    Subcategory.PURIFICATION_TABLETS: Category.WATER,
+    Subcategory.FIRST_AID: Category.MEDICAL_SUPPLIES,
+    Subcategory.MEDICATION: Category.MEDICAL_SUPPLIES,
+    Subcategory.EQUIPMENT: Category.MEDICAL_SUPPLIES,
+    Subcategory.TENTS: Category.SHELTER,
+    Subcategory.BLANKETS: Category.SHELTER,
+    Subcategory.VEHICLES: Category.TRANSPORT,
+    Subcategory.BOATS: Category.TRANSPORT,
+    Subcategory.FUEL_TRUCKS: Category.TRANSPORT,
+    Subcategory.GENERATORS: Category.EQUIPMENT,
+    Subcategory.TOOLS: Category.EQUIPMENT,
+    Subcategory.PROTECTIVE_GEAR: Category.EQUIPMENT,
+    Subcategory.RADIOS: Category.COMMUNICATION,
+    Subcategory.SATPHONES: Category.COMMUNICATION,
+    Subcategory.POWER_BANKS: Category.COMMUNICATION,
+}
+
+# Extra phrases on top of the enum names (English and common Finnish forms)
+SYNONYMS = {
+    Subcategory.MEDICAL: ["doctor", "doctors", "nurse", "nurses", "paramedic", "paramedics", "lääkäri", "sairaanhoitaja"],
+    Subcategory.CONSTRUCTION: ["builder", "builders", "carpenter", "carpenters", "electrician", "electricians"],
+    Subcategory.IT: ["it specialist", "it specialists", "programmer", "programmers"],
+    Subcategory.LANGUAGE: ["translator", "translators", "interpreter", "interpreters", "tulkki"],
+    Subcategory.MECHANIC: ["mechanics", "car mechanic"],
+    Subcategory.DIESEL: ["diesel fuel", "litres of diesel", "liters of diesel"],
+    Subcategory.GASOLINE: ["petrol", "bensiini", "litres of petrol", "liters of gasoline"],
+    Subcategory.PROPANE: ["propane tank", "propane tanks", "gas canister", "gas canisters", "gas bottles"],
+    Subcategory.BATTERIES: ["battery", "aa batteries", "paristot"],
+    Subcategory.NON_PERISHABLE: ["canned food", "cans of food", "tins of food", "rations", "food rations",
+                                 "ration packs", "dry food", "säilykkeet"],
+    Subcategory.PERISHABLE: ["fresh food", "bread", "loaves of bread", "milk", "vegetables", "fruit"],
+    Subcategory.BABY_FOOD: ["baby formula", "infant formula", "formula", "vauvanruoka"],
+    Subcategory.PET_FOOD: ["dog food", "cat food", "lemmikkiruoka"],
+    Subcategory.BOTTLED: ["bottled water", "water bottles", "water bottle", "bottles of water",
+                          "litres of water", "liters of water", "water canisters", "pullovesi"],
+    Subcategory.FILTERS: ["water filter", "water filters"],
+    Subcategory.PURIFICATION_TABLETS: ["purification tablets", "water purification tablets", "chlorine tablets"],
+    Subcategory.FIRST_AID: ["first aid kit", "first aid kits", "first-aid kits", "first-aid kit", "bandages",
+                            "ensiapulaukku", "ensiapulaukkuja"],
+    Subcategory.MEDICATION: ["medicine", "medicines", "painkillers", "insulin", "antibiotics", "lääkkeet"],
+    Subcategory.EQUIPMENT: ["stretcher", "stretchers", "defibrillator", "defibrillators", "wheelchair", "wheelchairs"],
+    Subcategory.TENTS: ["tent", "teltta", "telttoja", "teltat"],
+    Subcategory.BLANKETS: ["blanket", "sleeping bag", "sleeping bags", "peitto", "peittoja", "huopa", "huopia"],
+    Subcategory.VEHICLES: ["vehicle", "car", "cars", "van", "vans", "truck", "trucks", "bus", "buses",
+                           "tractor", "tractors", "snowmobile", "snowmobiles", "auto", "autoja"],
+    Subcategory.BOATS: ["boat", "rowboat", "rowboats", "vene", "veneitä"],
+    Subcategory.FUEL_TRUCKS: ["fuel truck", "tanker truck", "tanker trucks"],
+    Subcategory.GENERATORS: ["generator", "aggregaatti", "aggregaatteja"],
+    Subcategory.TOOLS: ["tool", "chainsaw", "chainsaws", "shovel", "shovels", "pumps", "water pump",
+                        "water pumps", "sandbags"],
+    Subcategory.PROTECTIVE_GEAR: ["helmets", "gloves", "masks", "face masks", "respirators", "safety vests"],
+    Subcategory.RADIOS: ["radio", "walkie talkie", "walkie talkies", "walkie-talkies", "vhf radios"],
+    Subcategory.SATPHONES: ["satphone", "satellite phone", "satellite phones", "sat phone", "sat phones"],
+    Subcategory.POWER_BANKS: ["power bank", "powerbank", "powerbanks", "chargers"],
+}
+
+# Enum names that are too generic on their own ("it", "equipment")
+BASE_PHRASES = {
+    Subcategory.MEDICAL: "medical staff",
+    Subcategory.IT: "it support",
+    Subcategory.LANGUAGE: "language skills",
+    Subcategory.EQUIPMENT: "medical equipment",
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20,
+    "thirty": 30, "forty": 40, "fifty": 50, "hundred": 100,
+    "couple": 2, "few": 3, "several": 5, "some": 3, "dozen": 12,
+    "yksi": 1, "kaksi": 2, "kolme": 3, "neljä": 4, "viisi": 5, "kymmenen": 10,
+}
+MULTIPLIERS = {"dozen": 12, "dozens": 12, "hundred": 100, "hundreds": 100}
+
+# Words that carry no resource information; anything else left unexplained lowers confidence
+FILLER = set("""
+a an the and or of for to with we i our my us me you your have has got there is are am be can
+could will would offer offering available donate donating give giving provide providing spare
+extra ready stored storage please call contact text reach email mail at in on near by from
+located outside inside next nearby around some any also plus about approx approximately more
+pcs pieces units boxes box packs pack bottles bottle litres liters l kg large small big new used
+free it its them this these those that if which here just
+""".split())
+
+# Requests for help and negations ("need 20 blankets", "we do not have tents") read
+# like offers to the rules; such messages always go to the LLM
+REQUEST_RE = re.compile(
+    r"\b(?:needs?|needed|needing|looking for|anyone have|does anyone|do not have|don't have|dont have|"
+    r"no|not|without|require[sd]?|requesting|wanted|missing|tarvitaan|tarvitsemme|tarvitsee|ei)\b",
+    re.IGNORECASE,
+)
+
+_WORD_RE = re.compile(r"[a-zåäö0-9]+(?:[-'][a-zåäö0-9]+)*", re.IGNORECASE)
+# A phone number starts with + or 0, or follows a word like "call"; bare digit runs are quantities
+PHONE_RE = re.compile(
+    r"(?<![\w+])((?:\+\d|0)[\d\s\-()]{5,}\d)"
+    r"|\b(?:call|tel|phone|puh|soita)\b[.:]?\s*(\d[\d\s\-()]{5,}\d)",
+    re.IGNORECASE,
+)
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+NAME_RE = re.compile(r"\b(?i:my name is|this is|i am|i'm)\s+([A-ZÅÄÖ][a-zåäö]+)(?:\s+([A-ZÅÄÖ][a-zåäö]+))?")
+# "at Rovaniemi fire station", "near Kilpisjärvi K-Market": a capitalized word after a
+# preposition, extended by the capitalized words, numbers and place nouns that follow
+LOCATION_RE = re.compile(
+    r"\b(?:at|in|near|by|from|outside|located at|located in|pick ?up at)\s+"
+    r"((?:the\s+)?[A-ZÅÄÖ][\w\-åäöÅÄÖ.]*)"
+)
+_LOCATION_WORD_RE = re.compile(r"\s+([\w\-åäöÅÄÖ.]+)")
+MAX_LOCATION_WORDS = 6
+# Lower case words that still belong to a place name ("Oulu fire station", "Tampere keskusta")
+PLACE_WORDS = set("""
+fire station railway train bus harbour harbor port marina pier school church chapel hall town city
+hospital clinic centre center square market supermarket shop store mall parking lot camp village
+bridge airport depot warehouse gym stadium arena office library museum hotel campus street road
+st rd ave avenue lane park gate entrance terminal community sports youth
+asema rautatieasema satama koulu kirkko katu tie kenttä tori keskusta halli sairaala kylä
+""".split())
+# Words that end a place name even when capitalized: times, days and the next clause
+LOCATION_STOP = set("""
+until till before after from since by on at to and or but call contact phone tel email text
+today tonight tomorrow morning evening noon now asap week weekend
+monday tuesday wednesday thursday friday saturday sunday
+maanantai tiistai keskiviikko torstai perjantai lauantai sunnuntai huomenna tänään
+""".split())
+_CLAUSE_BREAK_RE = re.compile(r"[,;:\n]|\band\b|\bplus\b", re.IGNORECASE)
+QUANTITY_RE = re.compile(r"\b(\d+(?:[.,]\d+)?|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True))
+                         + r")(?:\s+(dozens?|hundreds?))?\b(?:\s+of)?", re.IGNORECASE)
+
+
+def _phrases_for(sub: Subcategory) -> List[str]:
+    base = BASE_PHRASES.get(sub) or sub.value.lower().replace("_", " ")
+    phrases = {base}
+    if not base.endswith("s"):
+        phrases.add(base + "s")
+    elif len(base) > 4:
+        phrases.add(base[:-1])
+    phrases.update(SYNONYMS.get(sub, []))
+    return sorted(phrases)
+
+
+def _compile():
+    lookup = {}
+    for sub, parent in SUBCATEGORY_PARENT.items():
+        for phrase in _phrases_for(sub):
+            lookup.setdefault(phrase, (parent, sub))
+    # Longest phrases first so "first aid kits" wins over "kits" and "fuel truck" over "fuel"
+    alternation = "|".join(re.escape(p) for p in sorted(lookup, key=len, reverse=True))
+    return lookup, re.compile(r"(?<![\w-])(" + alternation + r")(?![\w-])", re.IGNORECASE)
+
+
+ITEM_LOOKUP, ITEM_RE = _compile()
+_SKILL_SUBCATEGORIES = {s for s, c in SUBCATEGORY_PARENT.items() if c == Category.SKILLS}
+
+_stats = {"attempts": 0, "hits": 0}
+_stats_lock = threading.Lock()
+
+
+def _parse_quantity(text: str, start: int, end: int) -> Optional[Tuple[int, Tuple[int, int]]]:
+    """Last quantity expression in text[start:end], the words just before an item ('three dozen' -> 36), and its span."""
+    matches = list(QUANTITY_RE.finditer(text, start, end))
+    if not matches:
+        return None
+    m = matches[-1]
+    raw = m.group(1).lower()
+    if raw[0].isdigit():
+        try:
+            value = float(raw.replace(",", "."))
+        except ValueError:
+            return None
+    else:
+        value = NUMBER_WORDS[raw]
+    if m.group(2):
+        value *= MULTIPLIERS[m.group(2).lower()]
+    return int(value), m.span(1)
+
+
+def _location_word(word: str) -> bool:
+    """Whether word can continue a place name."""
+    key = word.lower().strip(".")
+    if not key or key in LOCATION_STOP:
+        return False
+    return word[0].isupper() or word[0].isdigit() or key in PLACE_WORDS
+
+
+def _find_location(text: str) -> Optional[Tuple[str, Tuple[int, int]]]:
+    """
+    The first place name after a preposition and its span. The span ends with
+    the name, so trailing words ("at Oulu lol jk") stay unexplained for _coverage.
+    """
+    for m in LOCATION_RE.finditer(text):
+        head = m.group(1)
+        if head.lower().strip(".").split()[-1] in LOCATION_STOP:
+            continue
+        end = m.end(1)
+        words = 1
+        # Stop at a sentence end ("... harbour. My name is") or a non-place word
+        while not text[m.start(1):end].endswith(".") and words < MAX_LOCATION_WORDS:
+            w = _LOCATION_WORD_RE.match(text, end)
+            if not w or not _location_word(w.group(1)):
+                break
+            end = w.end()
+            words += 1
+        phrase = text[m.start(1):end].rstrip(" .")
+        end = m.start(1) + len(phrase)
+        if phrase.lower().startswith("the "):
+            phrase = phrase[4:]
+        if ITEM_RE.fullmatch(phrase):
+            continue
+        return phrase, (m.start(), end)
+    return None
+
+
+def _coverage(text: str, spans: List[Tuple[int, int]]) -> float:
+    """Share of content words in text that some recognized span explains."""
+    explained = total = 0
+    for w in _WORD_RE.finditer(text):
+        word = w.group(0).lower()
+        if word in FILLER or word in NUMBER_WORDS or word.isdigit():
+            continue
+        total += 1
+        if any(s <= w.start() < e for s, e in spans):
+            explained += 1
+    return 1.0 if total == 0 else explained / total
+
+
+def extract(text: str) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Rule based extraction. Returns (resources, confidence) where resources use
+    the same keys as the LLM extraction schema and confidence is 0..1.
+    """
+    text = text or ""
+    spans: List[Tuple[int, int]] = []
+
+    phones = [(m.group(m.lastindex), m.span(m.lastindex)) for m in PHONE_RE.finditer(text)]
+    emails = [(m.group(0), m.span()) for m in EMAIL_RE.finditer(text)]
+    spans += [s for _, s in emails]
+    name = NAME_RE.search(text)
+    if name:
+        spans.append(name.span())
+
+    location = _find_location(text)
+    if location:
+        spans.append(location[1])
+
+    resources = []
+    quantity_spans = []
+    missing_quantity = 0
+    for m in ITEM_RE.finditer(text):
+        if location and location[1][0] <= m.start() < location[1][1]:
+            continue
+        category, sub = ITEM_LOOKUP[m.group(1).lower()]
+        clause_start = 0
+        for b in _CLAUSE_BREAK_RE.finditer(text, 0, m.start()):
+            clause_start = b.end()
+        parsed = _parse_quantity(text, max(clause_start, m.start() - 40), m.start())
+        quantity = parsed[0] if parsed else None
+        if parsed:
+            quantity_spans.append(parsed[1])
+        else:
+            missing_quantity += 1
+        spans.append(m.span())
+
+        item = {
+            "category": category.value,
+            "subcategory": sub.value,
+            "name": m.group(1).lower(),
+        }
+        if sub in _SKILL_SUBCATEGORIES:
+            item["num_available_people"] = quantity or 1
+        elif quantity is not None:
+            item["quantity"] = quantity
+        if location:
+            item["location_text"] = location[0]
+        if emails:
+            item["email"] = emails[0][0]
+        if name:
+            item["first_name"] = name.group(1)
+            if name.group(2):
+                item["last_name"] = name.group(2)
+        resources.append(item)
+
+    # A digit run read as an item's quantity is not also a phone number
+    phones = [p for p in phones if not any(s < p[1][1] and p[1][0] < e for s, e in quantity_spans)]
+    spans += [s for _, s in phones]
+    if phones:
+        for item in resources:
+            item["phone_number"] = re.sub(r"[\s\-()]", "", phones[0][0])
+
+    if not resources or not location:
+        return resources, 0.0
+    if REQUEST_RE.search(text):
+        # Asking for or lacking something, not offering it
+        return resources, 0.0
+
+    confidence = _coverage(text, spans)
+    # Items without a stated amount are plausible ("a generator") but less certain
+    confidence -= 0.1 * missing_quantity / len(resources)
+    if len({r["subcategory"] for r in resources}) < len(resources):
+        # The same kind of item named twice usually means a nuance the rules miss
+        confidence -= 0.2
+    return resources, max(0.0, min(1.0, round(confidence, 3)))
+
+
+def try_extract(text: str) -> Optional[List[Dict[str, Any]]]:
+    """Resources when the rules are confident enough to skip the LLM, else None."""
+    if not ENABLED:
+        return None
+    resources, confidence = extract(text)
+    hit = confidence >= MIN_CONFIDENCE
+    with _stats_lock:
+        _stats["attempts"] += 1
+        _stats["hits"] += int(hit)
+    return resources if hit else None
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        attempts, hits = _stats["attempts"], _stats["hits"]
+    return {
+        "attempts": attempts,
+        "hits": hits,
+        "hit_rate": round(hits / attempts, 3) if attempts else None,
+        "min_confidence": MIN_CONFIDENCE,
+    }
@@ -0,0 +1,263 @@
+import math
+from typing import Optional, Tuple, List, Dict, Any
+
+import numpy as np
+from sqlalchemy import and_, or_
+
+from models import Resource
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Standard geohash base32 alphabet; "{" sorts right after "z" and closes prefix ranges
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_PREFIX_END = "{"
+
+GEOHASH_PRECISION = 9      # ~5 m cells, stored on every resource
+MAX_COVER_CELLS = 32       # upper bound of OR-ed prefix ranges per query
+KNN_START_RADIUS_KM = 5.0
+KNN_MAX_RADIUS_KM = 20037.5  # half the earth's circumference
+
+
+def point_from_geojson(geojson: Optional[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """Return (lon, lat) from a GeoJSON Point or a Feature wrapping one."""
+    if not isinstance(geojson, dict):
+        return None
+    if geojson.get("type") == "Feature":
+        geojson = geojson.get("geometry") or {}
+    if geojson.get("type") != "Point":
+        return None
+    try:
+        lon, lat = geojson["coordinates"][:2]
+        lon, lat = float(lon), float(lat)
+    except Exception:
+        return None
+    if not (-180.0 <= lon <= 180.0 and -90.0 <= lat <= 90.0):
+        return None
+    return lon, lat
+
+
+def geohash_encode(lon: float, lat: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def _cell_size(precision: int) -> Tuple[float, float]:
+    """(lon_width, lat_height) in degrees of a geohash cell."""
+    total = 5 * precision
+    lon_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 360.0 / (1 << lon_bits), 180.0 / (1 << lat_bits)
+
+
+def _split_antimeridian(bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if min_lon <= max_lon:
+        return [bbox]
+    return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+
+
+def covering_prefixes(bbox: Tuple[float, float, float, float]) -> List[str]:
+    """
+    Geohash prefixes whose cells together cover the bbox (min_lon, min_lat, max_lon, max_lat).
+    Picks the finest precision that still needs at most MAX_COVER_CELLS cells.
+    """
+    parts = _split_antimeridian(bbox)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        w, h = _cell_size(precision)
+        cells = 0
+        for min_lon, min_lat, max_lon, max_lat in parts:
+            nx = math.floor((max_lon + 180.0) / w) - math.floor((min_lon + 180.0) / w) + 1
+            ny = math.floor((max_lat + 90.0) / h) - math.floor((min_lat + 90.0) / h) + 1
+            cells += nx * ny
+        if cells <= MAX_COVER_CELLS or precision == 1:
+            break
+
+    prefixes = set()
+    for min_lon, min_lat, max_lon, max_lat in parts:
+        x0, x1 = math.floor((min_lon + 180.0) / w), math.floor((max_lon + 180.0) / w)
+        y0, y1 = math.floor((min_lat + 90.0) / h), math.floor((max_lat + 90.0) / h)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                lon = min(-180.0 + (x + 0.5) * w, 180.0)
+                lat = min(-90.0 + (y + 0.5) * h, 90.0)
+                prefixes.add(geohash_encode(lon, lat, precision))
+    return sorted(prefixes)
+
+
+def haversine_km(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_km_many(lon: float, lat: float, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Vectorized haversine from one point to arrays of coordinates (NaN stays NaN)."""
+    p1 = math.radians(lat)
+    p2 = np.radians(lats)
+    dl = np.radians(lons - lon)
+    a = np.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def haversine_matrix_km(lons_a, lats_a, lons_b, lats_b) -> np.ndarray:
+    """Pairwise haversine distances, shape (len(a), len(b))."""
+    lat_a = np.radians(np.asarray(lats_a, dtype=np.float64))[:, None]
+    lon_a = np.radians(np.asarray(lons_a, dtype=np.float64))[:, None]
+    lat_b = np.radians(np.asarray(lats_b, dtype=np.float64))[None, :]
+    lon_b = np.radians(np.asarray(lons_b, dtype=np.float64))[None, :]
+    a = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+# WGS-84 ellipsoid
+_WGS84_A = 6378137.0
+_WGS84_F = 1 / 298.257223563
+_WGS84_B = (1 - _WGS84_F) * _WGS84_A
+
+
+def vincenty_km_many(lon: float, lat: float, lons, lats, max_iter: int = 30) -> np.ndarray:
+    """
+    Vectorized Vincenty inverse formula on WGS-84 from one point to arrays of
+    coordinates (millimetre accuracy). Nearly antipodal pairs that do not
+    converge fall back to haversine.
+    """
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    f = _WGS84_F
+
+    u1 = math.atan((1 - f) * math.tan(math.radians(lat)))
+    u2 = np.arctan((1 - f) * np.tan(np.radians(lats)))
+    sin_u1, cos_u1 = math.sin(u1), math.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+    big_l = np.radians(lons - lon)
+
+    lam = big_l.copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.sqrt((cos_u2 * sin_lam) ** 2
+                                + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos2_alpha == 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = big_l + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - lam_prev) < 1e-12
+            if converged.all():
+                break
+
+        u_sq = cos2_alpha * (_WGS84_A ** 2 - _WGS84_B ** 2) / _WGS84_B ** 2
+        big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        km = _WGS84_B * big_a * (sigma - delta_sigma) / 1000.0
+
+    if not converged.all():
+        fallback = ~converged & ~np.isnan(lons) & ~np.isnan(lats)
+        km = np.where(fallback, haversine_km_many(lon, lat, lons, lats), km)
+    return km
+
+
+def distances_km(lon: float, lat: float, lons, lats, method: str = "haversine") -> np.ndarray:
+    """Distances from one point to many with the chosen kernel ('haversine' or 'vincenty')."""
+    if method == "vincenty":
+        return vincenty_km_many(lon, lat, lons, lats)
+    return haversine_km_many(lon, lat, np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+
+
+def bbox_around(lon: float, lat: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Bounding box that fully contains the circle of radius_km around (lon, lat)."""
+    angular = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angular)
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    # A pole inside the circle means every longitude is reachable
+    if max_lat >= 90.0 or min_lat <= -90.0:
+        return -180.0, min_lat, 180.0, max_lat
+    ratio = math.sin(angular) / math.cos(math.radians(lat))
+    if angular >= math.pi / 2 or ratio >= 1.0:
+        return -180.0, min_lat, 180.0, max_lat
+    dlon = math.degrees(math.asin(ratio))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180.0:
+        min_lon += 360.0
+    if max_lon > 180.0:
+        max_lon -= 360.0
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def filter_bbox(query, bbox: Tuple[float, float, float, float]):
+    """Restrict a Resource query to the bbox using the geohash index plus an exact lat/lon check."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    ranges = [
+        and_(Resource.geohash >= p, Resource.geohash < p + _PREFIX_END)
+        for p in covering_prefixes(bbox)
+    ]
+    query = query.filter(or_(*ranges))
+    query = query.filter(Resource.latitude >= min_lat, Resource.latitude <= max_lat)
+    if min_lon <= max_lon:
+        query = query.filter(Resource.longitude >= min_lon, Resource.longitude <= max_lon)
+    else:
+        query = query.filter(or_(Resource.longitude >= min_lon, Resource.longitude <= max_lon))
+    return query
+
+
+def resources_within(query, lon: float, lat: float, radius_km: float) -> List[Tuple[Resource, float]]:
+    """Resources within radius_km of (lon, lat), nearest first, as (resource, distance_km) pairs."""
+    rows = filter_bbox(query, bbox_around(lon, lat, radius_km)).all()
+    hits = []
+    for r in rows:
+        d = haversine_km(lon, lat, r.longitude, r.latitude)
+        if d <= radius_km:
+            hits.append((r, d))
+    hits.sort(key=lambda pair: (pair[1], pair[0].id))
+    return hits
+
+
+def k_nearest(query, lon: float, lat: float, k: int,
+              max_radius_km: Optional[float] = None) -> List[Tuple[Resource, float]]:
+    """
+    k nearest resources to (lon, lat) by expanding the search radius until
+    k hits are found (or max_radius_km / the whole globe is covered).
+    """
+    limit = max_radius_km if max_radius_km is not None else KNN_MAX_RADIUS_KM
+    radius = min(KNN_START_RADIUS_KM, limit)
+    while True:
+        hits = resources_within(query, lon, lat, radius)
+        if len(hits) >= k or radius >= limit:
+            return hits[:k]
+        radius = min(radius * 4, limit)
@@ -1,41 +1,319 @@
+import io
 import os
-from faster_whisper import WhisperModel
+import wave
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import av
+import numpy as np
+from faster_whisper import WhisperModel, decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from services import transcript_cache
+from services.intake import IntakeError
 
 MODEL_SIZE = os.getenv("WHISPER_MODEL", "small")
 DEVICE = os.getenv("WHISPER_DEVICE", "auto")
 
-_model = None
+# Uploads are rejected before any decoding when they exceed either limit
+MAX_BYTES = int(os.getenv("TRANSCRIBE_MAX_BYTES", str(25 * 1024 * 1024)))
+MAX_SECONDS = float(os.getenv("TRANSCRIBE_MAX_SECONDS", "600"))
+
+# Whisper works on 16 kHz mono float32
+SAMPLE_RATE = 16000
+
+AudioSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+# Threads per transcription (0 = CTranslate2 default)
+CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))
+
+# Per-request knobs: smaller models and beams answer faster, larger ones are more accurate.
+# The configured WHISPER_MODEL is always allowed.
+ALLOWED_MODEL_SIZES = {
+    size.strip() for size in os.getenv("WHISPER_ALLOWED_MODELS", "tiny,base,small,medium").split(",") if size.strip()
+} | {MODEL_SIZE}
+BEAM_SIZE = int(os.getenv("WHISPER_BEAM_SIZE", "5"))
+MAX_BEAM_SIZE = int(os.getenv("WHISPER_MAX_BEAM_SIZE", "10"))
 
-def _get_model():
-    global _model
-    if _model is not None:
-        return _model
+# Recordings longer than this are split at pauses (VAD) into chunks of at most
+# this length, transcribed in parallel and stitched back in order
+CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "30"))
+# Parallel chunks when the worker pool (services.whisper_pool) is off
+CHUNK_WORKERS = int(os.getenv("TRANSCRIBE_CHUNK_WORKERS", "2"))
 
-    # Determine compute type safely
-    if DEVICE == "auto":
-        if os.getenv("CUDA_VISIBLE_DEVICES"):
-            device = "cuda"
-            compute_type = "float16"
+_models: Dict[str, WhisperModel] = {}
+_model_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_model(model_size: Optional[str] = None, num_workers: Optional[int] = None):
+    """One shared model per size; num_workers is how many transcriptions it runs in parallel."""
+    model_size = model_size or MODEL_SIZE
+    model = _models.get(model_size)
+    if model is not None:
+        return model
+
+    with _model_lock:
+        if model_size in _models:
+            return _models[model_size]
+
+        # Determine compute type safely
+        if DEVICE == "auto":
+            if os.getenv("CUDA_VISIBLE_DEVICES"):
+                device = "cuda"
+                compute_type = "float16"
+            else:
+                device = "cpu"
+                compute_type = "int8"  # safe fallback for CPU
         else:
-            device = "cpu"
-            compute_type = "int8"  # safe fallback for CPU
+            device = DEVICE
+            compute_type = "float16" if device == "cuda" else "int8"
+
+        print(f"[transcribe] Loading Whisper model ({model_size}) on {device} [{compute_type}]")
+
+        _models[model_size] = WhisperModel(
+            model_size,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=CPU_THREADS,
+            num_workers=num_workers or CHUNK_WORKERS,
+        )
+        return _models[model_size]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, CHUNK_WORKERS),
+                                               thread_name_prefix="transcribe-chunk")
+    return _executor
+
+
+def options(model_size: Optional[str] = None, beam_size=None) -> Tuple[str, int]:
+    """Validated (model_size, beam_size) from request parameters, defaults for missing ones."""
+    model_size = (model_size or MODEL_SIZE).strip()
+    if model_size not in ALLOWED_MODEL_SIZES:
+        raise IntakeError(f"Invalid 'model_size' (allowed: {', '.join(sorted(ALLOWED_MODEL_SIZES))}).")
+    if beam_size is None or beam_size == "":
+        beam_size = BEAM_SIZE
+    try:
+        beam_size = int(beam_size)
+    except (TypeError, ValueError):
+        raise IntakeError("Invalid 'beam_size' (must be integer).")
+    if not 1 <= beam_size <= MAX_BEAM_SIZE:
+        raise IntakeError(f"Invalid 'beam_size' (must be between 1 and {MAX_BEAM_SIZE}).")
+    return model_size, beam_size
+
+
+def check_upload_size(size: Optional[int]):
+    """Reject an upload by its byte size (e.g. request.content_length) before reading it."""
+    if size is not None and size > MAX_BYTES:
+        raise IntakeError(f"Audio file too large (limit {MAX_BYTES // (1024 * 1024)} MB).", 413)
+
+
+def _check_duration(seconds: Optional[float]):
+    if seconds is not None and seconds > MAX_SECONDS:
+        raise IntakeError(f"Audio too long ({seconds:.0f}s, limit {MAX_SECONDS:.0f}s).", 413)
+
+
+def _pcm16_wav(data: bytes) -> Optional[np.ndarray]:
+    """
+    16 kHz 16-bit PCM WAV straight from the upload: only the header is parsed,
+    the samples are viewed in place with np.frombuffer and converted to float32
+    once. None for any other format, which then goes through the av decoder.
+    """
+    header = io.BytesIO(data)
+    try:
+        with wave.open(header, "rb") as wav:
+            if wav.getsampwidth() != 2 or wav.getframerate() != SAMPLE_RATE:
+                return None
+            channels, frames = wav.getnchannels(), wav.getnframes()
+            data_start = header.tell()
+    except (wave.Error, EOFError):
+        return None
+    _check_duration(frames / SAMPLE_RATE)
+
+    frames = min(frames, (len(data) - data_start) // (2 * channels))
+    samples = np.frombuffer(data, dtype="<i2", count=frames * channels, offset=data_start)
+    if channels > 1:
+        audio = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
     else:
-        device = DEVICE
-        compute_type = "float16" if device == "cuda" else "int8"
+        audio = samples.astype(np.float32)
+    audio /= 32768.0
+    return audio
+
 
-    print(f"[transcribe] Loading Whisper model ({MODEL_SIZE}) on {device} [{compute_type}]")
+def _probe_seconds(source) -> Optional[float]:
+    """Duration from the container header, without decoding any frames."""
+    with av.open(source, mode="r", metadata_errors="ignore") as container:
+        if container.duration:
+            return container.duration / av.time_base
+        stream = container.streams.audio[0] if container.streams.audio else None
+        if stream is not None and stream.duration and stream.time_base:
+            return float(stream.duration * stream.time_base)
+    return None
 
-    _model = WhisperModel(
-        MODEL_SIZE,
-        device=device,
-        compute_type=compute_type
+
+def read_audio(source: AudioSource) -> bytes:
+    """The raw bytes of a path, bytes or binary stream, refusing more than MAX_BYTES."""
+    if isinstance(source, str):
+        check_upload_size(os.path.getsize(source))
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "read"):
+        source = source.read(MAX_BYTES + 1)
+    check_upload_size(len(source))
+    return bytes(source)
+
+
+def load_audio(source: AudioSource) -> np.ndarray:
+    """
+    Decode a path, bytes or binary stream to a 16 kHz mono float32 array.
+    Size and duration limits are checked first; raises IntakeError when the
+    audio is too large, too long or cannot be decoded.
+    """
+    data = read_audio(source)
+    # BytesIO over a bytes object shares its memory until written to
+    buffer = io.BytesIO(data)
+
+    try:
+        audio = _pcm16_wav(data)
+        if audio is not None:
+            return audio
+        _check_duration(_probe_seconds(buffer))
+        buffer.seek(0)
+        audio = decode_audio(buffer, sampling_rate=SAMPLE_RATE)
+    except (av.error.FFmpegError, IndexError, ValueError) as e:
+        raise IntakeError(f"Could not decode audio: {e}", 422)
+
+    # Containers without a duration in the header are checked after decoding
+    _check_duration(len(audio) / SAMPLE_RATE)
+    return audio
+
+
+def split_chunks(audio: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    (start, end) sample ranges to transcribe. Short audio is one chunk; longer
+    audio is cut at pauses found by the Silero VAD into chunks of at most
+    CHUNK_SECONDS, and long silences between them are skipped.
+    """
+    limit = int(CHUNK_SECONDS * SAMPLE_RATE)
+    if len(audio) <= limit:
+        return [(0, len(audio))]
+
+    speech = get_speech_timestamps(
+        audio,
+        VadOptions(min_silence_duration_ms=500, max_speech_duration_s=CHUNK_SECONDS),
+        sampling_rate=SAMPLE_RATE,
     )
-    return _model
+    chunks: List[Tuple[int, int]] = []
+    for span in speech:
+        if chunks and span["end"] - chunks[-1][0] <= limit:
+            chunks[-1] = (chunks[-1][0], span["end"])
+        else:
+            chunks.append((span["start"], span["end"]))
+    return chunks
+
+
+def _info_dict(info, **extra) -> Dict:
+    return {
+        "language": getattr(info, "language", None),
+        "language_probability": round(float(getattr(info, "language_probability", 0.0) or 0.0), 3),
+        **extra,
+    }
+
+
+def _start_chunk(audio: np.ndarray, model_size: str, beam_size: int, offset: float = 0.0, model=None):
+    """
+    Start transcribing one chunk. Returns (segments, info): segments is a lazy
+    iterator of {"start", "end", "text"} dicts with times relative to the whole
+    recording; the decoding happens while it is consumed.
+    """
+    model = model or _get_model(model_size)
+    segments, info = model.transcribe(audio, beam_size=beam_size)
+    segments = (
+        {"start": round(offset + seg.start, 2), "end": round(offset + seg.end, 2), "text": seg.text.strip()}
+        for seg in segments
+    )
+    return segments, _info_dict(info)
+
+
+def transcribe_chunk(audio: np.ndarray, model_size: str, beam_size: int, offset: float = 0.0, model=None):
+    """Transcribe one chunk completely; returns (segments list, info)."""
+    segments, info = _start_chunk(audio, model_size, beam_size, offset, model)
+    return list(segments), info
+
+
+def transcribe_events(source, model_size: Optional[str] = None, beam_size=None) -> Iterator[Tuple[str, Dict]]:
+    """
+    Transcribe a recording, yielding ("segment", {...}) as soon as each segment
+    is known (in order) and finally ("done", {"text", "segments", "info"}).
+    source is anything load_audio accepts, or already decoded audio. Raw audio
+    is looked up in the transcript cache by content hash before it is decoded.
+    """
+    from services import whisper_pool
+
+    model_size, beam_size = options(model_size, beam_size)
+    key = None
+    if isinstance(source, np.ndarray):
+        audio = source
+    else:
+        data = read_audio(source)
+        key = transcript_cache.make_key(data, model_size, beam_size)
+        cached = transcript_cache.get(key)
+        if cached is not None:
+            for segment in cached["segments"]:
+                yield "segment", segment
+            yield "done", {**cached, "info": {**cached["info"], "cached": True}}
+            return
+        audio = load_audio(data)
+    chunks = split_chunks(audio)
+    info = {"language": None, "language_probability": 0.0}
+    segments: List[Dict] = []
+
+    if len(chunks) == 1 and not whisper_pool.enabled():
+        # One chunk: stream segments straight out of the decoder
+        start, end = chunks[0]
+        parts, info = _start_chunk(audio[start:end], model_size, beam_size)
+        for segment in parts:
+            segments.append(segment)
+            yield "segment", segment
+    elif chunks:
+        # Several chunks (or the pool): transcribe in parallel, emit in order
+        if whisper_pool.enabled():
+            futures = [whisper_pool.submit(audio[start:end], model_size, beam_size, start / SAMPLE_RATE)
+                       for start, end in chunks]
+        else:
+            executor = _get_executor()
+            futures = [executor.submit(transcribe_chunk, audio[start:end], model_size, beam_size,
+                                       start / SAMPLE_RATE)
+                       for start, end in chunks]
+        try:
+            for n, future in enumerate(futures):
+                parts, chunk_info = whisper_pool.result(future)
+                if n == 0:
+                    info = chunk_info
+                for segment in parts:
+                    segments.append(segment)
+                    yield "segment", segment
+        finally:
+            for future in futures:
+                future.cancel()
+
+    info.update(duration=round(len(audio) / SAMPLE_RATE, 2), chunks=len(chunks),
+                model_size=model_size, beam_size=beam_size)
+    text = " ".join(s["text"] for s in segments if s["text"])
+    result = {"text": text, "segments": segments, "info": info}
+    if key is not None:
+        transcript_cache.put(key, result)
+    yield "done", {**result, "info": {**info, "cached": False}}
 
 
-def transcribe_audio(audio_path: str):
-    """Transcribe a WAV or audio file to text."""
-    model = _get_model()
-    segments, info = model.transcribe(audio_path, beam_size=5)
-    text = " ".join([seg.text for seg in segments])
-    return text.strip(), info
+def transcribe_audio(source: AudioSource, model_size: Optional[str] = None, beam_size=None):
+    """Transcribe an audio file path, bytes or upload stream; returns (text, info)."""
+    for kind, data in transcribe_events(source, model_size, beam_size):
+        if kind == "done":
+            return data["text"], data["info"]
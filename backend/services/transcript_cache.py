@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+# Next to the Flask instance folder unless configured
+CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "transcript_cache"
+)
+# Least recently used entries are deleted beyond either bound; 0 entries disables the cache
+MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "2000"))
+MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_index: Optional["OrderedDict[str, int]"] = None  # key -> file size, oldest first
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def enabled() -> bool:
+    return MAX_ENTRIES > 0
+
+
+def make_key(audio: bytes, model_size: str, beam_size: int) -> str:
+    digest = hashlib.sha256(audio)
+    digest.update(f"|{model_size}|{beam_size}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key + ".json")
+
+
+def _load_index_locked():
+    """Rebuild the LRU order from the files on disk (modification time = last use)."""
+    global _index, _total_bytes
+    if _index is not None:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            st = os.stat(os.path.join(CACHE_DIR, name))
+        except OSError:
+            continue
+        entries.append((st.st_mtime, name[:-5], st.st_size))
+    entries.sort()
+    _index = OrderedDict((key, size) for _, key, size in entries)
+    _total_bytes = sum(size for _, _, size in entries)
+
+
+def _evict_locked():
+    global _total_bytes
+    while _index and (len(_index) > MAX_ENTRIES or _total_bytes > MAX_BYTES):
+        key, size = _index.popitem(last=False)
+        _total_bytes -= size
+        _stats["evictions"] += 1
+        try:
+            os.unlink(_path(key))
+        except OSError:
+            pass
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Stored {"text", "segments", "info"} for key, or None."""
+    global _total_bytes
+    if not enabled():
+        return None
+    with _lock:
+        _load_index_locked()
+        # The file is the source of truth: other processes share the directory
+        try:
+            with open(_path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(_path(key))
+            size = os.path.getsize(_path(key))
+        except (OSError, ValueError):
+            _total_bytes -= _index.pop(key, 0)
+            _stats["misses"] += 1
+            return None
+        _total_bytes += size - _index.pop(key, 0)
+        _index[key] = size
+        _stats["hits"] += 1
+        return entry
+
+
+def put(key: str, entry: Dict[str, Any]):
+    if not enabled():
+        return
+    global _total_bytes
+    data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+    with _lock:
+        _load_index_locked()
+        tmp = _path(key) + f".{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, _path(key))
+        except OSError as e:
+            print(f"[transcript_cache] Could not store {key}: {e}")
+            return
+        _total_bytes += len(data) - _index.pop(key, 0)
+        _index[key] = len(data)
+        _evict_locked()
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_index) if _index is not None else None,
+            "bytes": _total_bytes if _index is not None else None,
+            "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,305 @@
+import os
+import re
+import math
+import zlib
+import threading
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import load_only
+
+from extensions import db
+from models import Resource, resource_watermark
+from services import spatial
+
+# Hashed feature space; vectors are stored sparse so a large dimension is cheap
+DIM = int(os.getenv("VECTOR_INDEX_DIM", str(1 << 18)))
+DECAY_KM = float(os.getenv("VECTOR_DISTANCE_DECAY_KM", "50"))
+DISTANCE_WEIGHT = float(os.getenv("VECTOR_DISTANCE_WEIGHT", "0.3"))
+
+# Field weights when building a resource document
+_NAME_WEIGHT = 2.0
+_CATEGORY_WEIGHT = 2.0
+_KEYWORD_WEIGHT = 0.5
+_TEXT_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r"[a-zåäö0-9]+")
+
+
+def _tokenize(text: str) -> List[str]:
+    tokens = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        # Very light plural folding so "tents" and "tent" share a feature
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def _hash(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) % DIM
+
+
+def _sparse(weighted_tokens: Iterable[Tuple[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    counts: Dict[int, float] = {}
+    for tok, weight in weighted_tokens:
+        h = _hash(tok)
+        counts[h] = counts.get(h, 0.0) + weight
+    idx = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+    tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    order = np.argsort(idx)
+    return idx[order], tf[order]
+
+
+def vectorize_text(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    return _sparse((tok, 1.0) for tok in _tokenize(text))
+
+
+def vectorize_resource(r: Resource) -> Tuple[np.ndarray, np.ndarray]:
+    from services.retrieval import CATEGORY_KEYWORDS
+
+    weighted = [(tok, _NAME_WEIGHT) for tok in _tokenize(r.name)]
+    for enum_value in (r.category, r.subcategory):
+        if enum_value:
+            weighted += [(tok, _CATEGORY_WEIGHT) for tok in _tokenize(enum_value.value.replace("_", " "))]
+    if r.category:
+        for kw in CATEGORY_KEYWORDS.get(r.category, []):
+            weighted += [(tok, _KEYWORD_WEIGHT) for tok in _tokenize(kw)]
+    weighted += [(tok, _TEXT_WEIGHT) for tok in _tokenize(r.source_text)]
+    return _sparse(weighted)
+
+
+class VectorIndex:
+    """
+    In-memory hashed TF-IDF index over resources.
+
+    Documents live in CSR-style arrays (indptr/indices/tf). New or updated
+    resources are appended; replaced rows are only masked out and the arrays
+    are compacted once enough of them are dead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.built = False
+        self.max_id = 0
+        self.updated_since = None  # latest Resource.updated_at pulled from the database
+        self.watermark = None  # resource_watermark() at the last sync
+        self._reset()
+
+    def _reset(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.tf = np.zeros(0, dtype=np.float32)
+        self.rows = np.zeros(0, dtype=np.int64)  # row number of every stored entry
+        self.lons = np.zeros(0, dtype=np.float64)
+        self.lats = np.zeros(0, dtype=np.float64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.flagged = np.zeros(0, dtype=bool)
+        self.df = np.zeros(DIM, dtype=np.int32)
+        self.pos: Dict[int, int] = {}
+        self._pending: List[tuple] = []
+        self._dead = 0
+
+    # --- maintenance ---
+
+    def _add_locked(self, r: Resource):
+        old = self.pos.get(r.id)
+        if old is not None:
+            self._kill_locked(old)
+        idx, tf = vectorize_resource(r)
+        self.df[idx] += 1
+        lon = r.longitude if r.longitude is not None else np.nan
+        lat = r.latitude if r.latitude is not None else np.nan
+        self._pending.append((r.id, idx, tf, lon, lat, bool(r.flagged)))
+        self.pos[r.id] = len(self.ids) + len(self._pending) - 1
+        self.max_id = max(self.max_id, r.id)
+
+    def _kill_locked(self, row: int):
+        n = len(self.ids)
+        if row >= n:
+            # Still pending: drop it before it is ever consolidated
+            self._flush_locked()
+        start, end = self.indptr[row], self.indptr[row + 1]
+        self.df[self.indices[start:end]] -= 1
+        self.alive[row] = False
+        self._dead += 1
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        n = len(self.ids)
+        ids, idxs, tfs, lons, lats, flags = zip(*self._pending)
+        lengths = np.array([len(i) for i in idxs], dtype=np.int64)
+        self.ids = np.concatenate([self.ids, np.array(ids, dtype=np.int64)])
+        self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths)])
+        self.indices = np.concatenate([self.indices, *idxs])
+        self.tf = np.concatenate([self.tf, *tfs])
+        self.rows = np.concatenate([self.rows, np.repeat(np.arange(n, n + len(ids)), lengths)])
+        self.lons = np.concatenate([self.lons, np.array(lons, dtype=np.float64)])
+        self.lats = np.concatenate([self.lats, np.array(lats, dtype=np.float64)])
+        self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+        self.flagged = np.concatenate([self.flagged, np.array(flags, dtype=bool)])
+        self._pending = []
+
+    def _settle_locked(self):
+        """
+        Consolidate pending rows and compact once enough rows are dead. Only
+        called when a sync or upsert is finished: compaction renumbers rows, so
+        it must not run while a caller still holds a row number.
+        """
+        self._flush_locked()
+        if self._dead > 1000 and self._dead > len(self.ids) // 4:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        keep = self.alive
+        lengths = np.diff(self.indptr)[keep]
+        entry_keep = keep[self.rows]
+        n = int(keep.sum())
+        self.ids = self.ids[keep]
+        self.indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.indices = self.indices[entry_keep]
+        self.tf = self.tf[entry_keep]
+        self.rows = np.repeat(np.arange(n), lengths)
+        self.lons = self.lons[keep]
+        self.lats = self.lats[keep]
+        self.flagged = self.flagged[keep]
+        self.alive = np.ones(n, dtype=bool)
+        self.pos = {int(rid): i for i, rid in enumerate(self.ids)}
+        self._dead = 0
+
+    def upsert(self, resources: Iterable[Resource]):
+        """Add or replace resources after they have been committed."""
+        with self._lock:
+            if not self.built:
+                # The first query loads everything from the database anyway
+                return
+            for r in resources:
+                self._add_locked(r)
+            self._settle_locked()
+
+    def sync(self):
+        """
+        Build the index on first use. Afterwards, whenever the table watermark has
+        changed, pull rows inserted or updated since the last sync (by any process)
+        and drop rows deleted elsewhere.
+        """
+        watermark = resource_watermark()
+        with self._lock:
+            if self.built and watermark == self.watermark:
+                return
+            query = Resource.query.options(load_only(
+                Resource.id, Resource.name, Resource.category, Resource.subcategory,
+                Resource.source_text, Resource.latitude, Resource.longitude, Resource.flagged,
+                Resource.updated_at,
+            ))
+            if not self.built:
+                self._reset()
+                self.built = True
+            elif self.updated_since is not None:
+                # >= so a row updated in the same instant as the last pull is not missed
+                query = query.filter(or_(Resource.updated_at >= self.updated_since, Resource.id > self.max_id))
+            for r in query.order_by(Resource.id).yield_per(1000):
+                self._add_locked(r)
+                if r.updated_at and (self.updated_since is None or r.updated_at > self.updated_since):
+                    self.updated_since = r.updated_at
+            if len(self.pos) != watermark[0]:
+                # Rows were deleted (or added here after the watermark was read); drop ids no longer stored
+                stored = {rid for (rid,) in db.session.query(Resource.id)}
+                for rid in [rid for rid in self.pos if rid not in stored]:
+                    self._kill_locked(self.pos.pop(rid))
+            self._settle_locked()
+            self.watermark = watermark
+
+    # --- querying ---
+
+    def coordinates(self, include_flagged: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(ids, lons, lats) of all indexed resources that have a location."""
+        self.sync()
+        with self._lock:
+            mask = self.alive & ~np.isnan(self.lats)
+            if not include_flagged:
+                mask &= ~self.flagged
+            return self.ids[mask], self.lons[mask], self.lats[mask]
+
+    def search(
+        self,
+        text: str,
+        incident_point: Optional[Tuple[float, float]] = None,
+        k: int = 20,
+        radius_km: Optional[float] = None,
+        candidate_ids: Optional[Iterable[int]] = None,
+        include_flagged: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank resources by cosine similarity to `text`, decayed by distance from
+        `incident_point` (lon, lat) when given. Returns dicts with resource_id,
+        score, similarity and distance_km, best first.
+        """
+        self.sync()
+        with self._lock:
+            n = len(self.ids)
+            if n == 0:
+                return []
+
+            live = int(self.alive.sum())
+            idf = (np.log((1.0 + live) / (1.0 + self.df)) + 1.0).astype(np.float32)
+
+            q_idx, q_tf = vectorize_text(text)
+            if len(q_idx) == 0:
+                return []
+            qvec = np.zeros(DIM, dtype=np.float32)
+            qvec[q_idx] = q_tf * idf[q_idx]
+            q_norm = float(np.linalg.norm(qvec[q_idx]))
+
+            w = self.tf * idf[self.indices]
+            dots = np.bincount(self.rows, weights=w * qvec[self.indices], minlength=n)
+            norms = np.sqrt(np.bincount(self.rows, weights=w * w, minlength=n))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                sims = np.where(norms > 0, dots / (norms * q_norm), 0.0)
+
+            mask = self.alive & (sims > 0)
+            if not include_flagged:
+                mask &= ~self.flagged
+            if candidate_ids is not None:
+                wanted = np.fromiter(candidate_ids, dtype=np.int64)
+                mask &= np.isin(self.ids, wanted)
+
+            distances = None
+            scores = sims
+            if incident_point:
+                distances = spatial.haversine_km_many(incident_point[0], incident_point[1], self.lons, self.lats)
+                decay = np.where(np.isnan(distances), 0.0, np.exp(-np.nan_to_num(distances) / DECAY_KM))
+                scores = sims * ((1.0 - DISTANCE_WEIGHT) + DISTANCE_WEIGHT * decay)
+                if radius_km is not None:
+                    mask &= ~np.isnan(distances) & (np.nan_to_num(distances, nan=math.inf) <= radius_km)
+
+            rows = np.flatnonzero(mask)
+            if len(rows) > k:
+                rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+            rows = rows[np.argsort(-scores[rows], kind="stable")]
+
+            return [
+                {
+                    "resource_id": int(self.ids[i]),
+                    "score": float(scores[i]),
+                    "similarity": float(sims[i]),
+                    "distance_km": (None if distances is None or np.isnan(distances[i])
+                                    else float(distances[i])),
+                }
+                for i in rows
+            ]
+
+
+_index = VectorIndex()
+
+
+def get_index() -> VectorIndex:
+    return _index
+
+
+def index_resources(resources: Iterable[Resource]):
+    """Feed freshly committed resources into the process-wide index."""
+    _index.upsert(resources)
@@ -0,0 +1,136 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any
+
+import numpy as np
+
+from services import transcribe
+from services.intake import IntakeError
+
+# Parallel transcriptions; 0 keeps the lazily loaded model in the request thread
+# (long recordings then use TRANSCRIBE_CHUNK_WORKERS threads)
+WORKERS = int(os.getenv("WHISPER_POOL_WORKERS", "0"))
+# Decoded clips waiting for a worker before new ones are refused with 503
+MAX_QUEUE = int(os.getenv("WHISPER_POOL_MAX_QUEUE", "16"))
+# How long a caller waits for its result (queue wait plus transcription)
+TIMEOUT_SECONDS = float(os.getenv("WHISPER_POOL_TIMEOUT_SECONDS", "300"))
+
+_queue: "queue.Queue" = queue.Queue(maxsize=max(1, MAX_QUEUE))
+_ready = threading.Event()
+_started = False
+_start_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "busy": 0,
+    "wait_seconds_total": 0.0, "wait_seconds_max": 0.0, "run_seconds_total": 0.0,
+}
+
+
+def enabled() -> bool:
+    return _started
+
+
+def start():
+    """
+    Load the Whisper model and start the worker threads once per process.
+    One model instance with num_workers=WORKERS serves all threads, so the
+    weights are in memory once while CTranslate2 runs the clips in parallel.
+    """
+    global _started
+    with _start_lock:
+        if _started or WORKERS <= 0:
+            return
+        _started = True
+    threading.Thread(target=_preload, name="whisper-preload", daemon=True).start()
+    for i in range(WORKERS):
+        threading.Thread(target=_worker_loop, name=f"whisper-worker-{i}", daemon=True).start()
+    threads = transcribe.CPU_THREADS or "default"
+    print(f"[whisper_pool] Started {WORKERS} transcription workers ({threads} CPU threads each)")
+
+
+def _preload():
+    started = time.monotonic()
+    try:
+        transcribe._get_model(num_workers=WORKERS)
+        print(f"[whisper_pool] Whisper model ready after {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        # Workers retry the load on their first job
+        print(f"[whisper_pool] Preloading the Whisper model failed: {e}")
+    finally:
+        _ready.set()
+
+
+def _worker_loop():
+    _ready.wait()
+    while True:
+        audio, model_size, beam_size, offset, future, enqueued_at = _queue.get()
+        if not future.set_running_or_notify_cancel():
+            continue
+        started = time.monotonic()
+        waited = started - enqueued_at
+        with _stats_lock:
+            _stats["busy"] += 1
+            _stats["wait_seconds_total"] += waited
+            _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], waited)
+        try:
+            model = transcribe._get_model(model_size, num_workers=WORKERS)
+            result = transcribe.transcribe_chunk(audio, model_size, beam_size, offset, model)
+        except Exception as e:
+            with _stats_lock:
+                _stats["failed"] += 1
+            future.set_exception(e)
+        else:
+            with _stats_lock:
+                _stats["completed"] += 1
+            future.set_result(result)
+        finally:
+            with _stats_lock:
+                _stats["busy"] -= 1
+                _stats["run_seconds_total"] += time.monotonic() - started
+
+
+def submit(audio: np.ndarray, model_size: str, beam_size: int, offset: float = 0.0) -> Future:
+    """Queue one decoded chunk for a worker; the future resolves to (segments, info)."""
+    future: Future = Future()
+    try:
+        _queue.put_nowait((audio, model_size, beam_size, offset, future, time.monotonic()))
+    except queue.Full:
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise IntakeError("Transcription queue is full, try again later.", 503)
+    with _stats_lock:
+        _stats["submitted"] += 1
+    return future
+
+
+def result(future: Future):
+    """Wait for a transcription future (pool or local executor) at most TIMEOUT_SECONDS."""
+    try:
+        return future.result(timeout=TIMEOUT_SECONDS)
+    except TimeoutError:
+        future.cancel()
+        raise IntakeError(f"Transcription did not finish within {TIMEOUT_SECONDS:.0f}s.", 503)
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        done = _stats["completed"] + _stats["failed"]
+        return {
+            "enabled": _started,
+            "workers": WORKERS,
+            "cpu_threads": transcribe.CPU_THREADS,
+            "models_loaded": sorted(transcribe._models),
+            "queued": _queue.qsize(),
+            "max_queue": MAX_QUEUE,
+            "busy": _stats["busy"],
+            "submitted": _stats["submitted"],
+            "rejected": _stats["rejected"],
+            "completed": _stats["completed"],
+            "failed": _stats["failed"],
+            "avg_wait_ms": round(1000 * _stats["wait_seconds_total"] / done, 1) if done else None,
+            "max_wait_ms": round(1000 * _stats["wait_seconds_max"], 1),
+            "avg_run_ms": round(1000 * _stats["run_seconds_total"] / done, 1) if done else None,
+        }